@@ -0,0 +1,70 @@
+"""
+Asset deletion in two steps.
+
+delete_assets() does the database part in one transaction. Their vectors go
+with one set-based DELETE. The asset rows and their ingestion jobs are
+deleted too. Their files are queued as StorageDeletion rows. The request
+returns as soon as that commits.
+
+remove_deleted_files() empties the queue later, from the `ingest_worker`.
+Each call removes up to STORAGE_DELETE_BATCH files with a single storage
+request.
+"""
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Asset, StorageDeletion
+from .supabase_client import supabase
+from rag.answer_cache import invalidate_answer_cache
+from rag.store import delete_embeddings
+
+def delete_assets(user_id, asset_ids):
+    """
+    Deletes the user's assets among `asset_ids` with their vectors and jobs,
+    and queues their files for removal. Returns the ids that were deleted;
+    ids of other users' or missing assets are ignored.
+    """
+    with transaction.atomic():
+        assets = list(
+            Asset.objects.select_for_update()
+            .filter(user_id=user_id, id__in=asset_ids)
+            .values_list("id", "storage_path")
+        )
+        if not assets:
+            return []
+        deleted_ids = [asset_id for asset_id, _ in assets]
+
+        vectors = delete_embeddings(user_id, deleted_ids)
+        StorageDeletion.objects.bulk_create([StorageDeletion(storage_path=path) for _, path in assets])
+        # Cascades to the ingestion jobs
+        Asset.objects.filter(id__in=deleted_ids).delete()
+
+    print(f"Cleared {vectors} vectors for {len(deleted_ids)} assets")
+    # Cached answers may quote the deleted files
+    invalidate_answer_cache(user_id)
+    return deleted_ids
+
+def remove_deleted_files(batch_size=None):
+    """
+    Removes one batch of queued files from storage and returns how many. The
+    rows stay locked (SKIP LOCKED) until the removal is done, so several
+    workers can drain the queue together. If storage fails, the batch stays
+    queued for the next call.
+    """
+    batch_size = batch_size or settings.STORAGE_DELETE_BATCH
+    try:
+        with transaction.atomic():
+            pending = list(
+                StorageDeletion.objects.select_for_update(skip_locked=True).order_by("id")[:batch_size]
+            )
+            if not pending:
+                return 0
+            supabase.storage.from_(settings.SUPABASE_BUCKET).remove([p.storage_path for p in pending])
+            StorageDeletion.objects.filter(id__in=[p.id for p in pending]).delete()
+    except Exception as storage_err:
+        traceback.print_exc()
+        print(f"Storage deletion failed: {storage_err}")
+        return 0
+    return len(pending)
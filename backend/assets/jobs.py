@@ -0,0 +1,140 @@
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Asset, IngestionJob
+from .storage import open_for_extraction
+from .supabase_client import supabase
+from rag.ingest import ingest_asset
+from rag.answer_cache import invalidate_answer_cache
+from rag.store import delete_embeddings
+
+
+def enqueue_ingestion(asset):
+    return IngestionJob.objects.create(asset=asset)
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=settings.RAG_INGEST_STALE_AFTER)
+
+
+def requeue_ingestion(asset):
+    """
+    Queues the asset's job again after its file was replaced, creating the
+    job for assets that predate the queue. Must run inside a transaction:
+    the job row stays locked until commit, so no worker can claim it while
+    the asset is half updated. Returns None if a worker is ingesting the
+    asset right now. A "running" job whose worker went silent counts as
+    abandoned and is replaced.
+    """
+    job = IngestionJob.objects.select_for_update().filter(asset=asset).first()
+    if job is None:
+        return enqueue_ingestion(asset)
+    if job.status == IngestionJob.STATUS_RUNNING and job.updated_at >= _stale_cutoff():
+        return None
+
+    job.status = IngestionJob.STATUS_QUEUED
+    job.stage = "queued"
+    job.chunks_done = job.chunks_total = job.attempts = 0
+    job.error = ""
+    job.started_at = job.finished_at = None
+    job.save()
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically picks the oldest runnable job and marks it running.
+
+    FOR UPDATE SKIP LOCKED lets any number of worker threads and processes
+    poll the same table without handing out a job twice. Jobs left "running"
+    without a progress update or heartbeat (rag.ingest) for
+    RAG_INGEST_STALE_AFTER seconds (e.g. a worker was killed) are picked up
+    again until RAG_INGEST_MAX_ATTEMPTS. Once those are used up they are
+    marked failed instead of staying "running" forever.
+    """
+    stale_cutoff = _stale_cutoff()
+
+    with transaction.atomic():
+        IngestionJob.objects.filter(
+            status=IngestionJob.STATUS_RUNNING,
+            updated_at__lt=stale_cutoff,
+            attempts__gte=settings.RAG_INGEST_MAX_ATTEMPTS,
+        ).update(
+            status=IngestionJob.STATUS_FAILED,
+            error="Ingestion stopped without finishing (the worker was lost) on its last attempt.",
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        job = (
+            IngestionJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=IngestionJob.STATUS_QUEUED)
+                | Q(status=IngestionJob.STATUS_RUNNING, updated_at__lt=stale_cutoff)
+            )
+            .filter(attempts__lt=settings.RAG_INGEST_MAX_ATTEMPTS)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = IngestionJob.STATUS_RUNNING
+        job.stage = "downloading"
+        job.attempts += 1
+        job.error = ""
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "stage", "attempts", "error", "started_at", "updated_at"])
+
+    return job
+
+
+def _update(job, **fields):
+    # .update() skips auto_now, so bump updated_at ourselves (it doubles as a heartbeat)
+    IngestionJob.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **fields)
+
+
+def run_job(job):
+    asset = job.asset
+
+    def on_progress(stage, chunks_done, chunks_total):
+        _update(job, stage=stage, chunks_done=chunks_done, chunks_total=chunks_total)
+
+    try:
+        file_obj = open_for_extraction(
+            supabase.storage.from_(settings.SUPABASE_BUCKET), asset.storage_path, asset.content_hash
+        )
+        try:
+            stored = ingest_asset(asset, file_obj, on_progress=on_progress)
+        finally:
+            file_obj.close()
+
+        if not Asset.objects.filter(pk=asset.pk).exists():
+            # Deleted while it was being ingested: drop the vectors just written
+            delete_embeddings(asset.user_id, [asset.pk])
+            return
+
+        # The asset's searchable vectors changed (or, with no text, are gone),
+        # so earlier answers may be stale
+        invalidate_answer_cache(asset.user_id)
+        if stored:
+            _update(job, status=IngestionJob.STATUS_DONE, stage="done", finished_at=timezone.now())
+        else:
+            _update(
+                job,
+                status=IngestionJob.STATUS_FAILED,
+                stage="done",
+                error="No text could be extracted from this file.",
+                finished_at=timezone.now(),
+            )
+
+    except Exception as e:
+        traceback.print_exc()
+        # Retry on the next poll while attempts remain; otherwise give up
+        status = IngestionJob.STATUS_QUEUED if job.attempts < settings.RAG_INGEST_MAX_ATTEMPTS else IngestionJob.STATUS_FAILED
+        _update(job, status=status, error=str(e), finished_at=timezone.now())
@@ -0,0 +1,76 @@
+import base64
+import mimetypes
+import os
+from pathlib import Path
+
+
+class LocalBucket:
+    """Filesystem stand-in for the subset of the Supabase bucket API the app uses."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, storage_path):
+        path = (self.root / storage_path).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage path: {storage_path}")
+        return path
+
+    def upload(self, path, file, file_options=None):
+        target = self._path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(file)
+        return {"path": path}
+
+    def upload_stream(self, path, file, size, file_options=None, chunk_size=6 * 1024 * 1024):
+        # Same contract as the Supabase bucket's resumable upload: `size` bytes read from `file` in chunks
+        target = self._path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with open(target, "wb") as out:
+            while written < size:
+                chunk = file.read(min(chunk_size, size - written))
+                if not chunk:
+                    raise ValueError(f"{path}: file ended after {written} of {size} bytes")
+                out.write(chunk)
+                written += len(chunk)
+        return {"path": path}
+
+    def download(self, path):
+        return self._path(path).read_bytes()
+
+    def download_stream(self, path, chunk_size=6 * 1024 * 1024):
+        with open(self._path(path), "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def remove(self, paths):
+        removed = []
+        for path in paths:
+            try:
+                os.remove(self._path(path))
+                removed.append({"name": path})
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def create_signed_url(self, path, expires_in):
+        # A data URL works anywhere a signed URL is expected, including the vision model
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        data = base64.b64encode(self.download(path)).decode()
+        return {"signedURL": f"data:{mime};base64,{data}"}
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = root
+
+    def from_(self, bucket):
+        return LocalBucket(os.path.join(self.root, bucket))
+
+
+class LocalStorageClient:
+    """Drop-in for the Supabase client when STORAGE_BACKEND=local (offline dev and benchmarks)."""
+
+    def __init__(self, root):
+        self.storage = LocalStorage(root)
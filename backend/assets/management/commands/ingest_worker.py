@@ -0,0 +1,68 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from assets.deletion import remove_deleted_files
+from assets.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Drains the ingestion job queue with a pool of worker threads, and removes "
+        "the files of deleted assets from storage when idle. "
+        "Run several of these processes to scale ingestion further."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.RAG_INGEST_WORKERS)
+        parser.add_argument("--poll-interval", type=float, default=settings.RAG_INGEST_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        self.stdout.write(f"👷 Ingestion worker started with {workers} threads")
+
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self._work_loop,
+                args=(stop, options["poll_interval"], options["once"]),
+                daemon=True,
+            )
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                # Join with a timeout so Ctrl+C is still delivered to this thread
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("🛑 Stopping after in-flight jobs finish...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work_loop(self, stop, poll_interval, once):
+        # Each thread gets its own DB connection from Django
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    # Ingestion comes first; storage cleanup fills idle time
+                    if remove_deleted_files():
+                        continue
+                    if once:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+
+                self.stdout.write(f"📥 Job {job.id}: ingesting asset {job.asset_id} (attempt {job.attempts})")
+                run_job(job)
+        finally:
+            connection.close()
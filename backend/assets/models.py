@@ -8,7 +8,60 @@ class Asset(models.Model):
     asset_type = models.CharField(max_length=20)
     storage_path = models.CharField(max_length=500)
     size = models.IntegerField()
+    # SHA-256 of the stored file, checked by the worker after download ("" for older assets)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.filename} ({self.asset_type})"
+
+
+class IngestionJob(models.Model):
+    """
+    One row per uploaded asset. Queued by upload_asset and drained by the
+    `ingest_worker` management command, which reports progress back here.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    asset = models.OneToOneField(Asset, on_delete=models.CASCADE, related_name="ingestion_job")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=20, default="queued")
+    chunks_done = models.IntegerField(default=0)
+    chunks_total = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for the oldest queued job
+            models.Index(fields=["status", "created_at"], name="ingestjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"Ingestion of {self.asset_id} ({self.status}/{self.stage})"
+
+
+class StorageDeletion(models.Model):
+    """
+    A file of a deleted asset waiting to be removed from storage. Deleting
+    assets only queues these rows; the `ingest_worker` removes the files in
+    batches when it has no ingestion to do (assets.deletion).
+    """
+    storage_path = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pending removal of {self.storage_path}"
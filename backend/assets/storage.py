@@ -0,0 +1,78 @@
+"""
+Streaming file transfers between requests, the storage bucket and the
+ingestion worker. No step holds a whole file in memory.
+
+upload_file() reads an upload once, in STORAGE_CHUNK_SIZE pieces, and hashes
+each piece on its way to the bucket. open_for_extraction() streams the stored
+file into a spooled temporary file for the extractors and checks it against
+the hash recorded at upload.
+"""
+import hashlib
+import tempfile
+
+from django.conf import settings
+
+class HashingReader:
+    """
+    File wrapper that computes the SHA-256 of what is read through it.
+    Seeking back to resume an upload does not hash the same bytes twice.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.file.seek(0)
+        self.sha256 = hashlib.sha256()
+        self.position = self.hashed = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        end = self.position + len(data)
+        if end > self.hashed:
+            self.sha256.update(data[self.hashed - self.position:])
+            self.hashed = end
+        self.position = end
+        return data
+
+    def seek(self, offset):
+        if offset > self.hashed:
+            raise ValueError(f"Cannot seek to {offset}, only {self.hashed} bytes were read")
+        self.file.seek(offset)
+        self.position = offset
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+def upload_file(bucket, path, file, content_type):
+    """
+    Streams `file` (a Django UploadedFile) to `path` in the bucket and returns
+    its SHA-256 hex digest. Django keeps uploads above
+    FILE_UPLOAD_MAX_MEMORY_SIZE in a temporary file, so a large upload is read
+    from disk once, one chunk at a time.
+    """
+    reader = HashingReader(file)
+    bucket.upload_stream(
+        path, reader, file.size, {"content-type": content_type}, chunk_size=settings.STORAGE_CHUNK_SIZE
+    )
+    return reader.hexdigest()
+
+def open_for_extraction(bucket, path, content_hash=""):
+    """
+    Downloads `path` into a SpooledTemporaryFile positioned at 0. The file is
+    kept in memory up to STORAGE_SPOOL_MAX_MEMORY and on disk beyond that.
+    Raises ValueError if it does not match `content_hash`. Assets uploaded
+    before hashes were recorded have an empty one and are not checked. The
+    caller closes the file.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.STORAGE_SPOOL_MAX_MEMORY)
+    sha256 = hashlib.sha256()
+    try:
+        for chunk in bucket.download_stream(path, settings.STORAGE_CHUNK_SIZE):
+            sha256.update(chunk)
+            spool.write(chunk)
+        if content_hash and sha256.hexdigest() != content_hash:
+            raise ValueError(f"{path} does not match the uploaded file (sha256 {sha256.hexdigest()})")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
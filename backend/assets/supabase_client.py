@@ -1,7 +1,28 @@
-from supabase import create_client
 from django.conf import settings
 
-supabase = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_SERVICE_ROLE_KEY
-)
+# STORAGE_BACKEND=local keeps files on disk under LOCAL_STORAGE_ROOT, so the
+# app and the benchmarks can run without a Supabase project.
+if settings.STORAGE_BACKEND == "local":
+    from .local_storage import LocalStorageClient
+
+    supabase = LocalStorageClient(settings.LOCAL_STORAGE_ROOT)
+else:
+    import httpx
+    from supabase import ClientOptions, create_client
+    from backend.http_clients import http_limits, http_timeout
+    from .supabase_streaming import StreamingClient
+
+    # Storage calls reuse this client's keep-alive connections instead of
+    # opening a new one per upload/download
+    http = httpx.Client(limits=http_limits(), timeout=http_timeout(settings.STORAGE_TIMEOUT))
+    supabase = StreamingClient(
+        create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_SERVICE_ROLE_KEY,
+            options=ClientOptions(httpx_client=http),
+        ),
+        http,
+        settings.SUPABASE_URL,
+        settings.SUPABASE_SERVICE_ROLE_KEY,
+        retries=settings.STORAGE_UPLOAD_RETRIES,
+    )
@@ -1,3 +1,55 @@
-from django.test import TestCase
+import hashlib
+import tempfile
+import tracemalloc
 
-# Create your tests here.
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from .local_storage import LocalBucket
+from .storage import open_for_extraction, upload_file
+
+MB = 1024 * 1024
+
+
+@override_settings(STORAGE_CHUNK_SIZE=MB, STORAGE_SPOOL_MAX_MEMORY=MB)
+class StreamingStorageTests(SimpleTestCase):
+    """A large file goes to the bucket and back without being held in memory."""
+
+    size = 64 * MB
+
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.bucket = LocalBucket(self.root.name)
+
+        self.upload = TemporaryUploadedFile("large.txt", "text/plain", self.size, None)
+        self.addCleanup(self.upload.close)
+        block = b"The supplier shall deliver all goods within ten business days.\n" * (MB // 64)
+        sha256 = hashlib.sha256()
+        for _ in range(self.size // len(block)):
+            self.upload.write(block)
+            sha256.update(block)
+        self.upload.size = self.upload.tell()
+        self.expected = sha256.hexdigest()
+
+    def test_round_trip_memory_stays_bounded(self):
+        tracemalloc.start()
+        try:
+            content_hash = upload_file(self.bucket, "1/large.txt", self.upload, "text/plain")
+            read_back = hashlib.sha256()
+            with open_for_extraction(self.bucket, "1/large.txt", content_hash) as file:
+                while chunk := file.read(MB):
+                    read_back.update(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(content_hash, self.expected)
+        self.assertEqual(read_back.hexdigest(), self.expected)
+        # A chunk in flight each way plus the spool before it rolls over to disk
+        self.assertLess(peak, 8 * MB)
+
+    def test_hash_mismatch_is_rejected(self):
+        upload_file(self.bucket, "1/large.txt", self.upload, "text/plain")
+        with self.assertRaises(ValueError):
+            open_for_extraction(self.bucket, "1/large.txt", "0" * 64)
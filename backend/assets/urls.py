@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import upload_asset, list_assets, delete_asset
+from .views import upload_asset, list_assets, delete_asset, asset_status, replace_asset, bulk_delete_assets
 
 urlpatterns = [
     path("upload/", upload_asset),
     path("", list_assets),
+    path("delete/", bulk_delete_assets),
     path("<int:asset_id>/", delete_asset),
+    path("<int:asset_id>/status/", asset_status),
+    path("<int:asset_id>/replace/", replace_asset),
 ]
\ No newline at end of file
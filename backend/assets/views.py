@@ -4,13 +4,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.conf import settings
+from django.db import transaction
 
-from .models import Asset
+from .models import Asset, IngestionJob, StorageDeletion
 from .supabase_client import supabase
-from rag.ingest import ingest_asset 
-
-# Import your Embedding model
-from rag.models import Embedding 
+from .deletion import delete_assets
+from .jobs import enqueue_ingestion, requeue_ingestion
+from .storage import upload_file
+from rag.answer_cache import invalidate_answer_cache
 
 # Allowed Types
 ALLOWED_TYPES = {
@@ -35,11 +36,9 @@ def upload_asset(request):
     storage_path = f"{request.user.id}/{uuid.uuid4()}_{file.name}"
 
     try:
-        # --- 1. Upload to Supabase ---
-        supabase.storage.from_(settings.SUPABASE_BUCKET).upload(
-            storage_path,
-            file.read(),
-            {"content-type": file.content_type},
+        # --- 1. Stream to Supabase, hashing on the way ---
+        content_hash = upload_file(
+            supabase.storage.from_(settings.SUPABASE_BUCKET), storage_path, file, file.content_type
         )
 
         # --- 2. Create DB Record ---
@@ -49,18 +48,81 @@ def upload_asset(request):
             asset_type=asset_type,
             storage_path=storage_path,
             size=file.size,
+            content_hash=content_hash,
         )
 
-        # --- 3. Trigger RAG Ingestion ---
-        file.seek(0) 
-        ingest_asset(asset, file)
+        # --- 3. Queue RAG Ingestion (run by `manage.py ingest_worker`) ---
+        job = enqueue_ingestion(asset)
+        invalidate_answer_cache(request.user.id)
+
+        return Response({
+            "id": asset.id,
+            "job_id": job.id,
+            "filename": asset.filename,
+            "type": asset.asset_type,
+            "status": job.status,
+            "message": "Upload successful, ingestion queued"
+        }, status=202)
+
+    except Exception as e:
+        traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def replace_asset(request, asset_id):
+    """
+    Uploads a new version of an existing asset under the same id. The
+    ingestion job diffs the new chunks against the stored ones, so only
+    changed text is embedded and written (see rag.ingest.ingest_asset).
+    """
+    file = request.FILES.get("file")
+    if not file:
+        return Response({"error": "No file"}, status=400)
+
+    if file.content_type not in ALLOWED_TYPES:
+        return Response({"error": "Invalid file type"}, status=400)
+
+    try:
+        asset = Asset.objects.get(id=asset_id, user=request.user)
+    except Asset.DoesNotExist:
+        return Response({"error": "Asset not found"}, status=404)
+
+    storage_path = f"{request.user.id}/{uuid.uuid4()}_{file.name}"
+    bucket = supabase.storage.from_(settings.SUPABASE_BUCKET)
+
+    try:
+        # --- 1. Upload the new version next to the old one ---
+        content_hash = upload_file(bucket, storage_path, file, file.content_type)
+
+        # --- 2. Point the asset at it and queue re-ingestion ---
+        old_path = asset.storage_path
+        with transaction.atomic():
+            job = requeue_ingestion(asset)
+            if job is not None:
+                asset.filename = file.name
+                asset.asset_type = ALLOWED_TYPES[file.content_type]
+                asset.storage_path = storage_path
+                asset.size = file.size
+                asset.content_hash = content_hash
+                asset.save(update_fields=["filename", "asset_type", "storage_path", "size", "content_hash"])
+                # --- 3. The old file is no longer referenced; the worker removes it ---
+                StorageDeletion.objects.create(storage_path=old_path)
+
+        if job is None:
+            bucket.remove([storage_path])
+            return Response({"error": "Asset is being ingested, try again when it is done"}, status=409)
+
+        invalidate_answer_cache(request.user.id)
 
         return Response({
             "id": asset.id,
+            "job_id": job.id,
             "filename": asset.filename,
             "type": asset.asset_type,
-            "message": "Upload and Ingestion Successful"
-        })
+            "status": job.status,
+            "message": "Replacement uploaded, re-ingestion queued"
+        }, status=202)
 
     except Exception as e:
         traceback.print_exc()
@@ -69,7 +131,7 @@ def upload_asset(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_assets(request):
-    assets = Asset.objects.filter(user=request.user)
+    assets = Asset.objects.filter(user=request.user).select_related("ingestion_job")
     return Response([
         {
             "id": a.id,
@@ -77,38 +139,84 @@ def list_assets(request):
             "type": a.asset_type,
             "size": a.size,
             "created_at": a.created_at,
+            "status": _job_status(a),
         }
         for a in assets
     ])
 
+def _job_status(asset):
+    # Assets uploaded before background ingestion existed have no job row
+    try:
+        return asset.ingestion_job.status
+    except IngestionJob.DoesNotExist:
+        return IngestionJob.STATUS_DONE
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def asset_status(request, asset_id):
+    try:
+        job = IngestionJob.objects.get(asset_id=asset_id, asset__user=request.user)
+    except IngestionJob.DoesNotExist:
+        if Asset.objects.filter(id=asset_id, user=request.user).exists():
+            return Response({"asset_id": asset_id, "status": IngestionJob.STATUS_DONE, "stage": "done"})
+        return Response({"error": "Asset not found"}, status=404)
+
+    return Response({
+        "asset_id": asset_id,
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "chunks_done": job.chunks_done,
+        "chunks_total": job.chunks_total,
+        "attempts": job.attempts,
+        "error": job.error or None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    })
+
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def delete_asset(request, asset_id):
     """
-    Deletes the asset from the DB, Supabase Storage, and the Vector Store.
+    Deletes the asset from the DB and the Vector Store, and queues its file
+    for removal from Supabase Storage (see assets.deletion).
     """
     try:
-        # Fetch the asset belonging to the current user
-        asset = Asset.objects.get(id=asset_id, user=request.user)
-        
-        # 1. DELETE FROM SUPABASE STORAGE
-        try:
-            supabase.storage.from_(settings.SUPABASE_BUCKET).remove([asset.storage_path])
-        except Exception as storage_err:
-            print(f"Storage deletion failed: {storage_err}")
-
-        # 2. DELETE ASSOCIATED EMBEDDINGS (THE FIX)
-        # We use asset_id=asset_id because that is the column name in your DB
-        deleted_vectors = Embedding.objects.filter(asset_id=asset_id).delete()
-        print(f"Cleared {deleted_vectors[0]} vectors for asset {asset_id}")
-
-        # 3. DELETE ASSET RECORD
-        asset.delete()
-        
+        if not delete_assets(request.user.id, [asset_id]):
+            return Response({"error": "Asset not found"}, status=404)
         return Response({"message": "Asset and associated vectors deleted successfully"})
 
-    except Asset.DoesNotExist:
-        return Response({"error": "Asset not found"}, status=404)
     except Exception as e:
         traceback.print_exc()
-        return Response({"error": str(e)}, status=500)
\ No newline at end of file
+        return Response({"error": str(e)}, status=500)
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_delete_assets(request):
+    """
+    Deletes many assets at once: {"asset_ids": [1, 2, ...]}. Their vectors go
+    in one statement and their files are removed from storage in the
+    background, so clearing a workspace takes one short request.
+    """
+    asset_ids = request.data.get("asset_ids")
+    if not isinstance(asset_ids, list) or not asset_ids:
+        return Response({"error": "Please provide a list of asset_ids"}, status=400)
+    if len(asset_ids) > settings.ASSET_BULK_DELETE_MAX:
+        return Response({"error": f"At most {settings.ASSET_BULK_DELETE_MAX} assets per request"}, status=400)
+    try:
+        asset_ids = sorted({int(asset_id) for asset_id in asset_ids})
+    except (TypeError, ValueError):
+        return Response({"error": "asset_ids must be integers"}, status=400)
+
+    try:
+        deleted = delete_assets(request.user.id, asset_ids)
+    except Exception as e:
+        traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+    return Response({
+        "deleted": deleted,
+        "not_found": sorted(set(asset_ids) - set(deleted)),
+        "message": f"Deleted {len(deleted)} assets and their vectors",
+    })
@@ -0,0 +1,19 @@
+"""
+Connection limits and timeouts for the process-wide HTTP clients
+(rag.openai_client, assets.supabase_client). Each service gets one client per
+process, so TCP/TLS connections are reused across requests and threads
+instead of being set up again for every call.
+"""
+import httpx
+from django.conf import settings
+
+def http_limits():
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def http_timeout(read_timeout):
+    # Connecting should be quick even when the response (e.g. an LLM answer) is not
+    return httpx.Timeout(read_timeout, connect=settings.HTTP_CONNECT_TIMEOUT)
@@ -103,6 +103,24 @@ DATABASES = {
     }
 }
 
+# Connection reuse. DB_POOL=true (default) uses psycopg 3's pool: each process
+# keeps up to DB_POOL_MAX_SIZE open connections and lends them out per request.
+# DB_POOL=false falls back to persistent per-thread connections kept for
+# DB_CONN_MAX_AGE seconds and checked before reuse. Django's pool requires
+# CONN_MAX_AGE = 0, so the two are exclusive.
+if os.getenv("DB_POOL", "true").lower() == "true":
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -180,4 +198,125 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET")
\ No newline at end of file
+SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET")
+
+# "supabase" (default) or "local" for an on-disk stand-in (offline dev / benchmarks)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", str(BASE_DIR / "local_storage"))
+
+# Shared HTTP clients (OpenAI, Supabase storage): connections kept open per
+# process, idle keep-alive lifetime, and timeouts in seconds
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT", "120"))
+
+# Files move to and from storage in STORAGE_CHUNK_SIZE pieces (Supabase's resumable
+# uploads want 6 MB). A failed chunk is retried up to STORAGE_UPLOAD_RETRIES times
+# from the offset the server confirmed. The worker spools downloads in memory up to
+# STORAGE_SPOOL_MAX_MEMORY bytes and on disk beyond.
+STORAGE_CHUNK_SIZE = int(os.getenv("STORAGE_CHUNK_SIZE", str(6 * 1024 * 1024)))
+STORAGE_UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "3"))
+STORAGE_SPOOL_MAX_MEMORY = int(os.getenv("STORAGE_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+
+# Files of deleted assets are removed from storage by the ingest worker, this many per
+# request; POST /assets/delete/ takes at most ASSET_BULK_DELETE_MAX ids
+STORAGE_DELETE_BATCH = int(os.getenv("STORAGE_DELETE_BATCH", "500"))
+ASSET_BULK_DELETE_MAX = int(os.getenv("ASSET_BULK_DELETE_MAX", "1000"))
+
+# --- RAG Pipeline Configuration ---
+# Chunks sent per embeddings request, and how many requests run in parallel
+RAG_EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+RAG_EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+
+# Approximate nearest-neighbour index on embeddings: "hnsw" or "ivfflat".
+# Build parameters are read once, when migrations run.
+RAG_VECTOR_INDEX = os.getenv("RAG_VECTOR_INDEX", "hnsw")
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "64"))
+RAG_IVFFLAT_LISTS = int(os.getenv("RAG_IVFFLAT_LISTS", "100"))
+# Query-time recall knobs (higher = better recall, slower queries)
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "40"))
+RAG_IVFFLAT_PROBES = int(os.getenv("RAG_IVFFLAT_PROBES", "10"))
+
+# Compact vector storage (see rag/vector_storage.py; apply with `manage.py convert_embeddings`):
+# "vector" or "halfvec", embedding size (<= 1536), and binary-quantized first pass + exact rerank
+RAG_VECTOR_TYPE = os.getenv("RAG_VECTOR_TYPE", "vector")
+RAG_EMBEDDING_DIMENSIONS = int(os.getenv("RAG_EMBEDDING_DIMENSIONS", "1536"))
+RAG_BINARY_RERANK = os.getenv("RAG_BINARY_RERANK", "false").lower() == "true"
+RAG_BINARY_CANDIDATES = int(os.getenv("RAG_BINARY_CANDIDATES", "100"))
+
+# Hash partitions of the embeddings table by user_id (rag.partitioning). New installs
+# are partitioned by migrate; existing tables with `manage.py partition_embeddings`
+RAG_EMBEDDING_PARTITIONS = int(os.getenv("RAG_EMBEDDING_PARTITIONS", "16"))
+
+# Background ingestion (python manage.py ingest_worker)
+RAG_INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "4"))
+RAG_INGEST_POLL_INTERVAL = float(os.getenv("RAG_INGEST_POLL_INTERVAL", "2"))
+RAG_INGEST_STALE_AFTER = int(os.getenv("RAG_INGEST_STALE_AFTER", "900"))
+# Seconds between heartbeats of a running job while pages are extracted; keep well below STALE_AFTER
+RAG_INGEST_HEARTBEAT = int(os.getenv("RAG_INGEST_HEARTBEAT", "60"))
+RAG_INGEST_MAX_ATTEMPTS = int(os.getenv("RAG_INGEST_MAX_ATTEMPTS", "3"))
+
+# Max query embeddings kept in each process's in-memory LRU
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+
+# Semantic answer cache: minimum cosine similarity between questions, and entry lifetime
+RAG_ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+RAG_ANSWER_CACHE_TTL = int(os.getenv("RAG_ANSWER_CACHE_TTL", "86400"))
+
+# Image assets (rag/image_understanding.py): shrunk to at most RAG_IMAGE_MAX_SIZE px on the longest
+# side and re-encoded as JPEG before the vision model sees them; up to RAG_IMAGE_CONCURRENCY described
+# at once. Descriptions are cached by file hash, and by perceptual hash if RAG_IMAGE_PERCEPTUAL_CACHE
+RAG_IMAGE_MAX_SIZE = int(os.getenv("RAG_IMAGE_MAX_SIZE", "1024"))
+RAG_IMAGE_JPEG_QUALITY = int(os.getenv("RAG_IMAGE_JPEG_QUALITY", "85"))
+RAG_IMAGE_CONCURRENCY = int(os.getenv("RAG_IMAGE_CONCURRENCY", "4"))
+RAG_IMAGE_PERCEPTUAL_CACHE = os.getenv("RAG_IMAGE_PERCEPTUAL_CACHE", "false").lower() == "true"
+
+# PDF extraction: processes used per document (1 = in-process, page by page)
+RAG_PDF_WORKERS = int(os.getenv("RAG_PDF_WORKERS", "1"))
+RAG_PDF_PAGES_PER_TASK = int(os.getenv("RAG_PDF_PAGES_PER_TASK", "8"))
+
+# Chunking: max tokens per chunk and tokens of trailing sentences repeated in the next chunk
+RAG_CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "400"))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "40"))
+# tiktoken downloads the tokenizer's BPE file on first use and keeps it here. Outside
+# the OS temp dir it survives reboots; warm it once with network access before running offline
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", str(BASE_DIR / "tiktoken_cache"))
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+
+# Hybrid retrieval: fuse vector and full-text candidates with reciprocal rank fusion
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "40"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Diverse retrieval (rag/diversity.py): fetch RAG_MMR_CANDIDATES chunks, then pick the top k with
+# maximal marginal relevance. Lambda 1 = plain ranking, lower = more diverse; per-asset cap 0 = none
+RAG_MMR = os.getenv("RAG_MMR", "false").lower() == "true"
+RAG_MMR_CANDIDATES = int(os.getenv("RAG_MMR_CANDIDATES", "40"))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+RAG_MMR_PER_ASSET = int(os.getenv("RAG_MMR_PER_ASSET", "0"))
+
+# Max tokens of retrieved context placed in the LLM prompt
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "3000"))
+
+# Conversation memory (chats sent with a conversation_id, see chats/memory.py): up to
+# RAG_HISTORY_TURNS recent Q&A turns verbatim plus a rolling summary of older ones, together
+# at most RAG_HISTORY_TOKENS tokens, of which the summary takes up to RAG_SUMMARY_TOKENS
+RAG_HISTORY_TURNS = int(os.getenv("RAG_HISTORY_TURNS", "6"))
+RAG_HISTORY_TOKENS = int(os.getenv("RAG_HISTORY_TOKENS", "1500"))
+RAG_SUMMARY_TOKENS = int(os.getenv("RAG_SUMMARY_TOKENS", "300"))
+
+# Pipeline metrics at /metrics (Prometheus text format); disabling makes instrumentation a no-op
+RAG_METRICS_ENABLED = os.getenv("RAG_METRICS_ENABLED", "true").lower() == "true"
+RAG_METRICS_TOKEN = os.getenv("RAG_METRICS_TOKEN", "")
+
+# Async chat path (ASGI): max Postgres connections per worker process for its psycopg pool
+RAG_ASYNC_DB_POOL_SIZE = int(os.getenv("RAG_ASYNC_DB_POOL_SIZE", "10"))
+
+# Batch chat (/api/chat/batch/): questions accepted per request, answers generated in parallel
+RAG_BATCH_CHAT_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_CHAT_MAX_QUESTIONS", "100"))
+RAG_BATCH_CHAT_CONCURRENCY = int(os.getenv("RAG_BATCH_CHAT_CONCURRENCY", "8"))
@@ -3,6 +3,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from rag.views import metrics
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -30,4 +31,7 @@ urlpatterns = [
     
     # 6.chats
     path('api/chat/', include('chats.urls')),
+
+    # 7. Prometheus metrics
+    path('metrics', metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Recall vs. latency of the pgvector ANN indexes compared with an exact scan.
+
+Builds a throwaway table of synthetic vectors in the configured Postgres
+database (needs the pgvector extension), then for each index type and each
+ef_search / probes value reports recall@k against exact results and the
+average / p95 query latency:
+
+    cd backend
+    python benchmarks/ann_recall.py --rows 50000 --dims 1536 --index both
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection, transaction
+
+TABLE = "bench_ann_vectors"
+
+
+def create_table(cursor, rows, dims, clusters):
+    print(f"Generating {rows} synthetic {dims}-dim vectors around {clusters} centres...")
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, embedding vector({dims}))")
+    # Clustered data behaves more like real embeddings than uniform noise
+    cursor.execute(
+        f"""
+        WITH centres AS (
+            SELECT c, ARRAY(SELECT random() * 2 - 1 FROM generate_series(1, %s) WHERE c >= 0) AS v
+            FROM generate_series(0, %s - 1) c
+        )
+        INSERT INTO {TABLE} (id, embedding)
+        SELECT g, ARRAY(
+            SELECT centres.v[d] + (random() - 0.5) * 0.4
+            FROM generate_series(1, %s) d WHERE g >= 0
+        )::vector
+        FROM generate_series(1, %s) g
+        JOIN centres ON centres.c = g %% %s
+        """,
+        [dims, clusters, dims, rows, clusters],
+    )
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def sample_queries(cursor, count):
+    cursor.execute(
+        f"""
+        SELECT (embedding::real[])::text FROM {TABLE} ORDER BY random() LIMIT %s
+        """,
+        [count],
+    )
+    # Nudge each sampled row so the query is not an exact member of the table
+    queries = []
+    for (text,) in cursor.fetchall():
+        values = [float(x) for x in text.strip("{}").split(",")]
+        queries.append([v + 0.01 for v in values])
+    return queries
+
+
+def run_queries(queries, top_k, setup_sql, setup_params=()):
+    results, latencies = [], []
+    for q in queries:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(setup_sql, setup_params)
+            start = time.perf_counter()
+            cursor.execute(
+                f"SELECT id FROM {TABLE} ORDER BY embedding <-> %s::vector LIMIT %s",
+                [q, top_k],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    return results, latencies
+
+
+def report(label, results, latencies, exact, top_k):
+    recall = statistics.mean(
+        len(set(r) & set(e)) / top_k for r, e in zip(results, exact)
+    )
+    p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else latencies[0]
+    print(f"  {label:<22} recall@{top_k}={recall:6.3f}  avg={statistics.mean(latencies):7.2f}ms  p95={p95:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--index", choices=["hnsw", "ivfflat", "both"], default="both")
+    parser.add_argument("--ef-search", default="10,20,40,80,160")
+    parser.add_argument("--probes", default="1,5,10,20,40")
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark table afterwards")
+    args = parser.parse_args()
+
+    with connection.cursor() as cursor:
+        create_table(cursor, args.rows, args.dims, args.clusters)
+        queries = sample_queries(cursor, args.queries)
+
+    print(f"\nExact scan ({args.queries} queries)")
+    exact, latencies = run_queries(queries, args.top_k, "SET LOCAL enable_indexscan = off")
+    report("exact", exact, latencies, exact, args.top_k)
+
+    try:
+        if args.index in ("hnsw", "both"):
+            with connection.cursor() as cursor:
+                start = time.perf_counter()
+                cursor.execute(f"CREATE INDEX bench_ann_hnsw ON {TABLE} USING hnsw (embedding vector_l2_ops)")
+                print(f"\nHNSW (built in {time.perf_counter() - start:.1f}s)")
+            for ef in [int(v) for v in args.ef_search.split(",")]:
+                results, latencies = run_queries(
+                    queries, args.top_k, "SELECT set_config('hnsw.ef_search', %s, true)", [str(ef)]
+                )
+                report(f"ef_search={ef}", results, latencies, exact, args.top_k)
+            with connection.cursor() as cursor:
+                cursor.execute("DROP INDEX bench_ann_hnsw")
+
+        if args.index in ("ivfflat", "both"):
+            with connection.cursor() as cursor:
+                start = time.perf_counter()
+                cursor.execute(
+                    f"CREATE INDEX bench_ann_ivfflat ON {TABLE} USING ivfflat (embedding vector_l2_ops) "
+                    f"WITH (lists = {args.lists})"
+                )
+                print(f"\nIVFFlat lists={args.lists} (built in {time.perf_counter() - start:.1f}s)")
+            for probes in [int(v) for v in args.probes.split(",")]:
+                results, latencies = run_queries(
+                    queries, args.top_k, "SELECT set_config('ivfflat.probes', %s, true)", [str(probes)]
+                )
+                report(f"probes={probes}", results, latencies, exact, args.top_k)
+    finally:
+        if not args.keep:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Clearing a workspace: deleting every asset one by one, the way
+DELETE /assets/<id>/ used to work, versus one POST /assets/delete/ request
+plus the worker's background file cleanup.
+
+    cd backend
+    python benchmarks/bulk_delete.py --assets 300 --chunks 50 --storage-latency 0.15
+
+Each run creates a throwaway user with `--assets` assets of `--chunks`
+vectors each in the configured Postgres. The files live on disk
+(STORAGE_BACKEND=local). `--storage-latency` adds a sleep to each storage
+call, standing in for the round trip to Supabase.
+
+"one by one" repeats the old view for every asset: a synchronous storage
+removal, then Embedding.objects.filter(asset_id=...).delete() through the
+ORM collector, then the asset row. "bulk request" is the time the client
+waits for the new endpoint. "file cleanup" is the worker emptying the
+storage queue afterwards, which the client does not wait for.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--assets", type=int, default=300)
+    parser.add_argument("--chunks", type=int, default=50, help="vectors per asset")
+    parser.add_argument("--storage-latency", type=float, default=0.15, help="seconds added to each storage call")
+    args = parser.parse_args()
+
+    storage_root = tempfile.mkdtemp(prefix="bench-storage-")
+    os.environ.update({
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": storage_root,
+        "SUPABASE_BUCKET": "bench",
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from assets import local_storage
+    from assets.deletion import remove_deleted_files
+    from assets.models import Asset, StorageDeletion
+    from assets.supabase_client import supabase
+    from rag.models import Embedding
+    from rag.vector_storage import column_type
+
+    remove = local_storage.LocalBucket.remove
+
+    def slow_remove(self, paths):
+        time.sleep(args.storage_latency)
+        return remove(self, paths)
+
+    local_storage.LocalBucket.remove = slow_remove
+    bucket = supabase.storage.from_(settings.SUPABASE_BUCKET)
+    devnull = open(os.devnull, "w")
+
+    def create_workspace(user):
+        assets = Asset.objects.bulk_create([
+            Asset(user=user, filename=f"doc{i}.txt", asset_type="txt", storage_path=f"{user.id}/{i}.txt", size=10)
+            for i in range(args.assets)
+        ])
+        for asset in assets:
+            bucket.upload(asset.storage_path, b"0123456789")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO embeddings (user_id, asset_id, chunk_index, content, embedding, metadata, created_at)
+                SELECT %s, a.id, c, 'chunk ' || c, array_fill(random()::real, ARRAY[%s])::{column_type()}, '{{}}', now()
+                FROM unnest(%s::int[]) a(id), generate_series(0, %s - 1) c
+                """,
+                [user.id, settings.RAG_EMBEDDING_DIMENSIONS, [a.id for a in assets], args.chunks],
+            )
+        return [a.id for a in assets]
+
+    def one_by_one(user, asset_ids):
+        for asset_id in asset_ids:
+            asset = Asset.objects.get(id=asset_id, user=user)
+            bucket.remove([asset.storage_path])
+            Embedding.objects.filter(asset_id=asset_id).delete()
+            asset.delete()
+
+    def files_left(user):
+        return sum(len(files) for _, _, files in os.walk(os.path.join(storage_root, "bench", str(user.id))))
+
+    run_id = uuid.uuid4().hex[:8]
+    users = [User.objects.create_user(username=f"bench-delete-{run_id}-{i}") for i in range(2)]
+    try:
+        print(f"\n▶ {args.assets} assets × {args.chunks} vectors, {args.storage_latency * 1000:.0f}ms per storage call")
+
+        asset_ids = create_workspace(users[0])
+        start = time.perf_counter()
+        one_by_one(users[0], asset_ids)
+        print(f"   {'one by one':<14} {time.perf_counter() - start:7.2f}s  files left={files_left(users[0])}")
+
+        asset_ids = create_workspace(users[1])
+        client = APIClient(SERVER_NAME="localhost")
+        client.force_authenticate(users[1])
+        stdout, sys.stdout = sys.stdout, devnull
+        start = time.perf_counter()
+        try:
+            response = client.post("/assets/delete/", {"asset_ids": asset_ids}, format="json")
+        finally:
+            sys.stdout = stdout
+        assert response.status_code == 200 and len(response.data["deleted"]) == args.assets, response.data
+        print(f"   {'bulk request':<14} {time.perf_counter() - start:7.2f}s  files left={files_left(users[1])}")
+
+        start = time.perf_counter()
+        while remove_deleted_files():
+            pass
+        print(f"   {'file cleanup':<14} {time.perf_counter() - start:7.2f}s  files left={files_left(users[1])}")
+        assert not Embedding.objects.filter(user__in=users).exists()
+        assert not StorageDeletion.objects.filter(storage_path__startswith=f"{users[1].id}/").exists()
+    finally:
+        for user in users:
+            user.delete()
+        shutil.rmtree(storage_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Chat load test: the sync view under a WSGI server versus the async view under
+an ASGI server, one worker process each, against the fake OpenAI API.
+
+    cd backend
+    python benchmarks/chat_load.py --concurrency 16,64,256 --threads 8
+
+Both servers are started as subprocesses with the same environment:
+
+    sync   gunicorn backend.wsgi:application --workers 1 --threads N   POST /api/chat/
+    async  uvicorn backend.asgi:application --workers 1                POST /api/chat/async/
+
+The fake API makes every answer take roughly request_latency +
+answer_tokens * token_latency seconds, like a real LLM call. The sync server
+can only have --threads chats in flight; the async one keeps the rest waiting
+on sockets. Postgres is real: a throwaway user with a small corpus is created
+and deleted afterwards.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import fake_vector, start_fake_openai
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TOPICS = ["delivery", "payment", "termination", "support", "penalties", "disputes", "reporting", "pricing"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def start_server(kind, port, threads):
+    if kind == "sync":
+        command = [
+            "gunicorn", "backend.wsgi:application", "--workers", "1", "--threads", str(threads),
+            "--bind", f"127.0.0.1:{port}", "--backlog", "2048", "--timeout", "300", "--log-level", "warning",
+        ]
+    else:
+        command = [
+            "uvicorn", "backend.asgi:application", "--workers", "1",
+            "--host", "127.0.0.1", "--port", str(port), "--backlog", "2048", "--log-level", "warning",
+        ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return pick(0.50), pick(0.95), pick(0.99)
+
+
+async def run_load(url, token, concurrency, requests, run_id):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=300, headers=headers) as http:
+        async def one(i):
+            nonlocal errors
+            # Unique questions: nothing is served from the query embedding cache
+            question = f"What do the documents say about {TOPICS[i % len(TOPICS)]}? ({run_id}-{concurrency}-{i})"
+            async with gate:
+                start = time.perf_counter()
+                try:
+                    response = await http.post(url, json={"question": question})
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="16,64,256", help="in-flight chats, comma separated")
+    parser.add_argument("--requests-per-level", type=int, default=0, help="default: 2x the concurrency")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads for the sync server")
+    parser.add_argument("--servers", default="sync,async")
+    parser.add_argument("--chunks", type=int, default=200, help="chunks in the throwaway corpus")
+    parser.add_argument("--request-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    _server, base_url = start_fake_openai(request_latency=args.request_latency, token_latency=args.token_latency)
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark",
+        # Cosine similarity never exceeds 1, so nothing is ever served from cache
+        "RAG_ANSWER_CACHE_THRESHOLD": "2",
+        "RAG_METRICS_ENABLED": "false",
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from rag.store import sync_embeddings
+
+    run_id = uuid.uuid4().hex[:8]
+    user = User.objects.create_user(username=f"bench-load-{run_id}")
+    try:
+        rows = []
+        for i in range(args.chunks):
+            content = f"Clause {i} ({run_id}) covers {TOPICS[i % len(TOPICS)]} for the supplier and the customer."
+            rows.append((i, content, fake_vector(content), {"filename": f"contract{i % 4}.txt", "type": "txt"}))
+        sync_embeddings(user.id, 0, rows)
+        token = str(AccessToken.for_user(user))
+
+        levels = [int(v) for v in args.concurrency.split(",")]
+        print(f"fake LLM answer time ≈ {args.request_latency + 60 * args.token_latency:.2f}s, sync threads={args.threads}")
+        for kind in args.servers.split(","):
+            port = free_port()
+            process = start_server(kind, port, args.threads)
+            path = "/api/chat/" if kind == "sync" else "/api/chat/async/"
+            try:
+                print(f"\n▶ {kind} ({'WSGI, gunicorn' if kind == 'sync' else 'ASGI, uvicorn'}) POST {path}")
+                for concurrency in levels:
+                    requests = args.requests_per_level or concurrency * 2
+                    latencies, errors, elapsed = asyncio.run(
+                        run_load(f"http://127.0.0.1:{port}{path}", token, concurrency, requests, run_id)
+                    )
+                    p50, p95, p99 = percentiles(latencies) if latencies else (0, 0, 0)
+                    print(
+                        f"   concurrency={concurrency:<4} {len(latencies) / elapsed:7.1f} chats/s  "
+                        f"p50={p50:6.2f}s  p95={p95:6.2f}s  p99={p99:6.2f}s  errors={errors}"
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        # Cascades to embeddings and saved chats
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
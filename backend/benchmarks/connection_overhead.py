@@ -0,0 +1,142 @@
+"""
+Per-request connection overhead: Postgres connection handling and HTTP client
+reuse, each measured with the rest of the request stripped away.
+
+    cd backend
+    python benchmarks/connection_overhead.py --requests 500
+    python benchmarks/connection_overhead.py --skip-db   # HTTP part only, no Postgres needed
+
+Database: every simulated request runs `SELECT 1` between Django's
+request_started / request_finished connection bookkeeping, for
+  - a new connection per request (CONN_MAX_AGE=0, the old default),
+  - persistent connections (CONN_MAX_AGE=60 + CONN_HEALTH_CHECKS),
+  - the psycopg 3 pool (OPTIONS["pool"], the new default).
+
+HTTP: one tiny embeddings call per request against the local fake OpenAI API,
+with a new client per request, a shared client without keep-alive, and the
+shared client from rag.openai_client's settings. The Supabase client uses
+the same limits (backend.http_clients), so the saving per storage call is the
+same connection setup, plus TLS in production.
+"""
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import start_fake_openai
+
+
+def report(label, samples, elapsed=None):
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    line = f"   {label:<42} mean={statistics.mean(samples):7.2f}ms  p50={cuts[49]:7.2f}ms  p99={cuts[98]:7.2f}ms"
+    if elapsed:
+        line += f"  {len(samples) / elapsed:8.1f} req/s"
+    print(line)
+
+
+def db_modes():
+    from django.conf import settings
+
+    base = copy.deepcopy(settings.DATABASES["default"])
+    base.pop("OPTIONS", None)
+    base.pop("CONN_MAX_AGE", None)
+    base.pop("CONN_HEALTH_CHECKS", None)
+    return {
+        "new connection per request": {**base, "CONN_MAX_AGE": 0},
+        "persistent (CONN_MAX_AGE=60, health checks)": {**base, "CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True},
+        "psycopg pool": {**base, "CONN_MAX_AGE": 0, "OPTIONS": {"pool": {"min_size": 2, "max_size": 4}}},
+    }
+
+
+def bench_db(requests):
+    from django.db.utils import ConnectionHandler
+
+    print("\n▶ Postgres: SELECT 1 per request")
+    for label, config in db_modes().items():
+        handler = ConnectionHandler({"default": config})
+        conn = handler["default"]
+        samples = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                # What django.db.close_old_connections does on request_started/finished
+                conn.close_if_unusable_or_obsolete()
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                conn.close_if_unusable_or_obsolete()
+                samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            conn.close()
+            if config.get("OPTIONS", {}).get("pool"):
+                conn.close_pool()
+        report(label, samples)
+
+
+def bench_http(requests, threads, base_url):
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    from backend.http_clients import http_limits
+    from rag.embed import EMBEDDING_MODEL
+
+    def make_client(limits=None):
+        http_client = DefaultHttpxClient(limits=limits) if limits else None
+        return OpenAI(api_key="benchmark", base_url=base_url, max_retries=0, http_client=http_client)
+
+    def embed(client):
+        start = time.perf_counter()
+        client.embeddings.create(model=EMBEDDING_MODEL, input="ping", dimensions=8)
+        return (time.perf_counter() - start) * 1000
+
+    def per_request(_):
+        # Building the client (SSL context, connection pool) is part of the cost
+        start = time.perf_counter()
+        with make_client() as client:
+            embed(client)
+        return (time.perf_counter() - start) * 1000
+
+    no_keepalive = make_client(httpx.Limits(max_connections=threads, max_keepalive_connections=0))
+    shared = make_client(http_limits())
+    modes = {
+        "new client per request": per_request,
+        "shared client, no keep-alive": lambda _: embed(no_keepalive),
+        "shared client (backend.http_clients)": lambda _: embed(shared),
+    }
+
+    for concurrency in sorted({1, threads}):
+        print(f"\n▶ OpenAI API (local fake), {concurrency} thread(s)")
+        for label, fn in modes.items():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(fn, range(requests)))
+            report(label, samples, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--skip-db", action="store_true")
+    args = parser.parse_args()
+
+    _server, base_url = start_fake_openai(request_latency=0, item_latency=0)
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    if not args.skip_db:
+        bench_db(args.requests)
+    bench_http(args.requests, args.threads, base_url)
+
+
+if __name__ == "__main__":
+    main()
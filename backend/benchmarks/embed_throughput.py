@@ -0,0 +1,57 @@
+"""
+Embedding throughput: one request per chunk vs. batched + concurrent requests.
+
+Runs against the local fake OpenAI API (rag.fake_openai), so no API key is needed:
+
+    cd backend
+    python benchmarks/embed_throughput.py --chunks 300 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import start_fake_openai
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake API latency per request (s)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_openai(request_latency=args.latency)
+
+    # The OpenAI client reads these when rag.openai_client is first imported
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    from rag.embed import generate_embedding, generate_embeddings
+
+    chunks = [f"Chunk {i}: " + "lorem ipsum dolor sit amet " * 18 for i in range(args.chunks)]
+
+    start = time.perf_counter()
+    serial = [generate_embedding(c) for c in chunks]
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = generate_embeddings(chunks, batch_size=args.batch_size, max_workers=args.concurrency)
+    batched_time = time.perf_counter() - start
+
+    server.shutdown()
+
+    assert batched == serial, "batched embeddings must match per-chunk embeddings in order"
+
+    print(f"chunks={args.chunks} api_latency={args.latency}s batch_size={args.batch_size} concurrency={args.concurrency}")
+    print(f"  before (one request per chunk): {serial_time:7.2f}s  {args.chunks / serial_time:9.1f} chunks/s")
+    print(f"  after  (batched + concurrent):  {batched_time:7.2f}s  {args.chunks / batched_time:9.1f} chunks/s")
+    print(f"  speedup: {serial_time / batched_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+What image ingestion sends to the vision model and how long it waits for it:
+full-resolution images described one by one, the way ingestion used to do
+it, versus rag.image_understanding.describe_images, cold and then cached.
+
+    cd backend
+    python benchmarks/image_pipeline.py --images 8 --request-latency 1.5
+
+The images are synthetic: 12-megapixel "photos" (JPEG, noisy gradients) and
+2880x1800 "screenshots" (PNG with lines of text). They alternate, and each
+one is different. Descriptions come from the local fake OpenAI API, which
+waits `--request-latency` per call.
+
+`payload` is the base64 image data put in the requests. `tokens` estimates
+the input tokens of the images. It uses OpenAI's high-detail rule: fit into
+2048x2048, scale the short side down to 768, then 170 tokens per 512 px tile
+plus 85. `full res` sends the original file inline, standing in for the
+signed URL the model used to download. The cached run rereads the same
+files, so every description comes from ImageDescriptionCache.
+"""
+import argparse
+import io
+import math
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import start_fake_openai
+
+TEXT = "Invoice 2024-{i:04d}  Net amount 1,250.00 EUR  due within thirty days of delivery"
+
+
+def make_photo(i):
+    size = (4032, 3024)
+    channels = [Image.effect_noise(size, 40 + 5 * c).filter(ImageFilter.GaussianBlur(2)) for c in range(3)]
+    noise = Image.merge("RGB", channels)
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    image = Image.blend(noise, gradient, 0.3 + (i % 5) * 0.05)
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=92)
+    return out.getvalue()
+
+
+def make_screenshot(i):
+    image = Image.new("RGB", (2880, 1800), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(60):
+        draw.text((40, 20 + line * 29), TEXT.format(i=i * 100 + line), fill="black", font_size=22)
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return out.getvalue()
+
+
+def vision_tokens(width, height):
+    scale = min(1, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def image_stats(files):
+    tokens = 0
+    for data in files:
+        with Image.open(io.BytesIO(data)) as image:
+            tokens += vision_tokens(*image.size)
+    payload = sum(math.ceil(len(data) / 3) * 4 for data in files)
+    return payload, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--request-latency", type=float, default=1.5, help="seconds per fake vision call")
+    parser.add_argument("--max-size", type=int, help="RAG_IMAGE_MAX_SIZE (default: the setting)")
+    parser.add_argument("--concurrency", type=int, help="RAG_IMAGE_CONCURRENCY (default: the setting)")
+    args = parser.parse_args()
+
+    _server, base_url = start_fake_openai(request_latency=args.request_latency, token_latency=0)
+    os.environ.update({"OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "benchmark"})
+    if args.max_size:
+        os.environ["RAG_IMAGE_MAX_SIZE"] = str(args.max_size)
+    if args.concurrency:
+        os.environ["RAG_IMAGE_CONCURRENCY"] = str(args.concurrency)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+
+    from rag.image_understanding import data_url, describe_image, describe_images, prepare_image
+
+    print(f"Generating {args.images} images...")
+    files = [make_photo(i) if i % 2 == 0 else make_screenshot(i) for i in range(args.images)]
+
+    prepare_ms = []
+    prepared = []
+    for data in files:
+        start = time.perf_counter()
+        prepared.append(prepare_image(data)[0])
+        prepare_ms.append((time.perf_counter() - start) * 1000)
+
+    print(
+        f"\n▶ {args.images} images, max size {settings.RAG_IMAGE_MAX_SIZE}px, "
+        f"{settings.RAG_IMAGE_CONCURRENCY} at once, {args.request_latency}s per vision call"
+    )
+    for label, images in (("full res", files), ("prepared", prepared)):
+        payload, tokens = image_stats(images)
+        print(f"   {label:<9} payload={payload / 2**20:7.2f}MB  tokens≈{tokens}")
+    print(f"   prepare   median={statistics.median(prepare_ms):6.1f}ms  max={max(prepare_ms):6.1f}ms per image")
+
+    user = User.objects.create_user(username=f"bench-images-{uuid.uuid4().hex[:8]}")
+    try:
+        start = time.perf_counter()
+        for data in files:
+            with Image.open(io.BytesIO(data)) as image:
+                mime = Image.MIME[image.format]
+            describe_image(data_url(data).replace("image/jpeg", mime, 1))
+        print(f"   {'one by one, full res':<24} {time.perf_counter() - start:6.2f}s")
+
+        for label in ("describe_images, cold", "describe_images, cached"):
+            start = time.perf_counter()
+            descriptions, hits = describe_images(user.id, files)
+            assert len(descriptions) == len(files) and all(descriptions)
+            print(f"   {label:<24} {time.perf_counter() - start:6.2f}s  cache hits={hits}/{len(files)}")
+    finally:
+        user.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Cost of the MMR selection (rag.diversity.mmr_select), of the path that
+feeds it in production, and how many distinct pages it returns compared to
+the plain top-k.
+
+    cd backend
+    python benchmarks/mmr_select.py --candidates 40,100,300,500 --dimensions 1536 --top-k 5,10
+    python benchmarks/mmr_select.py --db    # also time fetching the pool from Postgres
+
+Candidate pools are synthetic: `--pages` groups of near-identical unit
+vectors, the way overlapping chunks of one page embed, spread over 10
+assets. For each pool and k:
+
+    mmr    the selection alone, on a float32 matrix
+    rows   what retrieve_diverse_chunks does once the candidates are fetched
+           (rag.retrieve._select_diverse): rows whose vectors were decoded
+           from pgvector's binary format by rag.vector_storage's loaders,
+           stacked into one matrix and selected with the per-asset cap
+    lists  the same from lists of floats, as a text-format fetch returns them
+
+With --db the pool is also written to a temporary table in the configured
+database and read back both ways: in binary with fetch_with_vectors, as
+production does, and as text real[] through Django's cursor.
+
+Each timing is the median of `--repeats` calls. The script exits 1 if the
+rows path for a pool of at most 300 candidates takes longer than --max-ms.
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import struct
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.diversity import mmr_select
+from rag.retrieve import _select_diverse
+from rag.vector_storage import BINARY_LOADERS
+
+
+def make_pool(rng, candidates, dimensions, pages):
+    """Candidate vectors, their page, their asset, and a query closest to the first pages."""
+    centres = rng.standard_normal((pages, dimensions)).astype(np.float32)
+    page = np.arange(candidates) % pages
+    vectors = centres[page] + 0.05 * rng.standard_normal((candidates, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query = centres[: max(1, pages // 4)].sum(axis=0) + 0.5 * rng.standard_normal(dimensions).astype(np.float32)
+    return vectors, page, page % 10, query / np.linalg.norm(query)
+
+
+def make_rows(vectors, asset, query):
+    """Candidate rows as the vector search returns them: (content, metadata, asset_id, vector, distance)."""
+    loader = BINARY_LOADERS["vector"](0)
+    header = struct.pack(">hh", vectors.shape[1], 0)
+    distances = np.sqrt(np.maximum(0, 2 - 2 * (vectors @ query)))
+    return [
+        (f"chunk {i}", {}, int(asset[i]), loader.load(header + vector.astype(">f4").tobytes()), float(distance))
+        for i, (vector, distance) in enumerate(zip(vectors, distances))
+    ]
+
+
+def time_call(repeats, call):
+    call()  # warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def time_select(repeats, rows, k, lambda_, per_asset):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return time_call(repeats, lambda: _select_diverse(rows, k, False, lambda_, per_asset))
+
+
+def time_db_fetch(repeats, vectors, asset, query):
+    """Median ms to read the pool back in binary (fetch_with_vectors) and as text real[]."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.db import connection, transaction
+
+    from rag.vector_storage import column_type, fetch_with_vectors
+
+    sql = (
+        "SELECT content, metadata, asset_id, {vector}, embedding <-> %(query)s::{type} AS distance "
+        "FROM mmr_pool ORDER BY distance"
+    )
+    params = {"query": "[" + ",".join(map(str, query.tolist())) + "]"}
+    vector_type = column_type(dimensions=vectors.shape[1])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMPORARY TABLE mmr_pool (content text, metadata jsonb, asset_id integer, "
+            f"embedding {vector_type}) ON COMMIT DROP"
+        )
+        cursor.executemany(
+            "INSERT INTO mmr_pool VALUES (%s, '{}', %s, %s)",
+            [(f"chunk {i}", int(asset[i]), "[" + ",".join(map(str, v.tolist())) + "]") for i, v in enumerate(vectors)],
+        )
+
+        def text_fetch():
+            cursor.execute(sql.format(vector="embedding::real[]", type=vector_type), params)
+            return cursor.fetchall()
+
+        binary_sql = sql.format(vector="embedding", type=vector_type)
+        binary_ms = time_call(repeats, lambda: fetch_with_vectors(connection.connection, binary_sql, params))
+        text_ms = time_call(repeats, text_fetch)
+    return binary_ms, text_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", default="40,100,300,500", help="comma-separated pool sizes")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--top-k", default="5,10", help="comma-separated k values")
+    parser.add_argument("--pages", type=int, default=12, help="groups of near-duplicate chunks in a pool")
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=0.7)
+    parser.add_argument("--per-asset", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--max-ms", type=float, default=2.0)
+    parser.add_argument("--db", action="store_true", help="also time fetching each pool from the database")
+    parser.add_argument("--db-repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    top_ks = [int(k) for k in args.top_k.split(",")]
+    print(f"\n▶ {args.dimensions} dims, lambda={args.lambda_}, {args.pages} pages per pool, median of {args.repeats} calls")
+    failed = False
+    for candidates in [int(n) for n in args.candidates.split(",")]:
+        vectors, page, asset, query = make_pool(rng, candidates, args.dimensions, args.pages)
+        relevance = vectors @ query
+        plain = np.argsort(-relevance)
+        rows = make_rows(vectors, asset, query)
+        list_rows = [(*row[:3], row[3].tolist(), row[4]) for row in rows]
+        for k in top_ks:
+            mmr_ms = time_call(args.repeats, lambda: mmr_select(query, vectors, k, args.lambda_))
+            rows_ms = time_select(args.repeats, rows, k, args.lambda_, args.per_asset)
+            lists_ms = time_select(args.repeats, list_rows, k, args.lambda_, args.per_asset)
+            picked = mmr_select(query, vectors, k, args.lambda_)
+            print(
+                f"   n={candidates:<4} k={k:<3} mmr={mmr_ms:6.3f}ms  rows={rows_ms:6.3f}ms  lists={lists_ms:7.3f}ms  "
+                f"distinct pages: top-k={len(set(page[plain[:k]]))}  mmr={len(set(page[picked]))}"
+            )
+            if candidates <= 300 and rows_ms > args.max_ms:
+                failed = True
+        if args.db:
+            binary_ms, text_ms = time_db_fetch(args.db_repeats, vectors, asset, query)
+            print(f"   n={candidates:<4} fetch: binary={binary_ms:7.3f}ms  text real[]={text_ms:7.3f}ms")
+    if failed:
+        print(f"   ✗ selecting from at most 300 fetched candidates took longer than {args.max_ms}ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Per-tenant search latency and recall as the embeddings table grows with more
+tenants: one flat table versus the same rows hash-partitioned by user_id
+(rag.partitioning).
+
+    cd backend
+    python benchmarks/partitioning.py --tenants 8,32,128 --rows-per-tenant 500 --partitions 16
+
+For each tenant count both tables are rebuilt with `--rows-per-tenant` rows
+per tenant, so a tenant's own data stays the same size while the table
+grows around it. The vectors are drawn around `--clusters` topic centres
+shared by all tenants, the way different users' documents cover the same
+subjects. Both tables get the app's (user_id, asset_id) and ANN indexes
+(ann_index(), so RAG_VECTOR_TYPE / RAG_BINARY_RERANK apply) and are queried
+through the app's nearest_sql() with a user_id filter. Recall@k is measured
+against an exact search over the tenant's own rows.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from rag.retrieve import vector_literal
+from rag.vector_storage import ann_index, column_type, nearest_sql
+
+CENTRES_TABLE = "bench_part_centres"
+FLAT_TABLE = "bench_part_flat"
+HASH_TABLE = "bench_part_hash"
+
+
+def create_centres(cursor, clusters, dimensions):
+    cursor.execute(f"DROP TABLE IF EXISTS {CENTRES_TABLE}")
+    cursor.execute(
+        f"""
+        CREATE TABLE {CENTRES_TABLE} AS
+        SELECT c, ARRAY(SELECT random() * 2 - 1 FROM generate_series(1, %s) d WHERE c >= 0) AS v
+        FROM generate_series(0, %s - 1) c
+        """,
+        [dimensions, clusters],
+    )
+
+
+def create_tables(cursor, tenants, rows_per_tenant, partitions, clusters, vector_type):
+    target = column_type(vector_type)
+    columns = f"id bigint, user_id integer, asset_id integer, embedding {target}"
+    for table in (FLAT_TABLE, HASH_TABLE):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    cursor.execute(f"CREATE TABLE {FLAT_TABLE} ({columns})")
+    cursor.execute(f"CREATE TABLE {HASH_TABLE} ({columns}) PARTITION BY HASH (user_id)")
+    for remainder in range(partitions):
+        cursor.execute(
+            f"CREATE TABLE {HASH_TABLE}_p{remainder} PARTITION OF {HASH_TABLE} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        )
+
+    cursor.execute(
+        f"""
+        INSERT INTO {FLAT_TABLE} (id, user_id, asset_id, embedding)
+        SELECT g, g %% %s, g %% 7, l2_normalize(ARRAY(
+            SELECT centres.v[d] + (random() - 0.5) * 0.6
+            FROM generate_subscripts(centres.v, 1) d WHERE g >= 0
+        )::vector)::{target}
+        FROM generate_series(1, %s) g
+        JOIN {CENTRES_TABLE} centres ON centres.c = (hashint4(g) & 2147483647) %% %s
+        """,
+        [tenants, tenants * rows_per_tenant, clusters],
+    )
+    cursor.execute(f"INSERT INTO {HASH_TABLE} SELECT * FROM {FLAT_TABLE}")
+
+    name, definition = ann_index(vector_type)
+    build = {}
+    for table in (FLAT_TABLE, HASH_TABLE):
+        start = time.perf_counter()
+        # On the partitioned table this creates one index per partition
+        cursor.execute(f"CREATE INDEX {table}_user_asset_idx ON {table} (user_id, asset_id)")
+        cursor.execute(f"CREATE INDEX {table}_{name.removeprefix('embeddings_')} ON {table} {definition}")
+        build[table] = time.perf_counter() - start
+        cursor.execute(f"ANALYZE {table}")
+    return build
+
+
+def sample_queries(cursor, tenants, count):
+    # A tenant's question lands near its own documents: one of its rows, nudged
+    rng = random.Random(7)
+    queries = []
+    for _ in range(count):
+        user_id = rng.randrange(tenants)
+        cursor.execute(
+            f"SELECT (embedding::real[])::text FROM {FLAT_TABLE} WHERE user_id = %s ORDER BY random() LIMIT 1",
+            [user_id],
+        )
+        values = [float(x) + rng.gauss(0, 0.02) for x in cursor.fetchone()[0].strip("{}").split(",")]
+        queries.append((user_id, vector_literal(values)))
+    return queries
+
+
+def exact_results(queries, top_k, target):
+    results = []
+    for user_id, embedding in queries:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            cursor.execute("SET LOCAL enable_bitmapscan = off")
+            cursor.execute(
+                f"SELECT id FROM {FLAT_TABLE} WHERE user_id = %s ORDER BY embedding <-> %s::{target} LIMIT %s",
+                [user_id, embedding, top_k],
+            )
+            results.append([row[0] for row in cursor.fetchall()])
+    return results
+
+
+def bench_table(table, queries, exact, top_k, ef_search, target):
+    sql = nearest_sql(f"%(embedding)s::{target}", "user_id = %(user_id)s", "%(top_k)s", table=table)
+    ef = max(ef_search, int(settings.RAG_BINARY_CANDIDATES) if settings.RAG_BINARY_RERANK else 0)
+    results, latencies = [], []
+    for user_id, embedding in queries:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef)])
+            start = time.perf_counter()
+            cursor.execute(sql, {"user_id": user_id, "embedding": embedding, "top_k": top_k})
+            results.append([row[0] for row in cursor.fetchall()])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    recall = statistics.mean(len(set(r) & set(e)) / top_k for r, e in zip(results, exact))
+    p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else latencies[0]
+    return recall, statistics.mean(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tenants", default="8,32,128", help="comma-separated tenant counts")
+    parser.add_argument("--rows-per-tenant", type=int, default=500)
+    parser.add_argument("--partitions", type=int, default=settings.RAG_EMBEDDING_PARTITIONS)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--ef-search", type=int, default=settings.RAG_HNSW_EF_SEARCH)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark tables afterwards")
+    args = parser.parse_args()
+
+    vector_type = settings.RAG_VECTOR_TYPE
+    try:
+        with override_settings(RAG_EMBEDDING_DIMENSIONS=args.dimensions):
+            target = column_type(vector_type)
+            with connection.cursor() as cursor:
+                create_centres(cursor, args.clusters, args.dimensions)
+            print(
+                f"\n{args.rows_per_tenant} rows per tenant, {target}, {args.partitions} partitions, "
+                f"ef_search={args.ef_search}, {args.queries} queries"
+            )
+            for tenants in [int(t) for t in args.tenants.split(",")]:
+                with connection.cursor() as cursor:
+                    build = create_tables(
+                        cursor, tenants, args.rows_per_tenant, args.partitions, args.clusters, vector_type
+                    )
+                    queries = sample_queries(cursor, tenants, args.queries)
+                exact = exact_results(queries, args.top_k, target)
+
+                print(f"\n▶ {tenants} tenants, {tenants * args.rows_per_tenant} rows")
+                for label, table in (("flat", FLAT_TABLE), ("partitioned", HASH_TABLE)):
+                    recall, avg, p95 = bench_table(table, queries, exact, args.top_k, args.ef_search, target)
+                    print(
+                        f"   {label:<12} index build={build[table]:6.2f}s  recall@{args.top_k}={recall:5.3f}  "
+                        f"avg={avg:6.2f}ms  p95={p95:6.2f}ms"
+                    )
+    finally:
+        if not args.keep:
+            with connection.cursor() as cursor:
+                for table in (HASH_TABLE, FLAT_TABLE, CENTRES_TABLE):
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+if __name__ == "__main__":
+    main()
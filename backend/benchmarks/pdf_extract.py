@@ -0,0 +1,134 @@
+"""
+PDF extraction throughput and peak memory: whole-document join (the old
+extractor) vs. page streaming vs. page streaming over a process pool.
+
+Generates a text-heavy PDF with the requested number of pages, then runs
+each mode in a fresh subprocess so peak RSS figures don't leak between runs:
+
+    cd backend
+    python benchmarks/pdf_extract.py --pages 400 --workers 4
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = "invoice contract clause payment total amount party agreement schedule delivery".split()
+
+
+def write_pdf(path, pages, lines_per_page=60):
+    """Writes a minimal multi-page PDF with Helvetica text, no dependencies needed."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 2 * pages + 1
+    page_ids = []
+    for p in range(pages):
+        lines = []
+        for l in range(lines_per_page):
+            words = " ".join(WORDS[(p + l + i) % len(WORDS)] for i in range(12))
+            lines.append(f"({p + 1}.{l + 1} {words}) Tj T*")
+        stream = ("BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    assert add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)) == pages_id
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux; include pool processes that have exited
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def run_mode(mode, path, workers):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    import pdfplumber
+    from rag.chunk import chunk_document
+    from rag.extract import iter_pdf_pages
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        if mode == "join":
+            # The original extractor: every page into one string, then chunk
+            with pdfplumber.open(f) as pdf:
+                text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+                pages = len(pdf.pages)
+            chunks = sum(1 for _ in chunk_document([text]))
+        else:
+            pages = 0
+
+            def counted(stream):
+                nonlocal pages
+                for page in stream:
+                    pages += 1
+                    yield page
+
+            chunks = sum(1 for _ in chunk_document(counted(iter_pdf_pages(f, workers=workers))))
+    elapsed = time.perf_counter() - start
+    own, children = peak_rss_mb()
+    print(f"{pages} {chunks} {elapsed} {own} {children}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--mode", choices=["join", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args.mode, args.pdf, args.workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pdf")
+        write_pdf(path, args.pages)
+        print(f"Generated {args.pages}-page PDF ({os.path.getsize(path) / 1e6:.1f} MB)\n")
+
+        runs = [
+            ("join (before)", "join", 1),
+            ("stream, 1 process", "stream", 1),
+            (f"stream, {args.workers} processes", "stream", args.workers),
+        ]
+        for label, mode, workers in runs:
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--pdf", path, "--workers", str(workers)],
+                capture_output=True, text=True, check=True, cwd=BACKEND_DIR,
+            ).stdout.split()
+            pages, chunks, elapsed, own, children = int(out[0]), int(out[1]), *map(float, out[2:])
+            print(
+                f"  {label:<24} {pages / elapsed:7.1f} pages/s  {elapsed:6.2f}s  chunks={chunks}"
+                f"  peak RSS main={own:6.1f} MB  largest child={children:6.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+End-to-end pipeline benchmark: ingestion and chat throughput with per-stage
+latency percentiles, fully offline.
+
+OpenAI is replaced by the local fake API (rag.fake_openai) and Supabase by
+the on-disk storage backend (STORAGE_BACKEND=local). Postgres is real: the
+configured database is used, with a throwaway user per run that is deleted
+afterwards.
+
+    cd backend
+    python benchmarks/pipeline.py --corpus-sizes 5,20,50 --ingest-concurrency 1,4 --chat-concurrency 1,4,16
+
+For every corpus size and concurrency level it prints throughput and the
+p50/p95/p99 latency of each stage.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import start_fake_openai
+
+SENTENCES = [
+    "The supplier shall deliver all goods to the warehouse within ten business days.",
+    "Payment of the total amount is due thirty days after the invoice date.",
+    "Either party may terminate this agreement with sixty days written notice.",
+    "Maintenance and support are included for the first twelve months.",
+    "Late deliveries incur a penalty of two percent of the order value per week.",
+    "All disputes are settled by arbitration in the city of the buyer.",
+    "The customer receives quarterly reports on service availability.",
+    "Prices are fixed for the duration of the initial contract term.",
+]
+
+
+class StageTimer:
+    """Collects wall-clock durations per stage from any thread."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def wrap(self, stage, fn, consume=False):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                # Generators only do their work while being consumed
+                return list(result) if consume else result
+            finally:
+                with self.lock:
+                    self.samples[stage].append((time.perf_counter() - start) * 1000)
+        return timed
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def report(self):
+        for stage, values in self.samples.items():
+            print(f"      {stage:<16} n={len(values):<5} " + "  ".join(
+                f"{name}={value:8.1f}ms" for name, value in zip(("p50", "p95", "p99"), percentiles(values))
+            ))
+
+
+def percentiles(values):
+    if len(values) == 1:
+        return values * 3
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def make_document(run_id, doc, paragraphs):
+    # run_id keeps text unique per run, so the chunk embedding store can't short-circuit it
+    lines = []
+    for p in range(paragraphs):
+        body = " ".join(SENTENCES[(doc + p + i) % len(SENTENCES)] for i in range(5))
+        lines.append(f"Section {p + 1} of document {doc} ({run_id}). {body}")
+    return "\n".join(lines).encode()
+
+
+def run_threads(fn, items, concurrency):
+    from django.db import connection
+
+    def call(item):
+        try:
+            return fn(item)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, items))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-sizes", default="5,20", help="documents per run, comma separated")
+    parser.add_argument("--paragraphs", type=int, default=40, help="paragraphs per document")
+    parser.add_argument("--ingest-concurrency", default="1,4")
+    parser.add_argument("--chat-concurrency", default="1,4,16")
+    parser.add_argument("--questions", type=int, default=32, help="chat requests per concurrency level")
+    parser.add_argument("--request-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_openai(request_latency=args.request_latency, token_latency=args.token_latency)
+    storage_root = tempfile.mkdtemp(prefix="bench-storage-")
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": storage_root,
+        "SUPABASE_BUCKET": "bench",
+    })
+    if not args.answer_cache:
+        # Cosine similarity never exceeds 1, so nothing is ever served from cache
+        os.environ["RAG_ANSWER_CACHE_THRESHOLD"] = "2"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+
+    import assets.jobs
+    import rag.chat_engine
+    import rag.ingest
+    from assets.models import Asset
+    from assets.supabase_client import supabase
+    from rag.models import Embedding
+
+    timer = StageTimer()
+    rag.ingest.chunk_document = timer.wrap("extract+chunk", rag.ingest.chunk_document, consume=True)
+    rag.ingest.embed_chunks = timer.wrap("embed", rag.ingest.embed_chunks)
+    rag.ingest.sync_embeddings = timer.wrap("store", rag.ingest.sync_embeddings)
+    assets.jobs.ingest_asset = timer.wrap("ingest_total", assets.jobs.ingest_asset)
+    rag.chat_engine.embed_query = timer.wrap("query_embed", rag.chat_engine.embed_query)
+    rag.chat_engine.retrieve_chunks = timer.wrap("retrieve", rag.chat_engine.retrieve_chunks)
+    rag.chat_engine.build_prompt = timer.wrap("prompt", rag.chat_engine.build_prompt)
+    rag.chat_engine.generate_answer = timer.wrap("generate", rag.chat_engine.generate_answer)
+    chat = timer.wrap("chat_total", rag.chat_engine.chat_with_rag)
+
+    bucket = supabase.storage.from_(settings.SUPABASE_BUCKET)
+    devnull = open(os.devnull, "w")
+
+    for size in [int(v) for v in args.corpus_sizes.split(",")]:
+        for ingest_concurrency in [int(v) for v in args.ingest_concurrency.split(",")]:
+            run_id = uuid.uuid4().hex[:8]
+            user = User.objects.create_user(username=f"bench-pipeline-{run_id}")
+            try:
+                jobs = []
+                for doc in range(size):
+                    path = f"{user.id}/{run_id}_{doc}.txt"
+                    data = make_document(run_id, doc, args.paragraphs)
+                    bucket.upload(path, data, {"content-type": "text/plain"})
+                    asset = Asset.objects.create(
+                        user=user, filename=f"doc{doc}.txt", asset_type="txt", storage_path=path, size=len(data)
+                    )
+                    jobs.append(assets.jobs.enqueue_ingestion(asset))
+
+                print(f"\n▶ corpus={size} docs, ingest concurrency={ingest_concurrency}")
+                timer.reset()
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    _, elapsed = run_threads(assets.jobs.run_job, jobs, ingest_concurrency)
+                finally:
+                    sys.stdout = stdout
+                chunks = Embedding.objects.filter(user=user).count()
+                print(f"   ingestion: {size / elapsed:7.2f} docs/s  {chunks / elapsed:8.1f} chunks/s  ({elapsed:.2f}s)")
+                timer.report()
+
+                for chat_concurrency in [int(v) for v in args.chat_concurrency.split(",")]:
+                    questions = [
+                        f"What does document {i % size} say about {SENTENCES[i % len(SENTENCES)].split()[1]} (run {run_id}, q{i})?"
+                        for i in range(args.questions)
+                    ]
+                    timer.reset()
+                    stdout, sys.stdout = sys.stdout, devnull
+                    try:
+                        _, elapsed = run_threads(lambda q: chat(user, q), questions, chat_concurrency)
+                    finally:
+                        sys.stdout = stdout
+                    print(f"   chat concurrency={chat_concurrency}: {len(questions) / elapsed:7.2f} chats/s  ({elapsed:.2f}s)")
+                    timer.report()
+            finally:
+                # Cascades to assets, jobs, embeddings and cached answers
+                user.delete()
+
+    server.shutdown()
+    shutil.rmtree(storage_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
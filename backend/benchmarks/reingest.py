@@ -0,0 +1,169 @@
+"""
+Updating a document: delete + upload again versus POST /assets/<id>/replace/,
+for a large text file with a small edit, fully offline.
+
+    cd backend
+    python benchmarks/reingest.py --paragraphs 2000 --edited 20
+
+Both paths go through the real views (APIClient) and the ingestion worker's
+run_job, with the fake OpenAI API (rag.fake_openai), on-disk storage
+(STORAGE_BACKEND=local) and the configured Postgres, using a throwaway user.
+
+For each path it prints the ingestion time of the new version, the chunks
+sent to the embeddings API, and the vector rows inserted and deleted.
+`--cold-chunk-store` drops the first version's chunks from the
+content-addressed embedding store before the baseline, as if that text had
+never been embedded (the app before the store existed).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.fake_openai import start_fake_openai
+
+SENTENCES = [
+    "The supplier shall deliver all goods to the warehouse within ten business days.",
+    "Payment of the total amount is due thirty days after the invoice date.",
+    "Either party may terminate this agreement with sixty days written notice.",
+    "Maintenance and support are included for the first twelve months.",
+    "Late deliveries incur a penalty of two percent of the order value per week.",
+    "All disputes are settled by arbitration in the city of the buyer.",
+]
+
+
+def make_document(run_id, paragraphs, edited=0, edit_tag=""):
+    # Paragraphs in the middle of the document are rewritten for the new version
+    first_edited = (paragraphs - edited) // 2
+    lines = []
+    for p in range(paragraphs):
+        body = " ".join(SENTENCES[(p + i) % len(SENTENCES)] for i in range(4))
+        if first_edited <= p < first_edited + edited:
+            body = f"Amended {edit_tag}: {body.replace('thirty', 'forty-five')}"
+        lines.append(f"Section {p + 1} ({run_id}). {body}")
+    return "\n".join(lines).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--edited", type=int, default=20, help="paragraphs changed in the new version")
+    parser.add_argument("--cold-chunk-store", action="store_true")
+    parser.add_argument("--request-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base_url = start_fake_openai(request_latency=args.request_latency)
+    storage_root = tempfile.mkdtemp(prefix="bench-storage-")
+    os.environ.update({
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": storage_root,
+        "SUPABASE_BUCKET": "bench",
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from rest_framework.test import APIClient
+
+    import rag.embedding_store
+    import rag.store
+    from assets.jobs import run_job
+    from assets.models import IngestionJob
+    from rag.embedding_store import chunk_key
+    from rag.models import ChunkEmbeddingCache, Embedding
+
+    counts = {}
+
+    def counting(name, fn, measure):
+        def wrapped(*a, **kw):
+            counts[name] = counts.get(name, 0) + measure(a, kw)
+            return fn(*a, **kw)
+        return wrapped
+
+    rag.embedding_store.generate_embeddings = counting(
+        "embedded", rag.embedding_store.generate_embeddings, lambda a, kw: len(a[0])
+    )
+    rag.store._insert_rows = counting("inserted", rag.store._insert_rows, lambda a, kw: len(a[3]))
+
+    devnull = open(os.devnull, "w")
+
+    def ingest(job_id):
+        counts.clear()
+        stdout, sys.stdout = sys.stdout, devnull
+        start = time.perf_counter()
+        try:
+            run_job(IngestionJob.objects.get(id=job_id))
+        finally:
+            sys.stdout = stdout
+        return time.perf_counter() - start
+
+    def report(label, asset_id, seconds, deleted):
+        job = IngestionJob.objects.get(asset_id=asset_id)
+        assert job.status == IngestionJob.STATUS_DONE, job.error
+        rows = Embedding.objects.filter(asset_id=asset_id).count()
+        print(
+            f"   {label:<26} {seconds:7.2f}s  embedded={counts.get('embedded', 0):<6} "
+            f"inserted={counts.get('inserted', 0):<6} deleted={deleted:<6} rows={rows}"
+        )
+
+    run_id = uuid.uuid4().hex[:8]
+    user = User.objects.create_user(username=f"bench-reingest-{run_id}")
+    client = APIClient(SERVER_NAME="localhost")
+    client.force_authenticate(user)
+    # Each path gets its own text, so neither reuses the other's embeddings
+    documents = {
+        path: (make_document(f"{run_id}-{path}", args.paragraphs),
+               make_document(f"{run_id}-{path}", args.paragraphs, args.edited, edit_tag=path))
+        for path in ("baseline", "replace")
+    }
+
+    def upload(url, data):
+        response = client.post(url, {"file": SimpleUploadedFile("contract.txt", data, "text/plain")})
+        assert response.status_code == 202, response.data
+        return response.data
+
+    try:
+        # Baseline: delete the asset and upload the new version as a new one
+        v1, v2 = documents["baseline"]
+        first = upload("/assets/upload/", v1)
+        seconds = ingest(first["job_id"])
+        chunks = Embedding.objects.filter(asset_id=first["id"]).count()
+        print(f"\n▶ {args.paragraphs} paragraphs, {chunks} chunks, {args.edited} paragraphs edited")
+        report("initial upload", first["id"], seconds, 0)
+
+        if args.cold_chunk_store:
+            contents = Embedding.objects.filter(asset_id=first["id"]).values_list("content", flat=True)
+            ChunkEmbeddingCache.objects.filter(key__in=[chunk_key(c) for c in contents]).delete()
+        client.delete(f"/assets/{first['id']}/")
+        second = upload("/assets/upload/", v2)
+        report("delete + upload again", second["id"], ingest(second["job_id"]), chunks)
+
+        # Replace: same asset id, only the changed chunks are written
+        v1, v2 = documents["replace"]
+        third = upload("/assets/upload/", v1)
+        ingest(third["job_id"])
+        before = set(Embedding.objects.filter(asset_id=third["id"]).values_list("id", flat=True))
+        replaced = upload(f"/assets/{third['id']}/replace/", v2)
+        seconds = ingest(replaced["job_id"])
+        after = set(Embedding.objects.filter(asset_id=third["id"]).values_list("id", flat=True))
+        report("replace", third["id"], seconds, len(before - after))
+    finally:
+        # Cascades to assets, jobs and embeddings
+        user.delete()
+        server.shutdown()
+        shutil.rmtree(storage_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
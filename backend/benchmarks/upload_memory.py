@@ -0,0 +1,203 @@
+"""
+Peak memory of concurrent large uploads, with on-disk storage
+(STORAGE_BACKEND=local) standing in for Supabase.
+
+    cd backend
+    python benchmarks/upload_memory.py --size-mb 100 --concurrency 4
+
+Each mode runs in a fresh process, so peak RSS is measured on its own:
+
+  stream  the app's path. POST /assets/upload/ goes through the real view and
+          assets.storage.upload_file, then the worker's open_for_extraction
+          reads the file back.
+  read    the whole-file path it replaced: file.read() into bucket.upload(),
+          and download() into a BytesIO.
+
+The multipart request bodies are written to disk first and fed to the view as
+wsgi.input, the way gunicorn hands over a request. Django's parser spools the
+file to a temporary file, as in production. The script checks that every
+stored file has the right content. It exits 1 if `stream` grows the process
+by more than --max-growth-mb. The default is concurrency × 2 ×
+(STORAGE_CHUNK_SIZE + STORAGE_SPOOL_MAX_MEMORY) + 32 MB: one chunk in flight
+each way, and the spool while it rolls over to disk. The limit does not
+depend on --size-mb.
+"""
+import argparse
+import hashlib
+import io
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOUNDARY = "benchmarkboundary"
+LINE = b"The supplier shall deliver all goods to the warehouse within ten business days.\n"
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_request_body(path, size):
+    """A multipart/form-data body holding one text file of `size` bytes; returns the file's sha256."""
+    sha256 = hashlib.sha256()
+    block = LINE * (1024 * 1024 // len(LINE))
+    with open(path, "wb") as out:
+        out.write(
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"large.txt\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n".encode()
+        )
+        written = 0
+        while written < size:
+            piece = block[:size - written]
+            out.write(piece)
+            sha256.update(piece)
+            written += len(piece)
+        out.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+    return sha256.hexdigest()
+
+
+def child(args):
+    storage_root = tempfile.mkdtemp(prefix="bench-storage-")
+    os.environ.update({
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": storage_root,
+        "SUPABASE_BUCKET": "bench",
+    })
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.handlers.wsgi import WSGIRequest
+    from rest_framework.test import force_authenticate
+
+    from assets.models import Asset
+    from assets.storage import open_for_extraction
+    from assets.supabase_client import supabase
+    from assets.views import upload_asset
+
+    size = args.size_mb * 1024 * 1024
+    body_path = os.path.join(storage_root, "request-body")
+    expected = write_request_body(body_path, size)
+    bucket = supabase.storage.from_(settings.SUPABASE_BUCKET)
+    user = User.objects.create_user(username=f"bench-upload-{uuid.uuid4().hex[:8]}")
+    devnull = open(os.devnull, "w")
+
+    def stream(results, i):
+        with open(body_path, "rb") as body:
+            request = WSGIRequest({
+                "REQUEST_METHOD": "POST",
+                "PATH_INFO": "/assets/upload/",
+                "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+                "CONTENT_LENGTH": str(os.path.getsize(body_path)),
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "wsgi.url_scheme": "http",
+                "wsgi.input": body,
+            })
+            force_authenticate(request, user)
+            response = upload_asset(request)
+        assert response.status_code == 202, response.data
+        asset = Asset.objects.get(id=response.data["id"])
+        assert asset.content_hash == expected, "hash computed during upload is wrong"
+
+        # What the ingestion worker does before extracting
+        sha256 = hashlib.sha256()
+        with open_for_extraction(bucket, asset.storage_path, asset.content_hash) as file:
+            while chunk := file.read(1024 * 1024):
+                sha256.update(chunk)
+        results[i] = sha256.hexdigest()
+
+    def read(results, i):
+        path = f"{user.id}/{uuid.uuid4()}_large.txt"
+        with open(body_path, "rb") as body:
+            data = body.read()
+        start = data.index(b"\r\n\r\n") + 4
+        bucket.upload(path, data[start:start + size], {"content-type": "text/plain"})
+        del data
+        file = io.BytesIO(bucket.download(path))
+        results[i] = hashlib.sha256(file.getbuffer()).hexdigest()
+
+    run = stream if args.mode == "stream" else read
+    results = [None] * args.concurrency
+    baseline = rss_mb()
+    stdout, sys.stdout = sys.stdout, devnull
+    start = time.perf_counter()
+    try:
+        threads = [threading.Thread(target=run, args=(results, i)) for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout = stdout
+        user.delete()
+        shutil.rmtree(storage_root, ignore_errors=True)
+    seconds = time.perf_counter() - start
+
+    assert results == [expected] * args.concurrency, "stored files differ from the uploads"
+    growth = peak_rss_mb() - baseline
+    print(
+        f"   {args.mode:<7} {args.concurrency} × {args.size_mb} MB in {seconds:6.2f}s  "
+        f"baseline={baseline:7.1f}MB  peak={peak_rss_mb():7.1f}MB  growth={growth:7.1f}MB"
+    )
+    if args.mode == "stream" and growth > args.max_growth_mb:
+        print(f"   ✗ stream path grew by more than {args.max_growth_mb:.0f} MB")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--modes", default="stream,read")
+    parser.add_argument("--max-growth-mb", type=float)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.max_growth_mb is None:
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+        import django
+        from django.conf import settings
+
+        django.setup()
+        per_upload = 2 * (settings.STORAGE_CHUNK_SIZE + settings.STORAGE_SPOOL_MAX_MEMORY)
+        args.max_growth_mb = args.concurrency * per_upload / 2**20 + 32
+
+    if args.mode:
+        return child(args)
+
+    print(f"\n▶ {args.concurrency} concurrent uploads of {args.size_mb} MB (stream limit {args.max_growth_mb:.0f} MB)")
+    failed = False
+    for mode in args.modes.split(","):
+        command = [
+            sys.executable, os.path.abspath(__file__), "--mode", mode,
+            "--size-mb", str(args.size_mb), "--concurrency", str(args.concurrency),
+            "--max-growth-mb", str(args.max_growth_mb),
+        ]
+        failed |= subprocess.run(command).returncode != 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Storage size, query latency and recall of the compact vector formats
+(rag.vector_storage): vector vs halfvec, shortened dimensions, and a binary
+quantized first pass with exact rerank.
+
+    cd backend
+    python benchmarks/vector_storage.py --rows 50000
+    python benchmarks/vector_storage.py --source embeddings --modes halfvec:512,halfvec:512+bq
+
+Each mode is written as `type:dimensions`, with `+bq` for binary rerank. Every
+mode gets its own throwaway copy of the same vectors, converted exactly like
+`manage.py convert_embeddings` does (subvector + l2_normalize), an index built
+like the app builds it, and is queried through the app's nearest_sql().
+Recall@k is measured against an exact search on the full 1536-dim vectors.
+
+`--source synthetic` (default) generates clustered unit vectors whose signal
+decays over the dimensions, the way text-embedding-3's shortenable vectors
+do; `--source embeddings` copies real rows from the embeddings table, which
+gives the recall numbers to trust.
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from rag.retrieve import vector_literal
+from rag.vector_storage import FULL_DIMENSIONS, nearest_sql
+
+SOURCE_TABLE = "bench_vs_source"
+DEFAULT_MODES = "vector:1536,halfvec:1536,vector:512,halfvec:512,vector:1536+bq,halfvec:512+bq"
+
+
+def parse_mode(text):
+    binary = text.endswith("+bq")
+    vector_type, dimensions = text.removesuffix("+bq").split(":")
+    return vector_type, int(dimensions), binary
+
+
+def create_source(cursor, source, rows, clusters):
+    cursor.execute(f"DROP TABLE IF EXISTS {SOURCE_TABLE}")
+    cursor.execute(f"CREATE TABLE {SOURCE_TABLE} (id bigint PRIMARY KEY, embedding vector({FULL_DIMENSIONS}))")
+    if source == "embeddings":
+        print(f"Copying up to {rows} rows from the embeddings table...")
+        cursor.execute(
+            f"""
+            INSERT INTO {SOURCE_TABLE} (id, embedding)
+            SELECT id, embedding::vector({FULL_DIMENSIONS}) FROM embeddings ORDER BY random() LIMIT %s
+            """,
+            [rows],
+        )
+    else:
+        print(f"Generating {rows} synthetic {FULL_DIMENSIONS}-dim vectors around {clusters} centres...")
+        cursor.execute(
+            f"""
+            WITH centres AS (
+                SELECT c, ARRAY(
+                    SELECT (random() * 2 - 1) * exp(-d / 300.0) FROM generate_series(1, %s) d WHERE c >= 0
+                ) AS v
+                FROM generate_series(0, %s - 1) c
+            )
+            INSERT INTO {SOURCE_TABLE} (id, embedding)
+            SELECT g, l2_normalize(ARRAY(
+                SELECT centres.v[d] + (random() - 0.5) * 0.3 * exp(-d / 300.0)
+                FROM generate_series(1, %s) d WHERE g >= 0
+            )::vector)
+            FROM generate_series(1, %s) g
+            JOIN centres ON centres.c = g %% %s
+            """,
+            [FULL_DIMENSIONS, clusters, FULL_DIMENSIONS, rows, clusters],
+        )
+    cursor.execute(f"ANALYZE {SOURCE_TABLE}")
+    cursor.execute(f"SELECT count(*) FROM {SOURCE_TABLE}")
+    return cursor.fetchone()[0]
+
+
+def sample_queries(cursor, count):
+    cursor.execute(f"SELECT (embedding::real[])::text FROM {SOURCE_TABLE} ORDER BY random() LIMIT %s", [count])
+    rng = random.Random(7)
+    queries = []
+    for (text,) in cursor.fetchall():
+        # Nudge each sampled row so the query is not an exact member of the table
+        values = [float(x) + rng.gauss(0, 0.005) for x in text.strip("{}").split(",")]
+        queries.append(values)
+    return queries
+
+
+def shorten(vector, dimensions):
+    # What the API's `dimensions` parameter returns: a prefix, re-normalised
+    head = vector[:dimensions]
+    norm = math.sqrt(sum(x * x for x in head)) or 1.0
+    return [x / norm for x in head]
+
+
+def exact_results(queries, top_k):
+    results = []
+    for q in queries:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            cursor.execute(
+                f"SELECT id FROM {SOURCE_TABLE} ORDER BY embedding <-> %s::vector LIMIT %s",
+                [vector_literal(q), top_k],
+            )
+            results.append([row[0] for row in cursor.fetchall()])
+    return results
+
+
+def bench_mode(mode, queries, exact, top_k, ef_search, candidates):
+    vector_type, dimensions, binary = parse_mode(mode)
+    table = "bench_vs_" + mode.replace(":", "_").replace("+", "_")
+    column_type = f"{vector_type}({dimensions})"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        value = "embedding" if dimensions == FULL_DIMENSIONS else f"l2_normalize(subvector(embedding, 1, {dimensions}))"
+        cursor.execute(f"CREATE TABLE {table} AS SELECT id, ({value})::{column_type} AS embedding FROM {SOURCE_TABLE}")
+        start = time.perf_counter()
+        if binary:
+            cursor.execute(
+                f"CREATE INDEX {table}_idx ON {table} "
+                f"USING hnsw ((binary_quantize(embedding)::bit({dimensions})) bit_hamming_ops)"
+            )
+        else:
+            cursor.execute(f"CREATE INDEX {table}_idx ON {table} USING hnsw (embedding {vector_type}_l2_ops)")
+        build_seconds = time.perf_counter() - start
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute(f"SELECT pg_table_size(%s), pg_relation_size(%s)", [table, f"{table}_idx"])
+        table_bytes, index_bytes = cursor.fetchone()
+
+    overrides = {
+        "RAG_VECTOR_TYPE": vector_type,
+        "RAG_EMBEDDING_DIMENSIONS": dimensions,
+        "RAG_BINARY_RERANK": binary,
+        "RAG_BINARY_CANDIDATES": candidates,
+    }
+    with override_settings(**overrides):
+        sql = nearest_sql(f"%(embedding)s::{column_type}", "TRUE", "%(top_k)s", table=table)
+        ef = max(ef_search, candidates if binary else 0)
+
+        results, latencies = [], []
+        for q in queries:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef)])
+                start = time.perf_counter()
+                cursor.execute(sql, {"embedding": vector_literal(shorten(q, dimensions)), "top_k": top_k})
+                results.append([row[0] for row in cursor.fetchall()])
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    recall = statistics.mean(len(set(r) & set(e)) / top_k for r, e in zip(results, exact))
+    p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else latencies[0]
+    print(
+        f"  {mode:<18} table={table_bytes / 2**20:8.1f}MB  index={index_bytes / 2**20:8.1f}MB  "
+        f"build={build_seconds:6.1f}s  recall@{top_k}={recall:5.3f}  "
+        f"avg={statistics.mean(latencies):6.2f}ms  p95={p95:6.2f}ms"
+    )
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["synthetic", "embeddings"], default="synthetic")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--modes", default=DEFAULT_MODES)
+    parser.add_argument("--ef-search", type=int, default=40)
+    parser.add_argument("--candidates", type=int, default=100, help="binary shortlist size (RAG_BINARY_CANDIDATES)")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark tables afterwards")
+    args = parser.parse_args()
+
+    tables = [SOURCE_TABLE]
+    try:
+        with connection.cursor() as cursor:
+            rows = create_source(cursor, args.source, args.rows, args.clusters)
+            queries = sample_queries(cursor, args.queries)
+        exact = exact_results(queries, args.top_k)
+
+        print(f"\n{rows} rows, {len(queries)} queries, HNSW ef_search={args.ef_search}")
+        for mode in args.modes.split(","):
+            tables.append(bench_mode(mode, queries, exact, args.top_k, args.ef_search, args.candidates))
+    finally:
+        if not args.keep:
+            with connection.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+if __name__ == "__main__":
+    main()
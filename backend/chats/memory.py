@@ -0,0 +1,72 @@
+"""
+Bounded conversation memory for chats sent with a conversation_id.
+
+The prompt gets the last RAG_HISTORY_TURNS turns verbatim, as many as fit in
+RAG_HISTORY_TOKENS - RAG_SUMMARY_TOKENS, plus a rolling summary of
+everything older of at most RAG_SUMMARY_TOKENS. Turns leaving the recent
+window are folded into the summary once, so each request costs at most one
+small summarization call and the prompt stops growing with the conversation.
+"""
+from django.conf import settings
+from rag.answer import summarize_turns
+from rag.chunk import estimate_tokens
+from .models import Chat, Conversation
+
+# Turns folded per summarization call; a longer backlog is folded over the next turns
+FOLD_BATCH = 10
+
+def _recent_turns(unsummarized):
+    budget = settings.RAG_HISTORY_TOKENS - settings.RAG_SUMMARY_TOKENS
+    recent, used = [], 0
+    for chat in unsummarized:
+        tokens = estimate_tokens(chat.question) + estimate_tokens(chat.answer)
+        if used + tokens > budget:
+            break
+        recent.append(chat)
+        used += tokens
+    return recent
+
+def conversation_history(conversation):
+    """
+    Returns {"summary": str, "turns": [(question, answer), ...]} for
+    rag.prompt.build_prompt, turns oldest first, folding turns that no
+    longer fit into the conversation's summary first.
+    """
+    # Turns of a conversation are saved one after the other, so id order is turn order
+    unsummarized = list(
+        Chat.objects
+        .filter(conversation=conversation, id__gt=conversation.summarized_until)
+        .order_by("-id")[:settings.RAG_HISTORY_TURNS]
+    )
+    recent = _recent_turns(unsummarized)
+
+    older = Chat.objects.filter(conversation=conversation, id__gt=conversation.summarized_until)
+    if recent:
+        older = older.filter(id__lt=recent[-1].id)
+    older = list(older.order_by("id")[:FOLD_BATCH])
+
+    if older:
+        summary = summarize_turns(
+            conversation.summary, [(chat.question, chat.answer) for chat in older], settings.RAG_SUMMARY_TOKENS
+        )
+        # A concurrent request that folded the same turns first wins; both summaries are equivalent
+        Conversation.objects.filter(
+            pk=conversation.pk, summarized_until=conversation.summarized_until
+        ).update(summary=summary, summarized_until=older[-1].id)
+        conversation.summary, conversation.summarized_until = summary, older[-1].id
+
+    return {
+        "summary": conversation.summary,
+        "turns": [(chat.question, chat.answer) for chat in reversed(recent)],
+    }
+
+def record_turn(conversation, question):
+    """Titles a new conversation after its first question and bumps updated_at."""
+    if not conversation.title:
+        conversation.title = question[:200]
+    conversation.save(update_fields=["title", "updated_at"])
+
+async def arecord_turn(conversation, question):
+    if not conversation.title:
+        conversation.title = question[:200]
+    await conversation.asave(update_fields=["title", "updated_at"])
@@ -1,12 +1,40 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+class Conversation(models.Model):
+    """
+    A thread of chats. Turns that drop out of the prompt's recent window are
+    folded into `summary` (see chats.memory); `summarized_until` is the id of
+    the newest chat already in it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=200, blank=True, default="")
+    summary = models.TextField(blank=True, default="")
+    summarized_until = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='conversation_user_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"Conversation {self.id} by {self.user.username}"
+
 class Chat(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    conversation = models.ForeignKey(Conversation, null=True, blank=True, on_delete=models.CASCADE, related_name="chats")
     question = models.TextField()
     answer = models.TextField()
     sources = models.JSONField() # Stores file names/types
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # History pages are read newest first by (created_at, id) keyset
+            models.Index(fields=['user', 'created_at', 'id'], name='chat_user_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Chat by {self.user.username} - {self.created_at}"
\ No newline at end of file
+        return f"Chat by {self.user.username} - {self.created_at}"
@@ -1,3 +1,63 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Chat, Conversation
+from .views import _decode_cursor, _encode_cursor
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        # Seven chats; the middle three share one timestamp so pages must break ties on id
+        now = timezone.now()
+        self.chats = []
+        for i, minutes in enumerate([10, 9, 8, 8, 8, 2, 1]):
+            chat = Chat.objects.create(user=self.user, question=f"q{i}", answer=f"a{i}", sources=[])
+            Chat.objects.filter(pk=chat.pk).update(created_at=now - timedelta(minutes=minutes))
+            self.chats.append(chat)
+        self.newest_first = sorted(
+            Chat.objects.filter(user=self.user), key=lambda chat: (chat.created_at, chat.id), reverse=True
+        )
+
+    def pages(self, limit, **params):
+        ids, cursor = [], None
+        while True:
+            query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+            body = self.client.get("/api/chat/history/", query).json()
+            ids.append([row["id"] for row in body["results"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_chat_once_newest_first(self):
+        pages = self.pages(2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual(sum(pages, []), [chat.id for chat in self.newest_first])
+
+    def test_exact_last_page_has_no_cursor(self):
+        self.assertEqual([len(page) for page in self.pages(7)], [7])
+
+    def test_cursor_round_trip(self):
+        chat = self.newest_first[3]
+        self.assertEqual(_decode_cursor(_encode_cursor(chat)), (chat.created_at, chat.id))
+
+    def test_other_users_chats_are_not_listed(self):
+        other = User.objects.create_user(username="other")
+        Chat.objects.create(user=other, question="q", answer="a", sources=[])
+        self.assertEqual(len(sum(self.pages(100), [])), len(self.chats))
+
+    def test_filter_by_conversation(self):
+        conversation = Conversation.objects.create(user=self.user)
+        Chat.objects.filter(pk__in=[self.chats[1].pk, self.chats[3].pk]).update(conversation=conversation)
+        self.assertEqual(self.pages(1, conversation_id=conversation.id), [[self.chats[3].id], [self.chats[1].id]])
 
-# Create your tests here.
+    def test_bad_parameters(self):
+        for query in ({"cursor": "not a cursor"}, {"limit": "x"}, {"limit": 0}):
+            self.assertEqual(self.client.get("/api/chat/history/", query).status_code, 400)
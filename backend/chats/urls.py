@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import chat
+from .views import chat, chat_async, chat_batch, chat_history, chat_stream, conversations
 
 urlpatterns = [
     path("", chat, name="chat_api"),
+    path("stream/", chat_stream, name="chat_stream_api"),
+    path("async/", chat_async, name="chat_async_api"),
+    path("batch/", chat_batch, name="chat_batch_api"),
+    path("history/", chat_history, name="chat_history_api"),
+    path("conversations/", conversations, name="conversations_api"),
 ]
\ No newline at end of file
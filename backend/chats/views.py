@@ -1,41 +1,46 @@
+import base64
+import binascii
 import json
-from rest_framework.decorators import api_view, permission_classes
+import traceback
+from datetime import datetime
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from rag.chat_engine import chat_with_rag
-from .models import Chat
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rag.chat_engine import chat_with_rag, achat_with_rag, batch_chat_with_rag, stream_chat_with_rag
+from rag.prompt import has_history
+from .memory import arecord_turn, conversation_history, record_turn
+from .models import Chat, Conversation
+from .renderers import EventStreamRenderer
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def chat(request):
-    question = request.data.get("question", "").strip()
-    asset_ids = request.data.get("asset_ids") 
+GREETINGS = ["hi", "hello", "hey", "how are you", "good morning", "good afternoon", "thanks", "thank you"]
+FRIENDLY_ANSWER = "Hello! 👋 I'm ready to help. I've analyzed the files you provided—is there something specific you'd like me to look up or summarize for you?"
+NEGATIVE_RESPONSES = ["i do not know", "i couldn't find", "no information", "i don't have access"]
+FALLBACK_ANSWER = (
+    "I've searched through the documents, but I couldn't find a specific answer to that. "
+    "Could you try rephrasing the question, or would you like me to summarize the main topics I found instead?"
+)
 
-    if not question:
-        return Response({"error": "Please provide a question"}, status=400)
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+CONVERSATION_LIST_SIZE = 50
+ASSET_IDS_ERROR = "asset_ids must be a list of asset ids"
 
-    # 🟢 1. The Conversational Layer
-    # Catches greetings or general polite inquiries to keep the flow natural.
-    greetings = ["hi", "hello", "hey", "how are you", "good morning", "good afternoon", "thanks", "thank you"]
-    
-    # Check if the question is basically just a greeting/small talk
-    is_small_talk = any(greet == question.lower().rstrip('?!.') for greet in greetings) or len(question.split()) < 3
-    
-    if is_small_talk and not asset_ids:
-        friendly_answer = "Hello! 👋 I'm ready to help. I've analyzed the files you provided—is there something specific you'd like me to look up or summarize for you?"
-        
-        # Save to history for continuity
-        Chat.objects.create(user=request.user, question=question, answer=friendly_answer, sources=[])
-        
-        return Response({
-            "answer": friendly_answer,
-            "sources": []
-        })
+def is_small_talk(question, follow_up=False):
+    # Check if the question is basically just a greeting/small talk.
+    # Inside a conversation, short questions are follow-ups ("and why?") instead.
+    if any(greet == question.lower().rstrip('?!.') for greet in GREETINGS):
+        return True
+    return not follow_up and len(question.split()) < 3
 
-    # 🟡 2. Execute RAG logic
-    answer, chunks = chat_with_rag(request.user, question, asset_ids)
-
-    # 🔵 3. Prepare UNIQUE sources
+def unique_sources_for(chunks):
     unique_sources = []
     seen_filenames = set()
 
@@ -55,24 +60,358 @@ def chat(request):
             })
             seen_filenames.add(filename)
 
-    # 🔴 4. The "Helpful Partner" Fallback
+    return unique_sources
+
+def parse_asset_ids(value):
+    """
+    `asset_ids` from a request body as a list of ints, or None when no
+    assets were selected. Raises ValueError for anything but a list of ids.
+    """
+    if value is None or value == []:
+        return None
+    if not isinstance(value, list):
+        raise ValueError(value)
+    # Through str so 1.5 and true are rejected rather than truncated to an id
+    return [int(str(i)) for i in value]
+
+def find_conversation(user, conversation_id):
+    try:
+        return Conversation.objects.get(id=int(conversation_id), user=user)
+    except (TypeError, ValueError, Conversation.DoesNotExist):
+        return None
+
+def save_chat(user, question, answer, sources, conversation=None):
+    chat_row = Chat.objects.create(
+        user=user, conversation=conversation, question=question, answer=answer, sources=sources
+    )
+    if conversation:
+        record_turn(conversation, question)
+    return chat_row
+
+def chat_body(answer, sources, conversation=None):
+    body = {"answer": answer, "sources": sources}
+    if conversation:
+        body["conversation_id"] = conversation.id
+    return body
+
+def soften_answer(answer, unique_sources):
     # If the RAG engine returns a generic "I don't know," we soften it.
-    negative_responses = ["i do not know", "i couldn't find", "no information", "i don't have access"]
-    if any(neg in answer.lower() for neg in negative_responses) and not unique_sources:
-        answer = (
-            "I've searched through the documents, but I couldn't find a specific answer to that. "
-            "Could you try rephrasing the question, or would you like me to summarize the main topics I found instead?"
-        )
+    if any(neg in answer.lower() for neg in NEGATIVE_RESPONSES) and not unique_sources:
+        return FALLBACK_ANSWER
+    return answer
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def chat(request):
+    """
+    With a `conversation_id` (from POST /api/chat/conversations/) the answer
+    takes the conversation so far into account, see chats.memory.
+    """
+    question = request.data.get("question", "").strip()
+    conversation_id = request.data.get("conversation_id")
+
+    if not question:
+        return Response({"error": "Please provide a question"}, status=400)
+    try:
+        asset_ids = parse_asset_ids(request.data.get("asset_ids"))
+    except (TypeError, ValueError):
+        return Response({"error": ASSET_IDS_ERROR}, status=400)
+
+    conversation = history = None
+    if conversation_id is not None:
+        conversation = find_conversation(request.user, conversation_id)
+        if conversation is None:
+            return Response({"error": "Conversation not found"}, status=404)
+        history = conversation_history(conversation)
+
+    # 🟢 1. The Conversational Layer
+    # Catches greetings or general polite inquiries to keep the flow natural.
+    if is_small_talk(question, follow_up=has_history(history)) and not asset_ids:
+        friendly_answer = FRIENDLY_ANSWER
+        
+        # Save to history for continuity
+        save_chat(request.user, question, friendly_answer, [], conversation)
+        
+        return Response(chat_body(friendly_answer, [], conversation))
+
+    # 🟡 2. Execute RAG logic
+    answer, chunks = chat_with_rag(request.user, question, asset_ids, history=history)
+
+    # 🔵 3. Prepare UNIQUE sources
+    unique_sources = unique_sources_for(chunks)
+
+    # 🔴 4. The "Helpful Partner" Fallback
+    answer = soften_answer(answer, unique_sources)
 
     # 🟣 5. Save factual Q&A to DB
-    Chat.objects.create(
-        user=request.user,
-        question=question,
-        answer=answer,
-        sources=unique_sources
+    save_chat(request.user, question, answer, unique_sources, conversation)
+
+    return Response(chat_body(answer, unique_sources, conversation))
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def chat_batch(request):
+    """
+    Answers a list of questions over the same assets in one request:
+
+      {"questions": ["...", ...], "asset_ids": [...]}
+      -> {"results": [{"question", "answer", "sources", "chat_id"}, ...]}
+
+    Results are in the order of the questions; each is saved as a Chat row.
+    """
+    questions = request.data.get("questions")
+
+    if not isinstance(questions, list) or not questions:
+        return Response({"error": "Please provide a list of questions"}, status=400)
+    try:
+        asset_ids = parse_asset_ids(request.data.get("asset_ids"))
+    except (TypeError, ValueError):
+        return Response({"error": ASSET_IDS_ERROR}, status=400)
+    if len(questions) > settings.RAG_BATCH_CHAT_MAX_QUESTIONS:
+        return Response({"error": f"At most {settings.RAG_BATCH_CHAT_MAX_QUESTIONS} questions per request"}, status=400)
+    questions = [str(q).strip() for q in questions]
+    if not all(questions):
+        return Response({"error": "Questions must not be empty"}, status=400)
+
+    # Small talk gets the friendly answer, exactly like the single chat endpoint
+    rag_indexes = [i for i, q in enumerate(questions) if asset_ids or not is_small_talk(q)]
+    answers = {i: (FRIENDLY_ANSWER, []) for i in range(len(questions))}
+    if rag_indexes:
+        rag_results = batch_chat_with_rag(request.user, [questions[i] for i in rag_indexes], asset_ids)
+        answers.update(zip(rag_indexes, rag_results))
+
+    rows = []
+    for i, question in enumerate(questions):
+        answer, chunks = answers[i]
+        unique_sources = unique_sources_for(chunks)
+        rows.append(Chat(
+            user=request.user,
+            question=question,
+            answer=soften_answer(answer, unique_sources),
+            sources=unique_sources,
+        ))
+    rows = Chat.objects.bulk_create(rows)
+
+    return Response({
+        "results": [
+            {"question": row.question, "answer": row.answer, "sources": row.sources, "chat_id": row.id}
+            for row in rows
+        ]
+    })
+
+async def authenticate_async(request):
+    """JWT auth for plain async views, which DRF's @api_view does not support."""
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    return result[0] if result else None
+
+@csrf_exempt
+@require_POST
+async def chat_async(request):
+    """
+    Async twin of `chat` for ASGI servers (uvicorn backend.asgi:application).
+    Same request and response bodies; the event loop is free while OpenAI and
+    Postgres are working, instead of one thread being blocked per chat.
+    """
+    try:
+        user = await authenticate_async(request)
+    except AuthenticationFailed as e:
+        # Same body DRF would send for the failure
+        detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+        return JsonResponse(detail, status=401)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    question = (data.get("question") or "").strip()
+    conversation_id = data.get("conversation_id")
+
+    if not question:
+        return JsonResponse({"error": "Please provide a question"}, status=400)
+    try:
+        asset_ids = parse_asset_ids(data.get("asset_ids"))
+    except (TypeError, ValueError):
+        return JsonResponse({"error": ASSET_IDS_ERROR}, status=400)
+
+    conversation = history = None
+    if conversation_id is not None:
+        conversation = await sync_to_async(find_conversation)(user, conversation_id)
+        if conversation is None:
+            return JsonResponse({"error": "Conversation not found"}, status=404)
+        # Off the shared sync thread: folding old turns may call the LLM
+        history = await sync_to_async(conversation_history, thread_sensitive=False)(conversation)
+
+    if is_small_talk(question, follow_up=has_history(history)) and not asset_ids:
+        answer, unique_sources = FRIENDLY_ANSWER, []
+    else:
+        answer, chunks = await achat_with_rag(user, question, asset_ids, history=history)
+        unique_sources = unique_sources_for(chunks)
+        answer = soften_answer(answer, unique_sources)
+
+    await Chat.objects.acreate(
+        user=user, conversation=conversation, question=question, answer=answer, sources=unique_sources
     )
+    if conversation:
+        await arecord_turn(conversation, question)
+
+    return JsonResponse(chat_body(answer, unique_sources, conversation))
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def chat_stream(request):
+    """
+    Streaming variant of `chat` using Server-Sent Events:
+
+      event: sources  -> {"sources": [...]}          (sent before generation starts)
+      event: token    -> {"text": "..."}             (one per model delta)
+      event: done     -> {"answer": "...", "chat_id": N}
+      (accepts `conversation_id` like `chat`)
+      event: error    -> {"error": "..."}
 
+    The `done` answer is authoritative: it may differ from the streamed text
+    when the "helpful partner" fallback kicks in.
+    """
+    question = request.data.get("question", "").strip()
+    conversation_id = request.data.get("conversation_id")
+
+    if not question:
+        return Response({"error": "Please provide a question"}, status=400)
+    try:
+        asset_ids = parse_asset_ids(request.data.get("asset_ids"))
+    except (TypeError, ValueError):
+        return Response({"error": ASSET_IDS_ERROR}, status=400)
+
+    conversation = history = None
+    if conversation_id is not None:
+        conversation = find_conversation(request.user, conversation_id)
+        if conversation is None:
+            return Response({"error": "Conversation not found"}, status=404)
+        history = conversation_history(conversation)
+
+    if is_small_talk(question, follow_up=has_history(history)) and not asset_ids:
+        tokens, chunks = iter([FRIENDLY_ANSWER]), []
+    else:
+        tokens, chunks = stream_chat_with_rag(request.user, question, asset_ids, history=history)
+
+    unique_sources = unique_sources_for(chunks)
+    user = request.user
+
+    def events():
+        parts = []
+        finished = False
+        try:
+            yield sse_event("sources", {"sources": unique_sources})
+            for text in tokens:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            finished = True
+        except Exception as e:
+            traceback.print_exc()
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            # Persist whatever was generated, even if the client went away mid-stream
+            answer = "".join(parts)
+            if answer:
+                answer = soften_answer(answer, unique_sources)
+                chat_row = save_chat(user, question, answer, unique_sources, conversation)
+                if finished:
+                    yield sse_event("done", {"answer": answer, "chat_id": chat_row.id})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx and similar proxies from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _encode_cursor(chat_row):
+    raw = f"{chat_row.created_at.isoformat()}|{chat_row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    created_at, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return datetime.fromisoformat(created_at), int(chat_id)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def chat_history(request):
+    """
+    The user's saved chats, newest first, one page at a time:
+
+      GET /api/chat/history/?limit=20&cursor=...&conversation_id=N
+      -> {"results": [{"id", "question", "answer", "sources", "conversation_id", "created_at"}, ...],
+          "next_cursor": "..." or null}
+
+    Pages are keyset-paginated on (created_at, id) over chat_user_created_idx,
+    so a page deep in the history costs the same as the first one. Pass
+    next_cursor back as `cursor` for the following page.
+    """
+    params = request.query_params
+    try:
+        limit = min(int(params.get("limit", HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        conversation_id = int(params["conversation_id"]) if params.get("conversation_id") else None
+    except ValueError:
+        return Response({"error": "limit and conversation_id must be numbers"}, status=400)
+    if limit < 1:
+        return Response({"error": "limit must be at least 1"}, status=400)
+
+    chats = Chat.objects.filter(user=request.user)
+    if conversation_id is not None:
+        chats = chats.filter(conversation_id=conversation_id)
+    if params.get("cursor"):
+        try:
+            created_at, chat_id = _decode_cursor(params["cursor"])
+        except (ValueError, binascii.Error):
+            return Response({"error": "Invalid cursor"}, status=400)
+        # (created_at, id) < cursor; the plain created_at bound is what lets
+        # Postgres start the index scan at the cursor instead of at the newest chat
+        chats = chats.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=chat_id)
+
+    rows = list(chats.order_by("-created_at", "-id")[:limit + 1])
+    page = rows[:limit]
     return Response({
-        "answer": answer,
-        "sources": unique_sources
-    })
\ No newline at end of file
+        "results": [
+            {
+                "id": row.id,
+                "question": row.question,
+                "answer": row.answer,
+                "sources": row.sources,
+                "conversation_id": row.conversation_id,
+                "created_at": row.created_at,
+            }
+            for row in page
+        ],
+        "next_cursor": _encode_cursor(page[-1]) if len(rows) > limit else None,
+    })
+
+def _conversation_body(conversation):
+    return {
+        "id": conversation.id,
+        "title": conversation.title,
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+    }
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def conversations(request):
+    """
+    POST starts a conversation; send its id as `conversation_id` with chat
+    requests to get answers that remember the earlier turns. GET lists the
+    most recently active ones.
+    """
+    if request.method == "POST":
+        conversation = Conversation.objects.create(
+            user=request.user, title=str(request.data.get("title") or "")[:200]
+        )
+        return Response(_conversation_body(conversation), status=201)
+
+    rows = Conversation.objects.filter(user=request.user).order_by("-updated_at")[:CONVERSATION_LIST_SIZE]
+    return Response([_conversation_body(row) for row in rows])
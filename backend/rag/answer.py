@@ -1,4 +1,11 @@
-from .openai_client import client
+from .openai_client import client, async_client
+from .prompt import build_summary_prompt
+from . import metrics
+
+def _count_usage(usage):
+    if usage:
+        metrics.TOKENS.inc(usage.prompt_tokens, kind="prompt")
+        metrics.TOKENS.inc(usage.completion_tokens, kind="completion")
 
 def generate_answer(prompt):
     print(f"   🤖 LLM: Requesting final answer from gpt-4o-mini...")
@@ -6,4 +13,40 @@ def generate_answer(prompt):
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
     )
-    return response.choices[0].message.content
\ No newline at end of file
+    _count_usage(response.usage)
+    return response.choices[0].message.content
+
+async def agenerate_answer(prompt):
+    print(f"   🤖 LLM: Requesting final answer from gpt-4o-mini (async)...")
+    response = await async_client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+    )
+    _count_usage(response.usage)
+    return response.choices[0].message.content
+
+def stream_answer(prompt):
+    """Yields the answer text piece by piece as the model produces it."""
+    print(f"   🤖 LLM: Streaming final answer from gpt-4o-mini...")
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        # Adds a final event with token usage for the metrics
+        stream_options={"include_usage": True},
+    )
+    for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+        _count_usage(getattr(event, "usage", None))
+
+def summarize_turns(summary, turns, max_tokens):
+    """Folds (question, answer) turns into a conversation's running summary."""
+    print(f"   🤖 LLM: Folding {len(turns)} turns into the conversation summary...")
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": build_summary_prompt(summary, turns, max_tokens)}],
+        max_tokens=max_tokens,
+    )
+    _count_usage(response.usage)
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,142 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from .models import AnswerCache
+from .retrieve import vector_literal
+from . import async_db
+from . import metrics
+
+def asset_scope(asset_ids):
+    if not asset_ids:
+        return "all"
+    return ",".join(str(i) for i in sorted({int(i) for i in asset_ids}))
+
+LOOKUP_SQL = """
+    SELECT answer, chunks, 1 - (question_embedding <=> %s::vector) AS similarity
+    FROM answer_cache
+    WHERE user_id = %s
+      AND asset_scope = %s
+      AND created_at > %s
+    ORDER BY question_embedding <=> %s::vector
+    LIMIT 1
+"""
+
+def _ttl_cutoff():
+    # Answers created before this are past RAG_ANSWER_CACHE_TTL
+    return timezone.now() - timedelta(seconds=settings.RAG_ANSWER_CACHE_TTL)
+
+def _lookup_params(user_id, asset_ids, query_embedding):
+    return [query_embedding, user_id, asset_scope(asset_ids), _ttl_cutoff(), query_embedding]
+
+def _cached_answer(row):
+    if row is None or row[2] < settings.RAG_ANSWER_CACHE_THRESHOLD:
+        metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss")
+        return None
+
+    metrics.CACHE_LOOKUPS.inc(cache="answer", result="hit")
+    print(f"   ⚡ CACHE: Answer served from semantic cache (similarity {row[2]:.3f}).")
+    chunks = row[1]
+    if isinstance(chunks, str):
+        chunks = json.loads(chunks)
+    return row[0], chunks
+
+def lookup_cached_answer(user_id, asset_ids, query_embedding):
+    """
+    Returns (answer, chunks) for the most similar previously answered question
+    over the same asset selection, or None if nothing is similar enough.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LOOKUP_SQL, _lookup_params(user_id, asset_ids, query_embedding))
+        row = cursor.fetchone()
+    return _cached_answer(row)
+
+async def alookup_cached_answer(user_id, asset_ids, query_embedding):
+    async with async_db.transaction() as cursor:
+        await cursor.execute(LOOKUP_SQL, _lookup_params(user_id, asset_ids, query_embedding))
+        row = await cursor.fetchone()
+    return _cached_answer(row)
+
+BATCH_LOOKUP_SQL = """
+    SELECT q.ord, hit.answer, hit.chunks, hit.similarity
+    FROM unnest(%s::vector[]) WITH ORDINALITY AS q(embedding, ord)
+    CROSS JOIN LATERAL (
+        SELECT answer, chunks, 1 - (question_embedding <=> q.embedding) AS similarity
+        FROM answer_cache
+        WHERE user_id = %s
+          AND asset_scope = %s
+          AND created_at > %s
+        ORDER BY question_embedding <=> q.embedding
+        LIMIT 1
+    ) hit
+"""
+
+def lookup_cached_answers(user_id, asset_ids, query_embeddings):
+    """lookup_cached_answer for many questions in one query; one result (or None) per question."""
+    if not query_embeddings:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            BATCH_LOOKUP_SQL,
+            [[vector_literal(v) for v in query_embeddings], user_id, asset_scope(asset_ids), _ttl_cutoff()],
+        )
+        rows = {row[0]: row[1:] for row in cursor.fetchall()}
+    return [_cached_answer(rows.get(i)) for i in range(1, len(query_embeddings) + 1)]
+
+def _expired(user_id=None):
+    expired = AnswerCache.objects.filter(created_at__lte=_ttl_cutoff())
+    return expired if user_id is None else expired.filter(user_id=user_id)
+
+def prune_expired_answers(user_id=None):
+    """
+    Deletes cached answers past RAG_ANSWER_CACHE_TTL, of one user or of
+    everyone. Lookups already ignore them; this keeps the table from
+    growing. Returns the number deleted.
+    """
+    deleted, _ = _expired(user_id).delete()
+    return deleted
+
+def store_cached_answer(user_id, asset_ids, question, query_embedding, answer, chunks):
+    # Every write also clears the user's expired answers
+    prune_expired_answers(user_id)
+    AnswerCache.objects.create(
+        user_id=user_id,
+        asset_scope=asset_scope(asset_ids),
+        question=question,
+        question_embedding=query_embedding,
+        answer=answer,
+        chunks=chunks,
+    )
+
+def store_cached_answers(user_id, asset_ids, entries):
+    """Bulk store_cached_answer; `entries` are (question, query_embedding, answer, chunks)."""
+    scope = asset_scope(asset_ids)
+    prune_expired_answers(user_id)
+    AnswerCache.objects.bulk_create([
+        AnswerCache(
+            user_id=user_id,
+            asset_scope=scope,
+            question=question,
+            question_embedding=query_embedding,
+            answer=answer,
+            chunks=chunks,
+        )
+        for question, query_embedding, answer, chunks in entries
+    ])
+
+async def astore_cached_answer(user_id, asset_ids, question, query_embedding, answer, chunks):
+    await _expired(user_id).adelete()
+    await AnswerCache.objects.acreate(
+        user_id=user_id,
+        asset_scope=asset_scope(asset_ids),
+        question=question,
+        question_embedding=query_embedding,
+        answer=answer,
+        chunks=chunks,
+    )
+
+def invalidate_answer_cache(user_id):
+    """Drops every cached answer for the user; call whenever their assets change."""
+    deleted, _ = AnswerCache.objects.filter(user_id=user_id).delete()
+    return deleted
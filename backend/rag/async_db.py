@@ -0,0 +1,64 @@
+"""
+Async Postgres access for the ASGI chat path.
+
+Django's async ORM still runs every query in a worker thread, so the hot read
+queries of a chat (answer cache lookup, retrieval) go through a psycopg 3
+AsyncConnectionPool instead and only wait on the socket. Connections come from
+the same DATABASES["default"] settings. Client-side binding cursors are used
+so the SQL and parameters are interpreted exactly as on Django's connection.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from django.conf import settings
+from psycopg import AsyncClientCursor
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+_pool = None
+_pool_lock = None
+
+def conninfo():
+    db = settings.DATABASES["default"]
+    return make_conninfo(
+        dbname=db["NAME"],
+        user=db.get("USER") or None,
+        password=db.get("PASSWORD") or None,
+        host=db.get("HOST") or None,
+        port=db.get("PORT") or None,
+    )
+
+async def get_pool():
+    """The pool is opened lazily inside the running event loop (one per worker)."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            pool = AsyncConnectionPool(
+                conninfo(),
+                min_size=1,
+                max_size=settings.RAG_ASYNC_DB_POOL_SIZE,
+                kwargs={"cursor_factory": AsyncClientCursor},
+                open=False,
+            )
+            await pool.open()
+            _pool = pool
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def transaction():
+    """Yields a cursor inside a transaction, so set_config(..., true) applies to it."""
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            async with conn.cursor() as cursor:
+                yield cursor
@@ -1,22 +1,194 @@
 import time
-from .query_embedding import embed_query
-from .retrieve import retrieve_similar_chunks
-from .prompt import build_prompt
-from .answer import generate_answer
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .query_embedding import embed_query, embed_queries, aembed_query
+from .retrieve import (
+    retrieve_similar_chunks, retrieve_hybrid_chunks, retrieve_diverse_chunks, retrieve_chunks_batch,
+    aretrieve_similar_chunks, aretrieve_hybrid_chunks, aretrieve_diverse_chunks,
+)
+from .prompt import build_prompt, has_history
+from .answer import generate_answer, agenerate_answer, stream_answer
+from .answer_cache import (
+    lookup_cached_answer, lookup_cached_answers, store_cached_answer, store_cached_answers,
+    alookup_cached_answer, astore_cached_answer,
+)
+from . import metrics
 
-def chat_with_rag(user, question, asset_ids=None):
+def retrieve_chunks(user, question, q_vec, asset_ids=None):
+    with metrics.timed("retrieve"):
+        if settings.RAG_MMR:
+            chunks = retrieve_diverse_chunks(user.id, question, q_vec, asset_ids)
+        elif settings.RAG_HYBRID_SEARCH:
+            chunks = retrieve_hybrid_chunks(user.id, question, q_vec, asset_ids)
+        else:
+            chunks = retrieve_similar_chunks(user.id, q_vec, asset_ids)
+    metrics.CHUNKS.inc(len(chunks), kind="retrieved")
+    return chunks
+
+async def aretrieve_chunks(user, question, q_vec, asset_ids=None):
+    with metrics.timed("retrieve"):
+        if settings.RAG_MMR:
+            chunks = await aretrieve_diverse_chunks(user.id, question, q_vec, asset_ids)
+        elif settings.RAG_HYBRID_SEARCH:
+            chunks = await aretrieve_hybrid_chunks(user.id, question, q_vec, asset_ids)
+        else:
+            chunks = await aretrieve_similar_chunks(user.id, q_vec, asset_ids)
+    metrics.CHUNKS.inc(len(chunks), kind="retrieved")
+    return chunks
+
+def search_text(question, history=None):
+    """
+    What retrieval searches for. A follow-up ("and the penalties?") finds
+    little on its own, so the previous question of the conversation rides along.
+    """
+    if history and history["turns"]:
+        return f"{history['turns'][-1][0]}\n{question}"
+    return question
+
+def chat_with_rag(user, question, asset_ids=None, history=None):
+    """
+    `history` (chats.memory.conversation_history) makes the answer
+    conversation-aware. Such answers depend on more than the question, so
+    they are neither served from nor stored in the semantic answer cache.
+    """
     print(f"\n{'='*15} 🚀 RAG CHAT PROCESS START {'='*15}")
     start_time = time.time()
+    query = search_text(question, history)
+    use_cache = not has_history(history)
+
+    # Step 1: Embed, then try the semantic answer cache
+    with metrics.timed("query_embed"):
+        q_vec = embed_query(query)
+    cached = use_cache and lookup_cached_answer(user.id, asset_ids, q_vec)
+    if cached:
+        duration = round(time.time() - start_time, 2)
+        print(f"{'='*15} ✅ PROCESS COMPLETE FROM CACHE ({duration}s) {'='*15}\n")
+        return cached
 
-    # Step 1 & 2: Embed and Retrieve
-    q_vec = embed_query(question)
-    chunks = retrieve_similar_chunks(user.id, q_vec, asset_ids)
+    # Step 2: Retrieve
+    chunks = retrieve_chunks(user, query, q_vec, asset_ids)
 
     # Step 3 & 4: Prompt and Answer
-    full_prompt = build_prompt(chunks, question)
-    answer = generate_answer(full_prompt)
+    with metrics.timed("prompt_build"):
+        full_prompt = build_prompt(chunks, question, history=history)
+    with metrics.timed("generate"):
+        answer = generate_answer(full_prompt)
+    if use_cache:
+        store_cached_answer(user.id, asset_ids, question, q_vec, answer, chunks)
 
     duration = round(time.time() - start_time, 2)
     print(f"{'='*15} ✅ PROCESS COMPLETE ({duration}s) {'='*15}\n")
 
-    return answer, chunks
\ No newline at end of file
+    return answer, chunks
+
+def _generate_timed(prompt):
+    with metrics.timed("generate"):
+        return generate_answer(prompt)
+
+def batch_chat_with_rag(user, questions, asset_ids=None, max_workers=None):
+    """
+    chat_with_rag for a list of questions over the same assets. Embedding,
+    the answer cache lookup and retrieval each take one call for the whole
+    batch; answers are generated concurrently, at most `max_workers`
+    (RAG_BATCH_CHAT_CONCURRENCY) at a time. Returns [(answer, chunks), ...]
+    in the order of `questions`.
+    """
+    print(f"\n{'='*15} 🚀 RAG BATCH CHAT START ({len(questions)} questions) {'='*15}")
+    start_time = time.time()
+    max_workers = max_workers or settings.RAG_BATCH_CHAT_CONCURRENCY
+
+    with metrics.timed("batch_query_embed"):
+        q_vecs = embed_queries(questions)
+    results = lookup_cached_answers(user.id, asset_ids, q_vecs)
+
+    todo = [i for i, cached in enumerate(results) if cached is None]
+    if todo:
+        with metrics.timed("batch_retrieve"):
+            retrieved = retrieve_chunks_batch(
+                user.id, [questions[i] for i in todo], [q_vecs[i] for i in todo], asset_ids
+            )
+        metrics.CHUNKS.inc(sum(len(chunks) for chunks in retrieved), kind="retrieved")
+
+        with metrics.timed("prompt_build"):
+            prompts = [build_prompt(chunks, questions[i]) for i, chunks in zip(todo, retrieved)]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+            answers = list(pool.map(_generate_timed, prompts))
+
+        for i, chunks, answer in zip(todo, retrieved, answers):
+            results[i] = (answer, chunks)
+        store_cached_answers(
+            user.id, asset_ids,
+            [(questions[i], q_vecs[i], answer, chunks) for i, chunks, answer in zip(todo, retrieved, answers)],
+        )
+
+    duration = round(time.time() - start_time, 2)
+    print(f"{'='*15} ✅ BATCH COMPLETE ({len(questions) - len(todo)} from cache, {duration}s) {'='*15}\n")
+    return results
+
+async def achat_with_rag(user, question, asset_ids=None, history=None):
+    """
+    Async chat_with_rag for the ASGI view: every network wait (OpenAI, Postgres)
+    is awaited, so one worker process serves many chats concurrently.
+    """
+    print(f"\n{'='*15} 🚀 RAG ASYNC CHAT START {'='*15}")
+    start_time = time.time()
+    query = search_text(question, history)
+    use_cache = not has_history(history)
+
+    with metrics.timed("query_embed"):
+        q_vec = await aembed_query(query)
+    cached = use_cache and await alookup_cached_answer(user.id, asset_ids, q_vec)
+    if cached:
+        duration = round(time.time() - start_time, 2)
+        print(f"{'='*15} ✅ PROCESS COMPLETE FROM CACHE ({duration}s) {'='*15}\n")
+        return cached
+
+    chunks = await aretrieve_chunks(user, query, q_vec, asset_ids)
+
+    # Prompt packing is CPU only and takes well under a millisecond
+    with metrics.timed("prompt_build"):
+        full_prompt = build_prompt(chunks, question, history=history)
+    with metrics.timed("generate"):
+        answer = await agenerate_answer(full_prompt)
+    if use_cache:
+        await astore_cached_answer(user.id, asset_ids, question, q_vec, answer, chunks)
+
+    duration = round(time.time() - start_time, 2)
+    print(f"{'='*15} ✅ PROCESS COMPLETE ({duration}s) {'='*15}\n")
+
+    return answer, chunks
+
+def stream_chat_with_rag(user, question, asset_ids=None, history=None):
+    """
+    Same pipeline as chat_with_rag, but returns (token_stream, chunks) as soon
+    as retrieval is done, so the caller can send sources before the answer.
+    """
+    print(f"\n{'='*15} 🚀 RAG STREAMING CHAT START {'='*15}")
+    query = search_text(question, history)
+    use_cache = not has_history(history)
+
+    with metrics.timed("query_embed"):
+        q_vec = embed_query(query)
+    cached = use_cache and lookup_cached_answer(user.id, asset_ids, q_vec)
+    if cached:
+        answer, chunks = cached
+        return iter([answer]), chunks
+
+    chunks = retrieve_chunks(user, query, q_vec, asset_ids)
+    with metrics.timed("prompt_build"):
+        full_prompt = build_prompt(chunks, question, history=history)
+
+    def tokens():
+        parts = []
+        start = time.perf_counter()
+        for text in stream_answer(full_prompt):
+            if not parts:
+                metrics.observe_stage("generate_first_token", time.perf_counter() - start)
+            parts.append(text)
+            yield text
+        metrics.observe_stage("generate", time.perf_counter() - start)
+        # Only complete answers are cached
+        if use_cache:
+            store_cached_answer(user.id, asset_ids, question, q_vec, "".join(parts), chunks)
+
+    return tokens(), chunks
@@ -1,3 +1,24 @@
+import re
+import zlib
+from collections import deque
+from functools import lru_cache
+import tiktoken
+from django.conf import settings
+
+# The tokenizer used by text-embedding-3-small
+TOKENIZER = "cl100k_base"
+# Rough size of a cl100k token in English text, for estimates without the tokenizer
+CHARS_PER_TOKEN = 4
+
+# Once a chunk is half full, it also ends after any sentence whose checksum is
+# a multiple of this. Boundaries then depend on the text around them rather
+# than on everything before, so an edit only re-chunks its neighbourhood and
+# a replaced file keeps most of its chunks (rag.store.diff_chunks).
+ANCHOR_PERIOD = 8
+
+# Split after sentence-ending punctuation or at a line break, keeping the separator
+SENTENCE_BOUNDARY = re.compile(r"((?<=[.!?])[ \t]+|\n)")
+
 def clean_text(text):
     return "\n".join(
         line.strip()
@@ -10,3 +31,124 @@ def chunk_text(text, size=500, overlap=100):
     for i in range(0, len(text), size - overlap):
         chunks.append(text[i:i+size])
     return chunks
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.get_encoding(TOKENIZER)
+    except Exception as e:
+        # Not cached yet and the download failed (no network)
+        raise RuntimeError(
+            f"Could not load the {TOKENIZER} tokenizer. Run once with network access to cache it "
+            f"in TIKTOKEN_CACHE_DIR ({settings.TIKTOKEN_CACHE_DIR}): python manage.py shell -c "
+            f"\"from rag.chunk import count_tokens; count_tokens('')\""
+        ) from e
+
+def count_tokens(text):
+    return len(_encoding().encode_ordinary(text))
+
+@lru_cache(maxsize=1)
+def _query_encoding():
+    # Loaded (or found missing) once per process, so an offline host doesn't retry the download per request
+    try:
+        return _encoding()
+    except RuntimeError as e:
+        print(f"⚠️  {e}. Estimating token counts from text length until restart.")
+        return None
+
+def estimate_tokens(text):
+    """
+    count_tokens for prompt budgets on the chat path. Without the tokenizer
+    it estimates CHARS_PER_TOKEN characters per token instead of failing
+    the request. Ingestion keeps using count_tokens, which fails: chunk
+    boundaries must not depend on whether the tokenizer was available.
+    """
+    encoding = _query_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode_ordinary(text))
+
+def _sentences(page):
+    """Splits a cleaned page into sentence/line units whose concatenation is the page."""
+    parts = SENTENCE_BOUNDARY.split(page)
+    units = [text + sep for text, sep in zip(parts[0::2], parts[1::2] + [""])]
+    return [u for u in units if u.strip()]
+
+def _units(pages, max_tokens, clean=True):
+    """Yields (text, token_count) sentence units across all pages."""
+    encoding = _encoding()
+    first = True
+    for page in pages:
+        cleaned = clean_text(page) if clean else page
+        if not cleaned:
+            continue
+        units = _sentences(cleaned)
+        if not first:
+            units[0] = "\n" + units[0]
+        first = False
+
+        # Fast path: one batched, multi-threaded tokenizer call per page
+        # instead of a Python-level call per sentence
+        for text, tokens in zip(units, encoding.encode_ordinary_batch(units)):
+            if len(tokens) <= max_tokens:
+                yield text, len(tokens)
+                continue
+            # A single "sentence" longer than the budget (tables, run-on OCR
+            # text) is the only case where we cut inside it, on token boundaries
+            for i in range(0, len(tokens), max_tokens):
+                piece = tokens[i:i + max_tokens]
+                yield encoding.decode(piece), len(piece)
+
+def _is_anchor(text):
+    return zlib.crc32(text.strip().encode()) % ANCHOR_PERIOD == 0
+
+def chunk_document(pages, max_tokens=None, overlap_tokens=None, clean=True):
+    """
+    Packs whole sentences into chunks of at most `max_tokens` tokens, carrying
+    up to `overlap_tokens` of trailing sentences into the next chunk. Chunks
+    past half of `max_tokens` may end early at an anchor sentence. Consumes
+    `pages` (any iterable of text) incrementally and yields chunk strings.
+    Pass clean=False if the pages already went through clean_text.
+    """
+    max_tokens = max_tokens or settings.RAG_CHUNK_TOKENS
+    overlap_tokens = settings.RAG_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    window = deque()
+    window_tokens = 0
+
+    for text, tokens in _units(pages, max_tokens, clean):
+        if window and (
+            window_tokens + tokens > max_tokens
+            or (window_tokens >= max_tokens // 2 and _is_anchor(window[-1][0]))
+        ):
+            yield "".join(t for t, _ in window).strip()
+
+            # Carry the trailing sentences that fit in the overlap budget
+            kept = 0
+            carry = deque()
+            for unit in reversed(window):
+                if kept + unit[1] > overlap_tokens or kept + unit[1] + tokens > max_tokens:
+                    break
+                carry.appendleft(unit)
+                kept += unit[1]
+            window, window_tokens = carry, kept
+
+        window.append((text, tokens))
+        window_tokens += tokens
+
+    # The last unit is never emitted inside the loop, so this is always new text
+    if window:
+        yield "".join(t for t, _ in window).strip()
+
+def chunk_stats(chunks):
+    """Token statistics for a list of chunks, for the ingestion log."""
+    if not chunks:
+        return {"chunks": 0, "tokens": 0, "avg_tokens": 0, "min_tokens": 0, "max_tokens": 0}
+    counts = [len(t) for t in _encoding().encode_ordinary_batch(chunks)]
+    return {
+        "chunks": len(chunks),
+        "tokens": sum(counts),
+        "avg_tokens": round(sum(counts) / len(counts), 1),
+        "min_tokens": min(counts),
+        "max_tokens": max(counts),
+    }
@@ -0,0 +1,75 @@
+"""
+Maximal marginal relevance (MMR) over a pool of retrieved candidates.
+
+Overlapping chunks of the same page sit next to each other in embedding
+space, so the plain top-k is often k near-copies. MMR picks one chunk at a
+time, each time the candidate with the best
+
+    lambda * relevance - (1 - lambda) * max similarity to the chunks already picked
+
+so lambda=1 is the plain ranking and lower values trade relevance for
+diversity. Similarities are cosines between the candidates' own vectors,
+computed with NumPy in one matrix-vector product per pick: O(k * n * d) for
+n candidates of d dimensions. The pool is converted to a float32 matrix once
+(a float32 array is used as is) and is never normalised: the products are
+scaled by the inverse norms instead. rag.retrieve reads the candidates'
+vectors from Postgres in binary as NumPy arrays (rag.vector_storage), since
+parsing 1536-float lists out of text costs far more than the selection.
+"""
+import numpy as np
+
+def _inverse_norms(matrix):
+    norms = np.sqrt(np.vecdot(matrix, matrix))
+    return 1 / np.where(norms == 0, 1, norms)
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_=0.7, relevance=None, groups=None, per_group=0):
+    """
+    Indices of the `k` candidates MMR picks, in pick order.
+
+    `relevance` defaults to each candidate's cosine similarity to
+    `query_vector`; pass the search's own scores (on a 0-1 scale) to rank
+    by those instead. `groups` (e.g. asset ids, one per candidate) with
+    `per_group` > 0 caps how many picks come from one group. The cap only
+    holds while other candidates remain, so a search within a single asset
+    still returns k chunks.
+    """
+    vectors = np.asarray(candidate_vectors, dtype=np.float32)
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    inverse_norms = _inverse_norms(vectors)
+    if relevance is None:
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        relevance = (vectors @ query_vector) * inverse_norms * _inverse_norms(query_vector)
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    # Nothing is picked yet, so the first pick is the most relevant candidate
+    max_similarity = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    capped = np.zeros(n, dtype=bool)
+    if per_group and groups is not None:
+        groups = np.asarray(groups)
+        picked_per_group = {}
+
+    picked = []
+    for _ in range(k):
+        score = lambda_ * relevance - (1 - lambda_) * max_similarity
+        allowed = available & ~capped
+        if not allowed.any():
+            allowed = available
+        best = int(np.argmax(np.where(allowed, score, -np.inf)))
+        picked.append(best)
+        if len(picked) == k:
+            break
+        available[best] = False
+        similarity = (vectors @ vectors[best]) * (inverse_norms * inverse_norms[best])
+        np.maximum(max_similarity, similarity, out=max_similarity)
+
+        if per_group and groups is not None:
+            group = groups[best]
+            picked_per_group[group] = picked_per_group.get(group, 0) + 1
+            if picked_per_group[group] >= per_group:
+                capped |= groups == group
+    return picked
@@ -1,8 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
 from .openai_client import client
+from .vector_storage import FULL_DIMENSIONS
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def embedding_model_tag():
+    """Names the vector space in cache keys: shortened vectors never mix with full ones."""
+    dimensions = settings.RAG_EMBEDDING_DIMENSIONS
+    return EMBEDDING_MODEL if dimensions == FULL_DIMENSIONS else f"{EMBEDDING_MODEL}@{dimensions}"
 
 def generate_embedding(text):
     response = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=EMBEDDING_MODEL,
         input=text,
+        dimensions=settings.RAG_EMBEDDING_DIMENSIONS,
     )
     return response.data[0].embedding
+
+def _embed_batch(batch):
+    response = client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=batch,
+        dimensions=settings.RAG_EMBEDDING_DIMENSIONS,
+    )
+    # Each item carries the index of its input, so we never rely on response order
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+def generate_embeddings(texts, batch_size=None, max_workers=None, on_progress=None):
+    """
+    Embeds a list of texts using one API call per batch, with a bounded number
+    of batches in flight. Vectors are returned in the same order as `texts`.
+
+    `on_progress`, if given, is called with the number of texts embedded so far.
+    """
+    batch_size = batch_size or settings.RAG_EMBED_BATCH_SIZE
+    max_workers = max_workers or settings.RAG_EMBED_CONCURRENCY
+
+    batches = [texts[i:i+batch_size] for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return []
+
+    vectors = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as pool:
+        futures = [pool.submit(_embed_batch, batch) for batch in batches]
+        # Collect in submission order so vectors line up with their chunks
+        for future in futures:
+            vectors.extend(future.result())
+            if on_progress:
+                on_progress(len(vectors))
+
+    return vectors
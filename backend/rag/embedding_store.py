@@ -0,0 +1,57 @@
+import hashlib
+from .embed import embedding_model_tag, generate_embeddings
+from .models import ChunkEmbeddingCache
+from .vector_storage import as_list
+
+LOOKUP_BATCH_SIZE = 1000
+
+def chunk_key(text, model=None):
+    model = model or embedding_model_tag()
+    return hashlib.sha256(f"{model}\0{text}".encode()).hexdigest()
+
+def _lookup(keys):
+    found = {}
+    for i in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        rows = ChunkEmbeddingCache.objects.filter(
+            key__in=keys[i:i + LOOKUP_BATCH_SIZE]
+        ).values_list("key", "embedding")
+        found.update((key, as_list(vector)) for key, vector in rows)
+    return found
+
+def embed_chunks(chunks, on_progress=None):
+    """
+    Embeds chunks through the content-addressed store: only text that has
+    never been embedded before goes to the API, everything else is reused.
+
+    Returns (vectors, hits), with vectors in chunk order and `hits` the
+    number of chunks served from the store.
+    """
+    keys = [chunk_key(chunk) for chunk in chunks]
+    unique_keys = list(dict.fromkeys(keys))
+    vectors_by_key = _lookup(unique_keys)
+    hits = sum(1 for key in keys if key in vectors_by_key)
+
+    # Identical chunks within the same upload are embedded once
+    missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in vectors_by_key}
+    if missing:
+        def on_batch(done):
+            if on_progress:
+                on_progress(hits + done)
+
+        missing_keys = list(missing)
+        new_vectors = generate_embeddings(list(missing.values()), on_progress=on_batch)
+        vectors_by_key.update(zip(missing_keys, new_vectors))
+
+        ChunkEmbeddingCache.objects.bulk_create(
+            [
+                ChunkEmbeddingCache(key=key, model=embedding_model_tag(), embedding=vector)
+                for key, vector in zip(missing_keys, new_vectors)
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+    if on_progress:
+        on_progress(len(chunks))
+
+    return [vectors_by_key[key] for key in keys], hits
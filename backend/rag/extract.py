@@ -1,18 +1,104 @@
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
 from docx import Document
+from django.conf import settings
 
 def extract_text_from_file(file, asset_type):
+    return "\n".join(iter_text_from_file(file, asset_type))
+
+def iter_text_from_file(file, asset_type, workers=None):
+    """
+    Yields the document's text piece by piece (one PDF page, one DOCX
+    paragraph, or one block of TXT lines at a time), so callers never have
+    to hold the whole document as a single string.
+    """
     if asset_type == "pdf":
-        with pdfplumber.open(file) as pdf:
-            return "\n".join(
-                page.extract_text() or "" for page in pdf.pages
-            )
+        yield from iter_pdf_pages(file, workers)
+        return
 
     if asset_type == "docx":
         doc = Document(file)
-        return "\n".join(p.text for p in doc.paragraphs)
+        for p in doc.paragraphs:
+            yield p.text
+        return
 
     if asset_type == "txt":
-        return file.read().decode()
+        # Decode incrementally instead of reading the whole file at once
+        text = io.TextIOWrapper(file, encoding="utf-8")
+        try:
+            while True:
+                lines = text.readlines(64 * 1024)
+                if not lines:
+                    break
+                yield "".join(lines)
+        finally:
+            text.detach()
+        return
+
+def _extract_page_range(path, start, end):
+    # Runs in a pool process: open the PDF independently and release each page after use
+    texts = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+            page.close()
+    return texts
+
+def iter_pdf_pages(file, workers=None):
+    """
+    Yields PDF page text in page order.
+
+    With one worker, pages are extracted in-process and each page's parsed
+    layout is freed before moving on. With more, ranges of
+    RAG_PDF_PAGES_PER_TASK pages fan out to a process pool; at most two
+    ranges per worker are in flight, so memory stays bounded whatever the
+    page count.
+    """
+    workers = workers or settings.RAG_PDF_WORKERS
+    pages_per_task = settings.RAG_PDF_PAGES_PER_TASK
+
+    with pdfplumber.open(file) as pdf:
+        page_count = len(pdf.pages)
+        if workers <= 1 or page_count <= pages_per_task:
+            for page in pdf.pages:
+                yield page.extract_text() or ""
+                page.close()
+            return
+
+    with _as_path(file) as path:
+        ranges = [(start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task)]
+        # spawn, not fork: callers may be multi-threaded with open DB connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = []
+            for start, end in ranges:
+                pending.append(pool.submit(_extract_page_range, path, start, end))
+                if len(pending) >= workers * 2:
+                    yield from pending.pop(0).result()
+            for future in pending:
+                yield from future.result()
+
+class _as_path:
+    """Gives pool processes a filesystem path for `file`, spooling it to disk if needed."""
+
+    def __init__(self, file):
+        self.file = file
+        self.tmp = None
+
+    def __enter__(self):
+        if hasattr(self.file, "temporary_file_path"):
+            return self.file.temporary_file_path()
+        self.file.seek(0)
+        self.tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        with self.tmp:
+            shutil.copyfileobj(self.file, self.tmp)
+        return self.tmp.name
 
-    return ""
+    def __exit__(self, *exc):
+        if self.tmp:
+            os.unlink(self.tmp.name)
@@ -0,0 +1,136 @@
+"""
+A local stand-in for the parts of the OpenAI API this app uses
+(embeddings and chat completions, streaming or not), with configurable
+latency and deterministic output. Used by the benchmarks and for running
+the backend offline:
+
+    python manage.py fake_openai --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python manage.py runserver
+"""
+import array
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DIMENSIONS = 1536
+ANSWER_WORDS = (
+    "Looking at the files you provided the document states that the total amount "
+    "is due within thirty days and the agreement covers delivery support and maintenance"
+).split()
+
+
+def fake_vector(text, dimensions=DIMENSIONS):
+    # Deterministic per text, so repeated runs embed identically
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(dimensions)]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    # Simulated latencies (seconds), overridden per server by start_fake_openai()
+    request_latency = 0.05     # fixed cost of every request
+    item_latency = 0.0005      # per embeddings input
+    token_latency = 0.01       # per generated chat token
+    answer_tokens = 60
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if self.path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if self.path.endswith("/chat/completions"):
+            return self._chat(body)
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _embeddings(self, body):
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        time.sleep(self.request_latency + self.item_latency * len(inputs))
+
+        dimensions = body.get("dimensions") or DIMENSIONS
+        data = []
+        for i, text in enumerate(inputs):
+            vector = fake_vector(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                # The SDK asks for base64 float32 by default
+                vector = base64.b64encode(array.array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+
+        self._send_json(200, {
+            "object": "list",
+            "model": body["model"],
+            "data": data,
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat(self, body):
+        prompt = json.dumps(body["messages"])
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        words = [rng.choice(ANSWER_WORDS) for _ in range(self.answer_tokens)]
+        time.sleep(self.request_latency)
+
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body["model"]}
+
+        if not body.get("stream"):
+            time.sleep(self.token_latency * len(words))
+            return self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words), "total_tokens": len(prompt) // 4 + len(words)},
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(self.token_latency)
+            delta = {"content": word if i == 0 else f" {word}"}
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        final = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self.close_connection = True
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    # Load tests open hundreds of connections at once
+    request_queue_size = 512
+    daemon_threads = True
+
+
+def start_fake_openai(host="127.0.0.1", port=0, **latencies):
+    """
+    Starts the fake API in a daemon thread and returns (server, base_url).
+    Keyword arguments override FakeOpenAIHandler's latency attributes.
+    """
+    handler = type("ConfiguredFakeOpenAIHandler", (FakeOpenAIHandler,), latencies)
+    server = FakeOpenAIServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v1"
@@ -1,13 +1,102 @@
+"""
+Image descriptions from the vision model, for ingesting image assets.
+
+Images are shrunk before they are sent: at most RAG_IMAGE_MAX_SIZE pixels on
+the longest side, re-encoded as JPEG (RAG_IMAGE_JPEG_QUALITY) and passed
+inline as a data URL. A 12-megapixel phone photo goes out as ~150 KB instead
+of several MB, and the model is not billed for detail it scales away anyway.
+
+Descriptions are kept in ImageDescriptionCache under the user and the file's
+SHA-256, so the same image is never described twice for one user. The cache
+is never shared between users. With RAG_IMAGE_PERCEPTUAL_CACHE on, a user's
+image that merely looks the same (re-encoded, resized) also reuses the
+description. That match ignores small details such as changed digits in
+a screenshot, so it is off by default.
+"""
+import base64
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from PIL import Image, ImageOps
+
+from .models import ImageDescriptionCache
 from .openai_client import client
+from . import metrics
+
+IMAGE_MODEL = "gpt-4o-mini"
+PROMPT = "Extract all visible text and describe meaningful visual content."
+
+def description_model_tag():
+    # Descriptions depend on the model and on how far images are shrunk
+    return f"{IMAGE_MODEL}:{settings.RAG_IMAGE_MAX_SIZE}"
+
+def perceptual_hash(image):
+    """64-bit difference hash: is each pixel of a 9x8 grey thumbnail brighter than its right neighbour."""
+    pixels = list(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+def _normalise_mode(image):
+    """
+    The image as RGB, RGBA or L: modes the resampling filters and the JPEG
+    encoder both handle. Transparency is kept so it can go on white later.
+    """
+    if image.mode in ("RGB", "RGBA", "L"):
+        return image
+    if image.mode.startswith("I") or image.mode == "F":
+        # 16/32-bit greyscale (scans, depth maps): stretch its range onto 0-255
+        image = image.convert("F")
+        low, high = image.getextrema()
+        scale = 255 / ((high - low) or 1)
+        return image.point(lambda value: (value - low) * scale).convert("L")
+    if image.mode in ("LA", "PA") or "transparency" in image.info:
+        return image.convert("RGBA")
+    if image.mode == "1":
+        return image.convert("L")
+    return image.convert("RGB")
+
+def prepare_image(data):
+    """
+    Returns (JPEG bytes, perceptual hash) of image file `data`, fitted into
+    RAG_IMAGE_MAX_SIZE x RAG_IMAGE_MAX_SIZE. Smaller images keep their size.
+    """
+    max_size = settings.RAG_IMAGE_MAX_SIZE
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale when that still covers
+        # max_size; what remains is box-reduced by whole factors, then resampled
+        image.draft("RGB", (max_size, max_size))
+        image = _normalise_mode(image)
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=1.0)
+        image = ImageOps.exif_transpose(image)
+        if image.mode == "RGBA":
+            # Transparent screenshots: put them on white instead of JPEG's black
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=settings.RAG_IMAGE_JPEG_QUALITY)
+        return out.getvalue(), perceptual_hash(image)
+
+def data_url(jpeg):
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
 
 def describe_image(image_url):
+    """Description of the image at `image_url`, an https or data: URL."""
     response = client.chat.completions.create(
-        model="gpt-4o-mini",
+        model=IMAGE_MODEL,
         messages=[
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Extract all visible text and describe meaningful visual content."},
+                    {"type": "text", "text": PROMPT},
                     {"type": "image_url", "image_url": {"url": image_url}},
                 ],
             }
@@ -15,3 +104,55 @@ def describe_image(image_url):
     )
 
     return response.choices[0].message.content
+
+def _similar_descriptions(user_id, hashes, model):
+    if not settings.RAG_IMAGE_PERCEPTUAL_CACHE:
+        return {}
+    rows = ImageDescriptionCache.objects.filter(
+        user_id=user_id, model=model, perceptual_hash__in=hashes
+    ).values_list("perceptual_hash", "description")
+    return dict(rows)
+
+def describe_images(user_id, images):
+    """
+    Describes image files (bytes), reusing the descriptions cached for
+    `user_id`. Identical images are described once. The rest are shrunk and
+    sent to the model up to RAG_IMAGE_CONCURRENCY at a time.
+
+    Returns (descriptions, hits), with descriptions in the order of
+    `images` and `hits` the number served from the cache.
+    """
+    model = description_model_tag()
+    keys = [hashlib.sha256(data).hexdigest() for data in images]
+    descriptions = dict(
+        ImageDescriptionCache.objects.filter(user_id=user_id, model=model, content_hash__in=keys)
+        .values_list("content_hash", "description")
+    )
+    missing = {key: data for key, data in zip(keys, images) if key not in descriptions}
+
+    to_describe = []
+    if missing:
+        # Pillow releases the GIL while decoding and resizing, so both steps run in parallel
+        with ThreadPoolExecutor(max_workers=min(settings.RAG_IMAGE_CONCURRENCY, len(missing))) as pool:
+            prepared = dict(zip(missing, pool.map(prepare_image, missing.values())))
+            similar = _similar_descriptions(user_id, [phash for _, phash in prepared.values()], model)
+            new = {key: similar[phash] for key, (_, phash) in prepared.items() if phash in similar}
+            to_describe = [key for key in prepared if key not in new]
+            new.update(zip(to_describe, pool.map(lambda key: describe_image(data_url(prepared[key][0])), to_describe)))
+
+        descriptions.update(new)
+        ImageDescriptionCache.objects.bulk_create(
+            [
+                ImageDescriptionCache(
+                    user_id=user_id, content_hash=key, perceptual_hash=prepared[key][1],
+                    model=model, description=description,
+                )
+                for key, description in new.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    hits = len(keys) - len(to_describe)
+    metrics.CACHE_LOOKUPS.inc(hits, cache="image_description", result="hit")
+    metrics.CACHE_LOOKUPS.inc(len(keys) - hits, cache="image_description", result="miss")
+    return [descriptions[key] for key in keys], hits
@@ -1,70 +1,133 @@
-from .extract import extract_text_from_file
-from .image_understanding import describe_image
-from .chunk import clean_text, chunk_text
-from .embed import generate_embedding
-from .store import store_embedding
-from assets.supabase_client import supabase
+from .extract import iter_text_from_file
+from .image_understanding import describe_images
+from .chunk import clean_text, chunk_document, chunk_stats
+from . import metrics
+from .embedding_store import embed_chunks
+from .store import delete_embeddings, diff_chunks, stored_chunks, sync_embeddings
 from django.conf import settings
 import time
 
-def ingest_asset(asset, file_obj):
+def ingest_asset(asset, file_obj, on_progress=None):
+    """
+    Runs the full extract → clean → chunk → embed → store pipeline for one
+    asset and returns the number of chunks it now has.
+
+    The chunks are diffed against whatever is already stored for the asset
+    (nothing, on first upload): when its file was replaced, only chunks that
+    are new get embedded and inserted, and only vanished ones are deleted.
+    If the new file yields no text at all, every stored chunk is deleted.
+
+    `on_progress`, if given, is called as on_progress(stage, chunks_done, chunks_total)
+    whenever the pipeline moves on, so callers can report job status.
+    """
+    def report(stage, chunks_done=0, chunks_total=0):
+        if on_progress:
+            on_progress(stage, chunks_done, chunks_total)
+
+    def with_heartbeat(pages):
+        # Extraction reports no progress of its own. Without a heartbeat a long
+        # PDF looks stalled after RAG_INGEST_STALE_AFTER and another worker
+        # would claim the job while this one is still on it.
+        last_beat = time.monotonic()
+        for page in pages:
+            yield page
+            if time.monotonic() - last_beat >= settings.RAG_INGEST_HEARTBEAT:
+                report("extracting")
+                last_beat = time.monotonic()
+
     print(f"\n{'—'*10} ⚙️  RAG INGESTION STARTING {'—'*10}")
     print(f"📄 Asset: {asset.filename} (Type: {asset.asset_type})")
 
     # Step 1: Extract
     print(f"🔍 Step 1: Extracting content...")
     start_time = time.time()
-    
-    if asset.asset_type == "image":
-        print(f"📸 Image detected. Requesting signed URL from Supabase...")
-        signed_url = supabase.storage.from_(
-            settings.SUPABASE_BUCKET
-        ).create_signed_url(asset.storage_path, 3600)["signedURL"]
+    report("extracting")
+    image_seconds = 0.0
 
+    if asset.asset_type == "image":
+        # Shrunk and sent inline, or served from the description cache
         print(f"🧠 Running AI Image Understanding...")
-        raw_text = describe_image(signed_url)
+        pages, reused = describe_images(asset.user_id, [file_obj.read()])
+        if reused:
+            print(f"♻️  Image description reused from cache")
+        image_seconds = time.time() - start_time
     else:
-        raw_text = extract_text_from_file(file_obj, asset.asset_type)
+        # Pages stream out of the extractor (PDFs optionally via a process pool)
+        pages = iter_text_from_file(file_obj, asset.asset_type)
 
-    if not raw_text.strip():
-        print(f"⚠️  Warning: No text could be extracted from {asset.filename}. Aborting.")
-        return
+    # Step 2 & 3: Clean + Chunk, consuming pages as they are extracted.
+    # The stopwatches split the streamed time back into per-stage durations.
+    print(f"✂️  Step 2 & 3: Cleaning and splitting pages into chunks...")
+    extract_clock, clean_clock = metrics.Stopwatch(), metrics.Stopwatch()
+    pages = extract_clock.wrap(pages)
+    cleaned_pages = clean_clock.wrap(clean_text(page) for page in pages)
+    chunk_start = time.perf_counter()
+    chunks = list(chunk_document(with_heartbeat(cleaned_pages), clean=False))
+    chunk_seconds = time.perf_counter() - chunk_start
 
-    extract_duration = round(time.time() - start_time, 2)
-    print(f"✅ Extraction complete ({len(raw_text)} chars) in {extract_duration}s")
+    metrics.observe_stage("extract", image_seconds + extract_clock.elapsed)
+    metrics.observe_stage("clean", clean_clock.elapsed - extract_clock.elapsed)
+    metrics.observe_stage("chunk", chunk_seconds - clean_clock.elapsed)
 
-    # Step 2: Clean
-    print(f"🧹 Step 2: Cleaning text...")
-    cleaned = clean_text(raw_text)
+    if not chunks:
+        # A replaced file without text must not leave the old version searchable
+        removed = delete_embeddings(asset.user_id, [asset.id])
+        print(f"⚠️  Warning: No text could be extracted from {asset.filename}. Removed {removed} stored chunks.")
+        return 0
 
-    # Step 3: Chunk
-    print(f"✂️  Step 3: Splitting into chunks...")
-    chunks = chunk_text(cleaned)
-    print(f"📦 Created {len(chunks)} chunks for processing.")
+    extract_duration = round(time.time() - start_time, 2)
+    print(f"✅ Extraction complete in {extract_duration}s")
+    stats = chunk_stats(chunks)
+    print(
+        f"📦 Created {stats['chunks']} chunks for processing "
+        f"({stats['tokens']} tokens, {stats['avg_tokens']} avg / {stats['max_tokens']} max per chunk)."
+    )
+    metrics.DOCUMENT_CHUNKS.observe(len(chunks))
+    metrics.TOKENS.inc(stats["tokens"], kind="chunk")
+
+    # Step 4: Diff against the stored version, then embed only the new chunks
+    # (content-addressed reuse, then batched + concurrent API calls)
+    added, moved, removed = diff_chunks(stored_chunks(asset.user_id, asset.id), chunks)
+    unchanged = len(chunks) - len(added)
+    if unchanged or removed:
+        print(f"🔁 Diff: {unchanged} chunks unchanged ({len(moved)} moved), {len(added)} new, {len(removed)} removed")
+    print(f"🧠 Step 4: Generating Embeddings for {len(added)} chunks...")
+    embed_start = time.time()
+    report("embedding", unchanged, len(chunks))
+    with metrics.timed("embed"):
+        embeddings, reused = embed_chunks(
+            [chunks[i] for i in added],
+            on_progress=lambda done: report("embedding", unchanged + done, len(chunks)),
+        )
+    metrics.CHUNKS.inc(reused, kind="reused")
+    metrics.CHUNKS.inc(unchanged, kind="unchanged")
+    embed_duration = round(time.time() - embed_start, 2)
+    hit_rate = round(100 * reused / len(added), 1) if added else 0.0
+    print(f"♻️  Reused {reused}/{len(added)} embeddings from the chunk store (hit rate {hit_rate}%)")
+    print(f"✅ Embedded {len(embeddings)} chunks in {embed_duration}s")
 
-    # Step 4–5: Embed + Store
-    print(f"🚀 Step 4 & 5: Generating Embeddings & Saving to Postgres 15...")
-    
-    for i, chunk in enumerate(chunks, 1):
-        # Time the embedding generation
-        embed_start = time.time()
-        print(f"  [{i}/{len(chunks)}] 🧠 Embedding chunk...")
-        
-        embedding = generate_embedding(chunk)
-        embed_duration = round(time.time() - embed_start, 2)
-        
-        # Store in DB
-        store_embedding(
+    # Step 5: Store (one transaction for the whole asset)
+    print(f"🚀 Step 5: Saving to Postgres 15...")
+    store_start = time.time()
+    report("storing", len(chunks), len(chunks))
+    metadata = {
+        "filename": asset.filename,
+        "type": asset.asset_type,
+    }
+    with metrics.timed("store"):
+        stored = sync_embeddings(
             user_id=asset.user_id,
             asset_id=asset.id,
-            content=chunk,
-            embedding=embedding,
-            metadata={
-                "filename": asset.filename,
-                "type": asset.asset_type,
-            },
+            rows=[(i, chunks[i], embedding, metadata) for i, embedding in zip(added, embeddings)],
+            moved=moved,
+            removed=removed,
+            metadata=metadata,
         )
-        print(f"  [{i}/{len(chunks)}] ✅ Stored in DB ({embed_duration}s)")
+    metrics.CHUNKS.inc(stored, kind="ingested")
+    metrics.CHUNKS.inc(len(removed), kind="removed")
+    store_duration = round(time.time() - store_start, 2)
+    print(f"✅ Stored {stored} chunks in DB, removed {len(removed)} ({store_duration}s)")
 
     total_duration = round(time.time() - start_time, 2)
-    print(f"{'—'*10} ✨ INGESTION FINISHED in {total_duration}s {'—'*10}\n")
\ No newline at end of file
+    print(f"{'—'*10} ✨ INGESTION FINISHED in {total_duration}s {'—'*10}\n")
+    return len(chunks)
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rag.vector_storage import column_type, convert_statements, current_column_type, table_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts stored embeddings and their ANN index to RAG_VECTOR_TYPE, "
+        "RAG_EMBEDDING_DIMENSIONS and RAG_BINARY_RERANK. Shortening reuses the "
+        "stored vectors; nothing is re-embedded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Print the SQL without running it")
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            current = current_column_type(cursor)
+            partitions = table_partitions(cursor)
+        try:
+            statements = convert_statements(current, partitions)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        target = column_type()
+        mode = "binary quantized + rerank" if settings.RAG_BINARY_RERANK else "full precision index"
+        self.stdout.write(f"📐 embeddings.embedding: {current} -> {target} ({mode})")
+
+        for statement in statements:
+            self.stdout.write(f"   {statement}")
+            if options["dry_run"]:
+                continue
+            start = time.time()
+            # Autocommit: CONCURRENTLY index builds need to run outside a transaction
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+            self.stdout.write(f"   ✅ {round(time.time() - start, 2)}s")
+
+        if current != target and not options["dry_run"]:
+            self.stdout.write("⚠️  Restart the app and workers so they embed with the new settings.")
@@ -0,0 +1,33 @@
+import threading
+
+from django.core.management.base import BaseCommand
+
+from rag.fake_openai import FakeOpenAIHandler, start_fake_openai
+
+
+class Command(BaseCommand):
+    help = "Runs a local fake of the OpenAI embeddings and chat APIs (point OPENAI_BASE_URL at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--request-latency", type=float, default=FakeOpenAIHandler.request_latency)
+        parser.add_argument("--item-latency", type=float, default=FakeOpenAIHandler.item_latency)
+        parser.add_argument("--token-latency", type=float, default=FakeOpenAIHandler.token_latency)
+        parser.add_argument("--answer-tokens", type=int, default=FakeOpenAIHandler.answer_tokens)
+
+    def handle(self, *args, **options):
+        server, base_url = start_fake_openai(
+            options["host"],
+            options["port"],
+            request_latency=options["request_latency"],
+            item_latency=options["item_latency"],
+            token_latency=options["token_latency"],
+            answer_tokens=options["answer_tokens"],
+        )
+        self.stdout.write(f"🧪 Fake OpenAI API listening on {base_url}")
+        self.stdout.write(f"   export OPENAI_BASE_URL={base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rag.partitioning import OLD, drop_old_table, partition_embeddings
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the embeddings table, while the app keeps running, to a table hash-partitioned "
+        "by user_id with indexes per partition (see rag.partitioning). Also repartitions "
+        "into a different count."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partitions", type=int, default=settings.RAG_EMBEDDING_PARTITIONS)
+        parser.add_argument("--batch-size", type=int, default=10000, help="ids copied per transaction")
+        parser.add_argument("--from-id", type=int, default=0, help="resume an interrupted copy after this id")
+        parser.add_argument("--drop-old", action="store_true", help=f"drop {OLD} once the move is done")
+
+    def handle(self, *args, **options):
+        if options["partitions"] < 1:
+            raise CommandError("--partitions must be at least 1")
+        try:
+            missing = partition_embeddings(
+                options["partitions"],
+                batch_size=options["batch_size"],
+                from_id=options["from_id"],
+                log=lambda line: self.stdout.write(f"🧩 {line}"),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if missing:
+            # Rows deleted by the app right after the swap also count here
+            self.stdout.write(f"⚠️  {missing} rows of {OLD} are not in embeddings; {OLD} was kept for checking.")
+            return
+        if options["drop_old"]:
+            with connection.cursor() as cursor:
+                drop_old_table(cursor)
+            self.stdout.write(f"🗑️  Dropped {OLD}")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from rag.answer_cache import prune_expired_answers
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes cached answers older than RAG_ANSWER_CACHE_TTL. Writing to the "
+        "cache prunes the writer's own answers; run this periodically (e.g. daily "
+        "from cron) for users who stopped asking."
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_answers()
+        self.stdout.write(f"🧹 Deleted {deleted} expired cached answers")
@@ -0,0 +1,160 @@
+"""
+Minimal in-process metrics for the RAG pipeline, exposed in Prometheus text
+format at /metrics (see rag.views.metrics).
+
+Values are per process: with several gunicorn/uvicorn workers, each worker
+reports its own series and Prometheus sums them at query time. Set
+RAG_METRICS_ENABLED=false to turn every call here into a no-op.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from django.conf import settings
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_registry = []
+
+def enabled():
+    return settings.RAG_METRICS_ENABLED
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not enabled():
+            return
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=SECONDS_BUCKETS):
+        self.name, self.documentation, self.labels = name, documentation, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        if not enabled():
+            return
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            # Counts are stored per bucket and made cumulative on exposition
+            series[index] += 1
+            series[-1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in each pipeline stage.",
+    labels=("stage",),
+)
+TOKENS = Counter(
+    "rag_tokens_total",
+    "Tokens processed, by kind (chunk, context, history, prompt, completion).",
+    labels=("kind",),
+)
+CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Retrieved-context tokens packed into each prompt.",
+    buckets=TOKEN_BUCKETS,
+)
+CHUNKS = Counter(
+    "rag_chunks_total",
+    "Chunks handled, by kind (ingested, unchanged, removed, reused, retrieved).",
+    labels=("kind",),
+)
+DOCUMENT_CHUNKS = Histogram(
+    "rag_document_chunks",
+    "Chunks produced per ingested document.",
+    buckets=COUNT_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total",
+    "Cache lookups by cache and result (hit/miss).",
+    labels=("cache", "result"),
+)
+
+@contextmanager
+def timed(stage):
+    """Records the duration of the `with` block under `stage`."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+class Stopwatch:
+    """
+    Measures time spent producing items of a lazily consumed iterable, for
+    stages that are streamed into each other (extract → clean → chunk).
+    The elapsed time includes any upstream iterables it pulls from.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def wrap(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.elapsed += time.perf_counter() - start
+                return
+            self.elapsed += time.perf_counter() - start
+            yield item
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
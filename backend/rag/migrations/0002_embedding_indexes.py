@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+VECTOR_INDEX_NAME = 'embeddings_embedding_ann_idx'
+
+
+def create_vector_index(apps, schema_editor):
+    # The index type is picked from settings at migrate time. To switch between
+    # HNSW and IVFFlat later, migrate back to 0001 and forward again.
+    index_type = settings.RAG_VECTOR_INDEX
+    if index_type == 'hnsw':
+        method = 'hnsw'
+        options = f"m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)}"
+    elif index_type == 'ivfflat':
+        method = 'ivfflat'
+        options = f"lists = {int(settings.RAG_IVFFLAT_LISTS)}"
+    else:
+        raise ValueError(f"Unknown RAG_VECTOR_INDEX {index_type!r}, expected 'hnsw' or 'ivfflat'")
+
+    # `<->` (L2 distance) is what retrieve_similar_chunks orders by
+    schema_editor.execute(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {VECTOR_INDEX_NAME} "
+        f"ON embeddings USING {method} (embedding vector_l2_ops) WITH ({options})"
+    )
+
+
+def drop_vector_index(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    # Index builds run CONCURRENTLY so ingestion keeps working during migrate
+    atomic = False
+
+    dependencies = [
+        ('rag', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='embedding',
+            index=models.Index(fields=['user', 'asset_id'], name='embeddings_user_asset_idx'),
+        ),
+        migrations.RunPython(create_vector_index, drop_vector_index),
+    ]
@@ -0,0 +1,32 @@
+import django.db.models.deletion
+import pgvector.django.vector
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0004_chunkembeddingcache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_scope', models.TextField()),
+                ('question', models.TextField()),
+                ('question_embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('answer', models.TextField()),
+                ('chunks', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'answer_cache',
+                'indexes': [models.Index(fields=['user', 'asset_scope'], name='answer_cache_user_scope_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # The GIN index is built CONCURRENTLY so ingestion keeps working during migrate
+    atomic = False
+
+    dependencies = [
+        ('rag', '0005_answercache'),
+    ]
+
+    # content_tsv is maintained by Postgres and only read by raw SQL in
+    # rag.retrieve, so it is not declared on the Embedding model. Adding a
+    # STORED generated column rewrites the table once.
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE embeddings
+                ADD COLUMN IF NOT EXISTS content_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', content)) STORED
+            """,
+            reverse_sql="ALTER TABLE embeddings DROP COLUMN IF EXISTS content_tsv",
+        ),
+        migrations.RunSQL(
+            sql="CREATE INDEX CONCURRENTLY IF NOT EXISTS embeddings_content_tsv_idx ON embeddings USING gin (content_tsv)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS embeddings_content_tsv_idx",
+        ),
+    ]
@@ -0,0 +1,44 @@
+import pgvector.django.vector
+from django.db import migrations
+
+from rag.vector_storage import convert_statements, current_column_type
+
+
+def apply_vector_storage(apps, schema_editor):
+    # Brings embeddings.embedding to RAG_VECTOR_TYPE / RAG_EMBEDDING_DIMENSIONS /
+    # RAG_BINARY_RERANK. With the defaults this leaves the table as it is; later
+    # changes are applied with `python manage.py convert_embeddings`.
+    with schema_editor.connection.cursor() as cursor:
+        current = current_column_type(cursor)
+    for statement in convert_statements(current):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('rag', '0006_embedding_content_tsv'),
+    ]
+
+    operations = [
+        # Cache vectors may be shortened (RAG_EMBEDDING_DIMENSIONS), so their size is not fixed
+        migrations.AlterField(
+            model_name='answercache',
+            name='question_embedding',
+            field=pgvector.django.vector.VectorField(),
+        ),
+        migrations.AlterField(
+            model_name='chunkembeddingcache',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(),
+        ),
+        migrations.AlterField(
+            model_name='queryembeddingcache',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(),
+        ),
+        migrations.RunPython(apply_vector_storage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0007_embedding_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embedding',
+            name='chunk_index',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='embedding',
+            name='content_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        # Existing rows were inserted in chunk order, one asset per transaction,
+        # so id order within an asset is document order
+        migrations.RunSQL(
+            sql="""
+                UPDATE embeddings e
+                SET content_hash = encode(sha256(convert_to(e.content, 'UTF8')), 'hex'),
+                    chunk_index = ordered.chunk_index
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY asset_id ORDER BY id) - 1 AS chunk_index
+                    FROM embeddings
+                ) ordered
+                WHERE e.id = ordered.id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
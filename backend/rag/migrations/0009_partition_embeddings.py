@@ -0,0 +1,53 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import OutputWrapper
+from django.core.management.color import color_style
+from django.db import migrations
+from django.db.migrations.exceptions import IrreversibleError
+
+from rag.partitioning import drop_old_table, is_partitioned, partition_embeddings
+
+
+def partition_if_empty(apps, schema_editor):
+    # An empty table (a new install) is partitioned right away. A table with
+    # rows is left to `python manage.py partition_embeddings`, which copies
+    # them online instead of holding up migrate.
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM embeddings)")
+        if cursor.fetchone()[0]:
+            OutputWrapper(sys.stdout).write(
+                "\n  ⚠️  embeddings has rows: run `python manage.py partition_embeddings` to partition it online.",
+                style_func=color_style().WARNING,
+            )
+            return
+    partition_embeddings(settings.RAG_EMBEDDING_PARTITIONS, log=lambda line: None)
+    with schema_editor.connection.cursor() as cursor:
+        drop_old_table(cursor)
+
+
+def refuse_if_partitioned(apps, schema_editor):
+    # Earlier migrations create and drop indexes CONCURRENTLY, which Postgres
+    # rejects on a partitioned table, so there is no way back past this one
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            raise IrreversibleError("embeddings is partitioned, so rag 0009 and earlier cannot be unapplied")
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('rag', '0008_embedding_chunk_index_content_hash'),
+    ]
+
+    # The partitioned table has the same columns and index names, so the
+    # model state does not change. Unapplying is only allowed while the table
+    # is not partitioned yet (it had rows and partition_embeddings never ran).
+    operations = [
+        migrations.RunPython(partition_if_empty, refuse_if_partitioned),
+    ]
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rag', '0010_imagedescriptioncache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='imagedescriptioncache',
+            name='image_description_content_uniq',
+        ),
+        migrations.AddConstraint(
+            model_name='imagedescriptioncache',
+            constraint=models.UniqueConstraint(fields=('user', 'model', 'content_hash'), name='image_description_user_content_uniq'),
+        ),
+    ]
@@ -3,12 +3,104 @@ from pgvector.django import VectorField
 from django.contrib.auth.models import User
 
 class Embedding(models.Model):
+    """
+    One chunk of an asset and its vector. The table is hash-partitioned by
+    user_id (migration 0009, rag.partitioning), so its real primary key is
+    (id, user_id): `id` comes from one sequence and is unique in practice,
+    but the database does not enforce that on its own. Django only knows
+    `id`. Filter by user as well when looking rows up, both for pruning
+    and so nothing relies on `id` alone being constrained.
+    """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     asset_id = models.IntegerField()
+    # Position in the document and SHA-256 of `content`, used to diff a
+    # replaced file against its stored chunks (rag.store.diff_chunks)
+    chunk_index = models.IntegerField(null=True)
+    content_hash = models.CharField(max_length=64, null=True)
     content = models.TextField()
+    # Declared at full size; the stored type and size follow RAG_VECTOR_TYPE /
+    # RAG_EMBEDDING_DIMENSIONS (rag.vector_storage, `manage.py convert_embeddings`)
     embedding = VectorField(dimensions=1536)  # Matches OpenAI's size
     metadata = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = 'embeddings'  # Force the table name to be 'embeddings'
\ No newline at end of file
+        db_table = 'embeddings'  # Force the table name to be 'embeddings'
+        indexes = [
+            models.Index(fields=['user', 'asset_id'], name='embeddings_user_asset_idx'),
+        ]
+        # The ANN index on `embedding` (HNSW or IVFFlat) is created in
+        # migration 0002 from the RAG_VECTOR_INDEX setting.
+
+class QueryEmbeddingCache(models.Model):
+    """
+    Persistent tier of the query-embedding cache in rag.query_embedding.
+    `key` is a SHA-256 of the model name and the normalized query text.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    embedding = VectorField()  # Any size; keys include embedding_model_tag()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'query_embedding_cache'
+
+class ChunkEmbeddingCache(models.Model):
+    """
+    Content-addressed store of chunk embeddings used by rag.embedding_store.
+    `key` is a SHA-256 of the model name and the cleaned chunk text, so
+    identical text in any upload reuses the same vector.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    embedding = VectorField()  # Any size; keys include embedding_model_tag()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'chunk_embedding_cache'
+
+class AnswerCache(models.Model):
+    """
+    Previously generated answers, matched to new questions by cosine
+    similarity of the question embedding (see rag.answer_cache).
+    `asset_scope` identifies the selected asset_ids ("all" when none).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    asset_scope = models.TextField()
+    question = models.TextField()
+    question_embedding = VectorField()  # Size of RAG_EMBEDDING_DIMENSIONS
+    answer = models.TextField()
+    chunks = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'answer_cache'
+        indexes = [
+            models.Index(fields=['user', 'asset_scope'], name='answer_cache_user_scope_idx'),
+        ]
+
+class ImageDescriptionCache(models.Model):
+    """
+    Vision-model descriptions of uploaded images (rag.image_understanding).
+    `content_hash` is the SHA-256 of the file, so an image a user uploads
+    again is described once. Entries are per user: a hit would otherwise
+    tell one user that another uploaded the same file, and hand them its
+    description. `perceptual_hash` is a 64-bit difference hash of the
+    picture, also matched within the user's own images when
+    RAG_IMAGE_PERCEPTUAL_CACHE is on. `model` is description_model_tag().
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    content_hash = models.CharField(max_length=64)
+    perceptual_hash = models.CharField(max_length=16)
+    model = models.CharField(max_length=100)
+    description = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'image_description_cache'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model', 'content_hash'], name='image_description_user_content_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'perceptual_hash'], name='image_description_phash_idx'),
+        ]
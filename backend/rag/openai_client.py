@@ -1,4 +1,24 @@
-from openai import OpenAI
+from django.conf import settings
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from backend.http_clients import http_limits, http_timeout
 import os
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# One client per process: its connection pool is shared by every request and
+# thread, so keep HTTP_MAX_CONNECTIONS above RAG_INGEST_WORKERS * RAG_EMBED_CONCURRENCY.
+# Set OPENAI_BASE_URL to use a compatible server instead, e.g. `manage.py fake_openai`
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    timeout=http_timeout(settings.OPENAI_TIMEOUT),
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    http_client=DefaultHttpxClient(limits=http_limits()),
+)
+
+# Used by the async chat path (ASGI); shares the same configuration
+async_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    timeout=http_timeout(settings.OPENAI_TIMEOUT),
+    max_retries=settings.OPENAI_MAX_RETRIES,
+    http_client=DefaultAsyncHttpxClient(limits=http_limits()),
+)
@@ -0,0 +1,263 @@
+"""
+Hash partitioning of the embeddings table by user_id.
+
+Every query in rag.retrieve and rag.store filters on user_id. With the table
+split into RAG_EMBEDDING_PARTITIONS hash partitions, Postgres prunes each
+query to the one partition that holds the tenant. The ANN, full-text and
+(user_id, asset_id) indexes exist per partition, so each is 1/N of the size
+and is vacuumed and rebuilt on its own. A tenant's HNSW search only walks the
+graph of the tenants that share its partition. The table keeps its name,
+columns, ids and index names, so the code that reads and writes it does not
+change.
+
+partition_embeddings() moves a live table in four steps:
+
+  1. embeddings_partitioned is created next to it with the same columns. A
+     trigger on `embeddings` mirrors every insert, update and delete into
+     it from then on.
+  2. Existing rows are copied in id batches. Each batch is locked FOR UPDATE,
+     so a row that is changed or deleted meanwhile is never copied stale.
+  3. Each partition's indexes are built CONCURRENTLY and then attached.
+  4. One short transaction drops the trigger and swaps the names of the
+     tables, their indexes, their constraints and the id sequence.
+
+The old table stays as embeddings_old until drop_old_table(). The same steps
+move an already partitioned table to a different partition count.
+"""
+import time
+
+from django.db import connection, transaction
+
+from .vector_storage import TABLE, ann_index, create_index_statements, current_column_type, table_partitions
+
+SHADOW = f"{TABLE}_partitioned"
+OLD = f"{TABLE}_old"
+MIRROR_FUNCTION = f"{TABLE}_partition_mirror"
+MIRROR_TRIGGER = f"{TABLE}_partition_mirror_trg"
+PRIMARY_KEY = f"{TABLE}_pkey"
+DEFAULT_FOREIGN_KEY = f"{TABLE}_user_id_fk_auth_user_id"
+
+def partition_names(partitions):
+    return [f"{TABLE}_p{remainder}_of_{partitions}" for remainder in range(partitions)]
+
+def is_partitioned(cursor, table=TABLE):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", [table])
+    return cursor.fetchone()[0]
+
+def _exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+    return cursor.fetchone()[0]
+
+def _columns(cursor, table):
+    # Generated columns (content_tsv) are computed by Postgres and cannot be inserted
+    cursor.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+        """,
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def _foreign_key(cursor, table):
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0",
+        [table],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else DEFAULT_FOREIGN_KEY
+
+def _sequence(cursor, table):
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    return cursor.fetchone()[0]
+
+def _user_index(cursor):
+    # The plain user_id index Django created for the foreign key, or the name it would give it
+    cursor.execute(
+        """
+        SELECT i.relname FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+        WHERE x.indrelid = %s::regclass AND x.indnatts = 1 AND a.attname = 'user_id' AND NOT x.indisprimary
+        """,
+        [TABLE],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else connection.schema_editor()._create_index_name(TABLE, ["user_id"])
+
+def _indexes(cursor):
+    # Final names and definitions of the indexes every partition gets (migrations 0001, 0002, 0006, 0007).
+    # The ANN index is sized by the column as it is, which may differ from the settings mid-conversion.
+    # The user_id index duplicates (user_id, asset_id) but is kept, so the schema stays what Django's migrations build.
+    vector_type, dimensions = current_column_type(cursor).rstrip(")").split("(")
+    return [
+        (_user_index(cursor), "(user_id)"),
+        (f"{TABLE}_user_asset_idx", "(user_id, asset_id)"),
+        (f"{TABLE}_content_tsv_idx", "USING gin (content_tsv)"),
+        ann_index(vector_type, dimensions),
+    ]
+
+def create_shadow(cursor, partitions):
+    """
+    Step 1: the partitioned copy of `embeddings` and the mirror trigger.
+    Safe to repeat; an interrupted run continues with the table it created.
+    """
+    names = partition_names(partitions)
+    if _exists(cursor, SHADOW) and table_partitions(cursor, SHADOW) != sorted(names):
+        raise ValueError(
+            f"{SHADOW} exists with {len(table_partitions(cursor, SHADOW))} partitions from an earlier run; "
+            f"drop it or run again with that count"
+        )
+
+    foreign_key = _foreign_key(cursor, TABLE)
+    columns = _columns(cursor, TABLE)
+    with transaction.atomic():
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SHADOW} (
+                LIKE {TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY,
+                CONSTRAINT {PRIMARY_KEY}_new PRIMARY KEY (id, user_id),
+                CONSTRAINT {foreign_key}_new FOREIGN KEY (user_id)
+                    REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED
+            ) PARTITION BY HASH (user_id)
+            """
+        )
+        for remainder, name in enumerate(names):
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {SHADOW} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        cursor.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {MIRROR_FUNCTION}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM {SHADOW} WHERE id = OLD.id AND user_id = OLD.user_id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO {SHADOW} ({", ".join(columns)})
+                    VALUES ({", ".join(f"NEW.{column}" for column in columns)});
+                END IF;
+                RETURN NULL;
+            END
+            $$
+            """
+        )
+        cursor.execute(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {TABLE}")
+        cursor.execute(
+            f"CREATE TRIGGER {MIRROR_TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {MIRROR_FUNCTION}()"
+        )
+    return names
+
+def copy_rows(cursor, after_id, until_id, batch_size):
+    """
+    Step 2: copies rows with after_id < id <= until_id, one transaction per
+    `batch_size` ids. Yields (last id copied, rows copied) after each batch.
+    """
+    columns = ", ".join(_columns(cursor, TABLE))
+    while after_id < until_id:
+        upper = min(after_id + batch_size, until_id)
+        with transaction.atomic():
+            # Rows the trigger mirrored already are skipped
+            cursor.execute(
+                f"""
+                INSERT INTO {SHADOW} ({columns})
+                SELECT {columns} FROM {TABLE}
+                WHERE id > %s AND id <= %s
+                ORDER BY id
+                FOR UPDATE
+                ON CONFLICT (id, user_id) DO NOTHING
+                """,
+                [after_id, upper],
+            )
+            copied = cursor.rowcount
+        after_id = upper
+        yield after_id, copied
+
+def index_statements(cursor, names):
+    """
+    Step 3: {index name: statements}, each index built CONCURRENTLY on every
+    partition under its final name.
+    """
+    return {
+        name: create_index_statements(name, definition, names, table=SHADOW, parent_name=f"{name}_new")
+        for name, definition in _indexes(cursor)
+    }
+
+def swap(cursor):
+    """
+    Step 4: makes the partitioned table `embeddings`. The exclusive lock only
+    lasts as long as the renames.
+    """
+    foreign_key = _foreign_key(cursor, TABLE)
+    old_sequence, new_sequence = _sequence(cursor, TABLE), _sequence(cursor, SHADOW)
+    index_names = [name for name, _ in _indexes(cursor)]
+
+    with transaction.atomic():
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"DROP TRIGGER {MIRROR_TRIGGER} ON {TABLE}")
+        cursor.execute(f"DROP FUNCTION {MIRROR_FUNCTION}()")
+        # New rows keep numbering where the old table stopped
+        cursor.execute(f"SELECT setval(%s, last_value, is_called) FROM {old_sequence}", [new_sequence])
+
+        for name in index_names:
+            cursor.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old")
+            cursor.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME CONSTRAINT {PRIMARY_KEY} TO {PRIMARY_KEY}_old")
+        cursor.execute(f"ALTER TABLE {SHADOW} RENAME CONSTRAINT {PRIMARY_KEY}_new TO {PRIMARY_KEY}")
+        # The old table is only kept for checking; it must not stop users from being deleted
+        cursor.execute(f"ALTER TABLE {TABLE} DROP CONSTRAINT IF EXISTS {foreign_key}")
+        cursor.execute(f"ALTER TABLE {SHADOW} RENAME CONSTRAINT {foreign_key}_new TO {foreign_key}")
+        cursor.execute(f"ALTER SEQUENCE {old_sequence} RENAME TO {OLD}_id_seq")
+        cursor.execute(f"ALTER SEQUENCE {new_sequence} RENAME TO {TABLE}_id_seq")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD}")
+        cursor.execute(f"ALTER TABLE {SHADOW} RENAME TO {TABLE}")
+
+def missing_rows(cursor):
+    """Rows of embeddings_old that did not make it across (should be 0)."""
+    cursor.execute(
+        f"""
+        SELECT count(*) FROM {OLD} o
+        WHERE NOT EXISTS (SELECT 1 FROM {TABLE} e WHERE e.id = o.id AND e.user_id = o.user_id)
+        """
+    )
+    return cursor.fetchone()[0]
+
+def drop_old_table(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {OLD}")
+
+def partition_embeddings(partitions, batch_size=10000, from_id=0, log=print):
+    """
+    Runs all four steps on the default connection, which must be in
+    autocommit mode (CREATE INDEX CONCURRENTLY). `from_id` resumes an
+    interrupted copy. Returns the number of rows missing afterwards.
+    """
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor) and table_partitions(cursor) == sorted(partition_names(partitions)):
+            log(f"{TABLE} already has {partitions} partitions")
+            return 0
+
+        names = create_shadow(cursor, partitions)
+        log(f"1/4 {SHADOW}: {partitions} hash partitions on user_id, writes to {TABLE} mirrored")
+
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {TABLE}")
+        until_id = cursor.fetchone()[0]
+        copied, start, last_log = 0, time.time(), 0.0
+        for last_id, rows in copy_rows(cursor, from_id, until_id, batch_size):
+            copied += rows
+            if time.time() - last_log >= 5 or last_id == until_id:
+                last_log = time.time()
+                log(f"2/4 copied {copied} rows, up to id {last_id} of {until_id} ({round(last_log - start, 1)}s)")
+
+        for name, statements in index_statements(cursor, names).items():
+            start = time.time()
+            for statement in statements:
+                cursor.execute(statement)
+            log(f"3/4 {name} built on {partitions} partitions ({round(time.time() - start, 2)}s)")
+
+        swap(cursor)
+        cursor.execute(f"ANALYZE {TABLE}")
+        log(f"4/4 {TABLE} is partitioned; the previous table is kept as {OLD}")
+        return missing_rows(cursor)
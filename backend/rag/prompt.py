@@ -1,12 +1,124 @@
-def build_prompt(context_chunks, question):
-    print(f"    📝 PROMPT: Merging {len(context_chunks)} chunks into context window...")
-    
+import json
+from django.conf import settings
+from .chunk import estimate_tokens
+from . import metrics
+
+# Shorter shared edges are treated as coincidence rather than chunk overlap
+MIN_OVERLAP_CHARS = 20
+
+def _overlap(a, b):
+    """Length of the longest suffix of `a` that is also a prefix of `b`."""
+    if len(b) < MIN_OVERLAP_CHARS:
+        return 0
+    start = max(0, len(a) - len(b))
+    while True:
+        i = a.find(b[:MIN_OVERLAP_CHARS], start)
+        if i == -1:
+            return 0
+        if b.startswith(a[i:]):
+            return len(a) - i
+        start = i + 1
+
+def _filename(chunk):
+    meta = chunk.get("metadata") or {}
+    if isinstance(meta, str):
+        try: meta = json.loads(meta)
+        except ValueError: meta = {}
+    return meta.get("filename") or chunk.get("filename", "Unknown")
+
+def pack_context(context_chunks, max_tokens=None):
+    """
+    Fits retrieved chunks into a token budget, in relevance order.
+
+    Neighbouring chunks of the same asset share their overlap text; instead
+    of paying for it twice, a chunk that continues (or precedes) one already
+    packed is merged into it, and a chunk contained in one is dropped.
+    Chunks whose new text no longer fits are skipped so smaller, less
+    relevant ones can still use the remaining budget.
+
+    Returns (sections, tokens_used), sections being {"filename", "content"} dicts.
+    """
+    max_tokens = max_tokens or settings.RAG_CONTEXT_TOKENS
+    sections = []
+    used = 0
+
+    for chunk in context_chunks:
+        content = chunk["content"]
+        same_asset = [s for s in sections if s["asset_id"] == chunk.get("asset_id")]
+
+        if any(content in s["content"] for s in same_asset):
+            continue
+
+        merged = False
+        for section in same_asset:
+            after = _overlap(section["content"], content)
+            before = _overlap(content, section["content"]) if not after else 0
+            if not (after or before):
+                continue
+
+            combined = section["content"] + content[after:] if after else content + section["content"][before:]
+            extra = estimate_tokens(combined) - section["tokens"]
+            if used + extra <= max_tokens:
+                section["content"], section["tokens"] = combined, section["tokens"] + extra
+                used += extra
+            merged = True
+            break
+        if merged:
+            continue
+
+        tokens = estimate_tokens(content)
+        if used + tokens > max_tokens:
+            continue
+        sections.append({
+            "asset_id": chunk.get("asset_id"),
+            "filename": _filename(chunk),
+            "content": content,
+            "tokens": tokens,
+        })
+        used += tokens
+
+    return sections, used
+
+def has_history(history):
+    return bool(history and (history["summary"] or history["turns"]))
+
+def _transcript(turns):
+    return "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+def _history_text(history):
+    summary = f"Summary of earlier turns: {history['summary']}\n\n" if history["summary"] else ""
+    return summary + _transcript(history["turns"])
+
+def build_prompt(context_chunks, question, max_context_tokens=None, history=None):
+    """
+    `history` ({"summary", "turns"} from chats.memory) adds the conversation
+    so far, already held under RAG_HISTORY_TOKENS, so follow-up questions
+    can refer back to it.
+    """
+    sections, tokens_used = pack_context(context_chunks, max_context_tokens)
+    metrics.CONTEXT_TOKENS.observe(tokens_used)
+    metrics.TOKENS.inc(tokens_used, kind="context")
+    print(
+        f"    📝 PROMPT: Packed {len(context_chunks)} chunks into {len(sections)} sections "
+        f"({tokens_used}/{max_context_tokens or settings.RAG_CONTEXT_TOKENS} context tokens)..."
+    )
+
     # We join chunks but also include a small hint that this is extracted data
     context_text = "\n\n".join(
-        f"[Source: {chunk.get('filename', 'Unknown')}]: {chunk['content']}" 
-        for chunk in context_chunks
+        f"[Source: {section['filename']}]: {section['content']}"
+        for section in sections
     )
 
+    conversation = ""
+    if has_history(history):
+        history_text = _history_text(history)
+        metrics.TOKENS.inc(estimate_tokens(history_text), kind="history")
+        conversation = f"""
+---
+CONVERSATION SO FAR (use it to understand follow-up questions; facts still come from the Context):
+{history_text}
+"""
+
     return f"""
 You are a friendly, professional, and helpful AI assistant.
 
@@ -24,10 +136,25 @@ INSTRUCTIONS:
 ---
 CONTEXT FROM UPLOADED CONTENT:
 {context_text}
----
+{conversation}---
 
 USER QUESTION:
 {question}
 
 YOUR FRIENDLY RESPONSE:
-"""
\ No newline at end of file
+"""
+
+def build_summary_prompt(summary, turns, max_tokens):
+    return f"""
+Update the running summary of a conversation between a user and an assistant about the user's documents.
+Keep the facts, names, numbers and open questions a follow-up question might refer to; drop pleasantries.
+Write plain prose of at most {int(max_tokens * 0.7)} words.
+
+CURRENT SUMMARY:
+{summary or "(none yet)"}
+
+NEW TURNS:
+{_transcript(turns)}
+
+UPDATED SUMMARY:
+"""
@@ -1,9 +1,161 @@
-from .openai_client import client
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from .openai_client import client, async_client
+from .embed import EMBEDDING_MODEL, embedding_model_tag, generate_embeddings
+from .models import QueryEmbeddingCache
+from .vector_storage import as_list
+from . import metrics
+
+# Tier 1: per-process LRU. Tier 2: the query_embedding_cache table, shared by all workers.
+_lru = OrderedDict()
+_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+def normalize_query(query):
+    # Case and spacing differences should not cost an extra API call
+    return " ".join(query.split()).casefold()
+
+def query_cache_key(query, model=None):
+    model = model or embedding_model_tag()
+    return hashlib.sha256(f"{model}\0{normalize_query(query)}".encode()).hexdigest()
+
+def query_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_size"] = len(_lru)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+    return stats
+
+def clear_query_cache():
+    """Empties the in-process tier and resets counters (the DB tier is kept)."""
+    with _lock:
+        _lru.clear()
+        for name in _stats:
+            _stats[name] = 0
+
+def _remember(key, vector):
+    with _lock:
+        _lru[key] = vector
+        _lru.move_to_end(key)
+        while len(_lru) > settings.RAG_QUERY_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+    metrics.CACHE_LOOKUPS.inc(cache="query_embedding", result="miss" if name == "misses" else "hit")
+
+def _from_memory(key):
+    with _lock:
+        vector = _lru.get(key)
+        if vector is not None:
+            _lru.move_to_end(key)
+            _stats["memory_hits"] += 1
+    if vector is not None:
+        metrics.CACHE_LOOKUPS.inc(cache="query_embedding", result="hit")
+        print(f"   ⚡ CACHE: Query embedding served from memory.")
+    return vector
 
 def embed_query(query: str):
+    key = query_cache_key(query)
+
+    vector = _from_memory(key)
+    if vector is not None:
+        return vector
+
+    cached = QueryEmbeddingCache.objects.filter(key=key).values_list("embedding", flat=True).first()
+    if cached is not None:
+        vector = as_list(cached)
+        _count("db_hits")
+        _remember(key, vector)
+        print(f"   ⚡ CACHE: Query embedding served from database.")
+        return vector
+
+    _count("misses")
     print(f"   🧠 AI: Generating embedding for query...")
     response = client.embeddings.create(
-        model="text-embedding-3-small",
+        model=EMBEDDING_MODEL,
         input=query,
+        dimensions=settings.RAG_EMBEDDING_DIMENSIONS,
+    )
+    vector = response.data[0].embedding
+
+    # Another worker may have cached the same query meanwhile; that's fine
+    QueryEmbeddingCache.objects.bulk_create(
+        [QueryEmbeddingCache(key=key, model=embedding_model_tag(), embedding=vector)],
+        ignore_conflicts=True,
+    )
+    _remember(key, vector)
+    return vector
+
+def embed_queries(queries):
+    """
+    embed_query for many questions at once: one cache table query for all of
+    them, and the remaining misses in a single embeddings call (per
+    RAG_EMBED_BATCH_SIZE). Vectors come back in the order of `queries`.
+    """
+    keys = [query_cache_key(query) for query in queries]
+    vectors = [_from_memory(key) for key in keys]
+
+    missing = {key for key, vector in zip(keys, vectors) if vector is None}
+    if missing:
+        stored = dict(QueryEmbeddingCache.objects.filter(key__in=missing).values_list("key", "embedding"))
+        for i, key in enumerate(keys):
+            if vectors[i] is None and key in stored:
+                vectors[i] = as_list(stored[key])
+                _count("db_hits")
+                _remember(key, vectors[i])
+
+    # Duplicate questions in one batch are embedded once
+    pending = {}
+    for query, key, vector in zip(queries, keys, vectors):
+        if vector is None:
+            pending.setdefault(key, query)
+    if pending:
+        print(f"   🧠 AI: Generating embeddings for {len(pending)} queries...")
+        new_vectors = dict(zip(pending, generate_embeddings(list(pending.values()))))
+        for key in pending:
+            _count("misses")
+            _remember(key, new_vectors[key])
+        QueryEmbeddingCache.objects.bulk_create(
+            [QueryEmbeddingCache(key=key, model=embedding_model_tag(), embedding=vector) for key, vector in new_vectors.items()],
+            ignore_conflicts=True,
+        )
+        vectors = [vector if vector is not None else new_vectors[key] for key, vector in zip(keys, vectors)]
+
+    return vectors
+
+async def aembed_query(query: str):
+    """Async embed_query: same tiers, with AsyncOpenAI and the async ORM."""
+    key = query_cache_key(query)
+
+    vector = _from_memory(key)
+    if vector is not None:
+        return vector
+
+    cached = await QueryEmbeddingCache.objects.filter(key=key).values_list("embedding", flat=True).afirst()
+    if cached is not None:
+        vector = as_list(cached)
+        _count("db_hits")
+        _remember(key, vector)
+        print(f"   ⚡ CACHE: Query embedding served from database.")
+        return vector
+
+    _count("misses")
+    print(f"   🧠 AI: Generating embedding for query (async)...")
+    response = await async_client.embeddings.create(
+        model=EMBEDDING_MODEL,
+        input=query,
+        dimensions=settings.RAG_EMBEDDING_DIMENSIONS,
+    )
+    vector = response.data[0].embedding
+
+    await QueryEmbeddingCache.objects.abulk_create(
+        [QueryEmbeddingCache(key=key, model=embedding_model_tag(), embedding=vector)],
+        ignore_conflicts=True,
     )
-    return response.data[0].embedding
\ No newline at end of file
+    _remember(key, vector)
+    return vector
@@ -1,35 +1,290 @@
-from django.db import connection
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from . import async_db
+from .diversity import mmr_select
+from .vector_storage import COLUMN, afetch_with_vectors, column_type, fetch_with_vectors, min_ef_search, nearest_sql
 
-def retrieve_similar_chunks(user_id, query_embedding, asset_ids=None, top_k=5):
+# Must match the expression of the generated content_tsv column (migration 0006)
+FTS_CONFIG = "english"
+
+def _ann_params_query(ef_search=None, probes=None):
+    # set_config(..., true) behaves like SET LOCAL: it lasts until the end of the transaction
+    ef_search = max(ef_search or settings.RAG_HNSW_EF_SEARCH, min_ef_search())
+    return (
+        "SELECT set_config('hnsw.ef_search', %s, true), set_config('ivfflat.probes', %s, true)",
+        [str(ef_search), str(probes or settings.RAG_IVFFLAT_PROBES)],
+    )
+
+def _set_ann_params(cursor, ef_search=None, probes=None):
+    cursor.execute(*_ann_params_query(ef_search, probes))
+
+def _user_filter(asset_ids):
+    where = "user_id = %(user_id)s"
+    if asset_ids:
+        # Filter by specific files if user selected them
+        where += " AND asset_id = ANY(%(asset_ids)s)"
+    return where
+
+def _similar_query(user_id, query_embedding, asset_ids, top_k, with_vectors=False):
+    columns = "content, metadata, asset_id"
+    nearest = nearest_sql(
+        f"%(embedding)s::{column_type()}", _user_filter(asset_ids), "%(top_k)s",
+        columns=f"{columns}, {COLUMN}" if with_vectors else columns,
+    )
+    if with_vectors:
+        columns += f", {COLUMN}, distance"
+    return (
+        f"SELECT {columns} FROM ({nearest}) nearest ORDER BY distance",
+        {"user_id": user_id, "asset_ids": asset_ids, "embedding": query_embedding, "top_k": top_k},
+    )
+
+def _as_chunks(rows):
+    print(f"   ✅ SQL: Retrieved {len(rows)} chunks from database.")
+    return [{"content": row[0], "metadata": row[1], "asset_id": row[2]} for row in rows]
+
+def retrieve_similar_chunks(user_id, query_embedding, asset_ids=None, top_k=5, ef_search=None, probes=None):
+    """
+    `ef_search` (HNSW) and `probes` (IVFFlat) trade recall for speed on the ANN
+    index; they default to RAG_HNSW_EF_SEARCH / RAG_IVFFLAT_PROBES and only
+    apply to this query. Keep ef_search comfortably above top_k, since rows of
+    other users are filtered out after the index scan.
+    """
     print(f"   🔍 SQL: Searching for top {top_k} matches in Postgres 15...")
-    with connection.cursor() as cursor:
-        if asset_ids:
-            # Filter by specific files if user selected them
-            cursor.execute(
-                """
-                SELECT content, metadata
-                FROM embeddings
-                WHERE user_id = %s
-                  AND asset_id = ANY(%s)
-                ORDER BY embedding <-> %s::vector
-                LIMIT %s
-                """,
-                [user_id, asset_ids, query_embedding, top_k],
-            )
-        else:
-            # Search across all user files
-            cursor.execute(
-                """
-                SELECT content, metadata
-                FROM embeddings
-                WHERE user_id = %s
-                ORDER BY embedding <-> %s::vector
-                LIMIT %s
-                """,
-                [user_id, query_embedding, top_k],
-            )
+    with transaction.atomic(), connection.cursor() as cursor:
+        _set_ann_params(cursor, ef_search, probes)
+        cursor.execute(*_similar_query(user_id, query_embedding, asset_ids, top_k))
+        rows = cursor.fetchall()
+
+    return _as_chunks(rows)
+
+async def aretrieve_similar_chunks(user_id, query_embedding, asset_ids=None, top_k=5, ef_search=None, probes=None):
+    """Async retrieve_similar_chunks over the psycopg async pool (rag.async_db)."""
+    print(f"   🔍 SQL: Searching for top {top_k} matches in Postgres 15 (async)...")
+    async with async_db.transaction() as cursor:
+        await cursor.execute(*_ann_params_query(ef_search, probes))
+        await cursor.execute(*_similar_query(user_id, query_embedding, asset_ids, top_k))
+        rows = await cursor.fetchall()
+
+    return _as_chunks(rows)
+
+def _hybrid_query(user_id, query_text, query_embedding, asset_ids, top_k, candidates, with_vectors=False):
+    extra_columns = f", e.{COLUMN}, fused.score" if with_vectors else ""
+    candidates = candidates or settings.RAG_HYBRID_CANDIDATES
+    where = _user_filter(asset_ids)
+    nearest = nearest_sql(f"%(embedding)s::{column_type()}", where, "%(candidates)s")
+    return (
+        f"""
+        WITH vector_hits AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rank
+            FROM ({nearest}) nearest
+        ),
+        text_hits AS (
+            SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+            FROM (
+                SELECT id, ts_rank_cd(content_tsv, query) AS score
+                FROM embeddings, websearch_to_tsquery(%(fts_config)s::regconfig, %(query_text)s) query
+                WHERE {where}
+                  AND content_tsv @@ query
+                ORDER BY score DESC
+                LIMIT %(candidates)s
+            ) matches
+        ),
+        fused AS (
+            SELECT id, SUM(1.0 / (%(rrf_k)s + rank)) AS score
+            FROM (
+                SELECT id, rank FROM vector_hits
+                UNION ALL
+                SELECT id, rank FROM text_hits
+            ) ranked
+            GROUP BY id
+        )
+        SELECT e.content, e.metadata, e.asset_id{extra_columns}
+        FROM fused
+        JOIN embeddings e ON e.id = fused.id AND e.user_id = %(user_id)s
+        ORDER BY fused.score DESC
+        LIMIT %(top_k)s
+        """,
+        {
+            "embedding": query_embedding,
+            "user_id": user_id,
+            "asset_ids": asset_ids,
+            "candidates": candidates,
+            "fts_config": FTS_CONFIG,
+            "query_text": query_text,
+            "rrf_k": settings.RAG_RRF_K,
+            "top_k": top_k,
+        },
+    )
+
+def retrieve_hybrid_chunks(user_id, query_text, query_embedding, asset_ids=None, top_k=5, candidates=None, ef_search=None, probes=None):
+    """
+    Hybrid search in one round trip: the nearest `candidates` chunks by vector
+    distance and the best `candidates` full-text matches are fused with
+    reciprocal rank fusion, score = sum(1 / (RAG_RRF_K + rank)). Exact terms
+    such as invoice numbers or part codes, which embeddings blur, still rank.
+    """
+    print(f"   🔍 SQL: Hybrid search (vector + full-text) for top {top_k} matches...")
+    with transaction.atomic(), connection.cursor() as cursor:
+        _set_ann_params(cursor, ef_search, probes)
+        cursor.execute(*_hybrid_query(user_id, query_text, query_embedding, asset_ids, top_k, candidates))
+        rows = cursor.fetchall()
+
+    return _as_chunks(rows)
+
+async def aretrieve_hybrid_chunks(user_id, query_text, query_embedding, asset_ids=None, top_k=5, candidates=None, ef_search=None, probes=None):
+    """Async retrieve_hybrid_chunks over the psycopg async pool (rag.async_db)."""
+    print(f"   🔍 SQL: Hybrid search (vector + full-text) for top {top_k} matches (async)...")
+    async with async_db.transaction() as cursor:
+        await cursor.execute(*_ann_params_query(ef_search, probes))
+        await cursor.execute(*_hybrid_query(user_id, query_text, query_embedding, asset_ids, top_k, candidates))
+        rows = await cursor.fetchall()
+
+    return _as_chunks(rows)
+
+def _diverse_options(hybrid, candidates, lambda_, per_asset, ef_search):
+    hybrid = settings.RAG_HYBRID_SEARCH if hybrid is None else hybrid
+    candidates = candidates or settings.RAG_MMR_CANDIDATES
+    lambda_ = settings.RAG_MMR_LAMBDA if lambda_ is None else lambda_
+    per_asset = settings.RAG_MMR_PER_ASSET if per_asset is None else per_asset
+    # HNSW returns at most ef_search rows, so the pool needs that many
+    ef_search = max(ef_search or settings.RAG_HNSW_EF_SEARCH, candidates)
+    return hybrid, candidates, lambda_, per_asset, ef_search
+
+def _candidates_query(user_id, query_text, query_embedding, asset_ids, candidates, hybrid):
+    if hybrid:
+        return _hybrid_query(user_id, query_text, query_embedding, asset_ids, candidates, candidates, with_vectors=True)
+    return _similar_query(user_id, query_embedding, asset_ids, candidates, with_vectors=True)
+
+def _select_diverse(rows, top_k, hybrid, lambda_, per_asset):
+    if not rows:
+        return _as_chunks(rows)
+    scores = np.array([float(row[4]) for row in rows])
+    if hybrid:
+        # Fused RRF scores, scaled so the best candidate has relevance 1
+        relevance = scores / scores.max()
+    else:
+        # L2 distance between unit vectors d gives cosine similarity 1 - d^2 / 2
+        relevance = 1 - scores ** 2 / 2
+    # One float32 matrix; mmr_select then works on it without another copy
+    vectors = np.array([row[3] for row in rows], dtype=np.float32)
+    picked = mmr_select(
+        None, vectors, top_k, lambda_,
+        relevance=relevance, groups=[row[2] for row in rows], per_group=per_asset,
+    )
+    print(f"   🧮 MMR: Picked {len(picked)} diverse chunks from {len(rows)} candidates.")
+    return _as_chunks([rows[i][:3] for i in picked])
+
+def retrieve_diverse_chunks(user_id, query_text, query_embedding, asset_ids=None, top_k=5, hybrid=None, candidates=None, lambda_=None, per_asset=None, ef_search=None, probes=None):
+    """
+    Top-k chunks that are relevant but not near-copies of each other. The
+    best `candidates` (RAG_MMR_CANDIDATES) are fetched with their vectors,
+    by vector search or, if `hybrid` (default RAG_HYBRID_SEARCH), by the
+    fused hybrid ranking. Maximal marginal relevance (rag.diversity) then
+    picks `top_k` of them. `lambda_` (RAG_MMR_LAMBDA) weighs relevance
+    against diversity, and `per_asset` (RAG_MMR_PER_ASSET, 0 = no cap)
+    limits the chunks taken from one file.
+    """
+    hybrid, candidates, lambda_, per_asset, ef_search = _diverse_options(hybrid, candidates, lambda_, per_asset, ef_search)
+    print(f"   🔍 SQL: Fetching {candidates} candidates for {top_k} diverse matches...")
+    with transaction.atomic(), connection.cursor() as cursor:
+        _set_ann_params(cursor, ef_search, probes)
+        rows = fetch_with_vectors(
+            connection.connection,
+            *_candidates_query(user_id, query_text, query_embedding, asset_ids, candidates, hybrid),
+        )
+
+    return _select_diverse(rows, top_k, hybrid, lambda_, per_asset)
+
+async def aretrieve_diverse_chunks(user_id, query_text, query_embedding, asset_ids=None, top_k=5, hybrid=None, candidates=None, lambda_=None, per_asset=None, ef_search=None, probes=None):
+    """Async retrieve_diverse_chunks over the psycopg async pool (rag.async_db)."""
+    hybrid, candidates, lambda_, per_asset, ef_search = _diverse_options(hybrid, candidates, lambda_, per_asset, ef_search)
+    print(f"   🔍 SQL: Fetching {candidates} candidates for {top_k} diverse matches (async)...")
+    async with async_db.transaction() as cursor:
+        await cursor.execute(*_ann_params_query(ef_search, probes))
+        rows = await afetch_with_vectors(
+            cursor.connection,
+            *_candidates_query(user_id, query_text, query_embedding, asset_ids, candidates, hybrid),
+        )
+
+    return _select_diverse(rows, top_k, hybrid, lambda_, per_asset)
+
+def vector_literal(embedding):
+    # pgvector's text form; arrays of these cast cleanly to vector[] / halfvec[]
+    return "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+def _batch_query(user_id, query_texts, query_embeddings, asset_ids, top_k, candidates, hybrid):
+    candidates = candidates or settings.RAG_HYBRID_CANDIDATES
+    where = _user_filter(asset_ids)
+
+    if hybrid:
+        # retrieve_hybrid_chunks' fusion, evaluated once per question
+        best = f"""
+            SELECT ranked.id, SUM(1.0 / (%(rrf_k)s + ranked.rank)) AS score
+            FROM (
+                SELECT id, row_number() OVER (ORDER BY distance) AS rank
+                FROM ({nearest_sql("q.embedding", where, "%(candidates)s")}) nearest
+                UNION ALL
+                SELECT id, row_number() OVER (ORDER BY score DESC) AS rank
+                FROM (
+                    SELECT id, ts_rank_cd(content_tsv, query) AS score
+                    FROM embeddings, websearch_to_tsquery(%(fts_config)s::regconfig, q.query_text) query
+                    WHERE {where}
+                      AND content_tsv @@ query
+                    ORDER BY score DESC
+                    LIMIT %(candidates)s
+                ) matches
+            ) ranked
+            GROUP BY ranked.id
+            ORDER BY score DESC
+            LIMIT %(top_k)s
+        """
+    else:
+        best = f"""
+            SELECT id, -distance AS score
+            FROM ({nearest_sql("q.embedding", where, "%(top_k)s")}) nearest
+        """
+
+    return (
+        f"""
+        SELECT q.ord, e.content, e.metadata, e.asset_id
+        FROM unnest(%(embeddings)s::{column_type()}[], %(query_texts)s::text[])
+             WITH ORDINALITY AS q(embedding, query_text, ord)
+        CROSS JOIN LATERAL ({best}) best
+        JOIN embeddings e ON e.id = best.id AND e.user_id = %(user_id)s
+        ORDER BY q.ord, best.score DESC
+        """,
+        {
+            "embeddings": [vector_literal(v) for v in query_embeddings],
+            "query_texts": list(query_texts),
+            "user_id": user_id,
+            "asset_ids": asset_ids,
+            "candidates": candidates,
+            "fts_config": FTS_CONFIG,
+            "rrf_k": settings.RAG_RRF_K,
+            "top_k": top_k,
+        },
+    )
+
+def retrieve_chunks_batch(user_id, query_texts, query_embeddings, asset_ids=None, top_k=5, hybrid=None, candidates=None, ef_search=None, probes=None):
+    """
+    Top-k chunks for many questions in one statement: the question vectors
+    (and texts, for hybrid search) are unnested and each row runs the usual
+    search through a LATERAL join. Returns one chunk list per question, in
+    order. `hybrid` defaults to RAG_HYBRID_SEARCH.
+    """
+    if not query_embeddings:
+        return []
+    hybrid = settings.RAG_HYBRID_SEARCH if hybrid is None else hybrid
 
+    print(f"   🔍 SQL: Batch search for top {top_k} matches of {len(query_embeddings)} questions...")
+    with transaction.atomic(), connection.cursor() as cursor:
+        _set_ann_params(cursor, ef_search, probes)
+        cursor.execute(*_batch_query(user_id, query_texts, query_embeddings, asset_ids, top_k, candidates, hybrid))
         rows = cursor.fetchall()
 
+    results = [[] for _ in query_embeddings]
+    for ord_, content, metadata, asset_id in rows:
+        results[ord_ - 1].append({"content": content, "metadata": metadata, "asset_id": asset_id})
     print(f"   ✅ SQL: Retrieved {len(rows)} chunks from database.")
-    return [{"content": row[0], "metadata": row[1]} for row in rows]
\ No newline at end of file
+    return results
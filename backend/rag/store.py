@@ -1,18 +1,127 @@
+import hashlib
 import json # 👈 Add this import
-from django.db import connection
+from django.db import connection, transaction
+from .vector_storage import column_type
+
+def content_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _insert_rows(cursor, user_id, asset_id, rows, page_size):
+    # rows: (chunk_index, content, embedding, metadata)
+    row_sql = f"(%s, %s, %s, %s, %s, %s::{column_type()}, %s::jsonb, now())"
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        values = ", ".join([row_sql] * len(page))
+        params = []
+        for chunk_index, content, embedding, metadata in page:
+            params.extend([
+                user_id, asset_id, chunk_index, content_hash(content), content, embedding, json.dumps(metadata),
+            ])
 
-def store_embedding(user_id, asset_id, content, embedding, metadata):
-    with connection.cursor() as cursor:
         cursor.execute(
-            """
-            INSERT INTO public.embeddings (user_id, asset_id, content, embedding, metadata)
-            VALUES (%s, %s, %s, %s, %s)
+            f"""
+            INSERT INTO public.embeddings
+                (user_id, asset_id, chunk_index, content_hash, content, embedding, metadata, created_at)
+            VALUES {values}
             """,
-            [
-                user_id, 
-                asset_id, 
-                content, 
-                embedding, 
-                json.dumps(metadata) # 👈 Convert dict to JSON string
-            ],
-        )
\ No newline at end of file
+            params,
+        )
+
+def stored_chunks(user_id, asset_id):
+    """(id, content_hash, chunk_index) of every vector currently stored for an asset."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, content_hash, chunk_index FROM public.embeddings WHERE user_id = %s AND asset_id = %s",
+            [user_id, asset_id],
+        )
+        return cursor.fetchall()
+
+def diff_chunks(stored, chunks):
+    """
+    Matches the chunks of a new version of an asset against its `stored`
+    rows (from stored_chunks) by content hash, preferring a row at the same
+    position. Returns (added, moved, removed):
+
+      added    positions in `chunks` that have no stored row and need embedding
+      moved    {row id: new position} for kept rows whose position changed
+      removed  ids of stored rows that no longer occur in the document
+
+    Rows stored before content hashes existed never match and are replaced.
+    """
+    hashes = [content_hash(chunk) for chunk in chunks]
+    by_hash = {}
+    for row_id, row_hash, row_index in stored:
+        by_hash.setdefault(row_hash, {})[row_index] = row_id
+
+    # Exact (hash, position) matches first, so a repeated paragraph elsewhere
+    # can't steal the row that is still in place
+    matched = {}
+    for position, chunk_hash in enumerate(hashes):
+        row_id = by_hash.get(chunk_hash, {}).pop(position, None)
+        if row_id is not None:
+            matched[position] = row_id
+
+    added, moved = [], {}
+    for position, chunk_hash in enumerate(hashes):
+        if position in matched:
+            continue
+        candidates = by_hash.get(chunk_hash)
+        if candidates:
+            moved[candidates.pop(next(iter(candidates)))] = position
+        else:
+            added.append(position)
+
+    removed = [row_id for rows in by_hash.values() for row_id in rows.values()]
+    return added, moved, removed
+
+def sync_embeddings(user_id, asset_id, rows, moved=(), removed=(), metadata=None, page_size=500):
+    """
+    Applies a diff_chunks result in one transaction: deletes the `removed`
+    rows, renumbers the `moved` ones, inserts `rows` ((chunk_index, content,
+    embedding, metadata) tuples) and brings `metadata` of the untouched rows
+    up to date (e.g. a new filename). Returns the number of rows inserted.
+
+    With only `rows`, this stores a new asset. Inserts go out as multi-row
+    INSERTs of up to `page_size` rows, so a failure never leaves part of an
+    asset's vectors behind.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if removed:
+            cursor.execute(
+                "DELETE FROM public.embeddings WHERE user_id = %s AND asset_id = %s AND id = ANY(%s)",
+                [user_id, asset_id, list(removed)],
+            )
+        if moved:
+            cursor.execute(
+                """
+                UPDATE public.embeddings e
+                SET chunk_index = m.chunk_index
+                FROM unnest(%s::bigint[], %s::int[]) AS m(id, chunk_index)
+                WHERE e.id = m.id AND e.user_id = %s AND e.asset_id = %s
+                """,
+                [list(moved), list(moved.values()), user_id, asset_id],
+            )
+        if metadata is not None:
+            cursor.execute(
+                """
+                UPDATE public.embeddings SET metadata = %s::jsonb
+                WHERE user_id = %s AND asset_id = %s AND metadata IS DISTINCT FROM %s::jsonb
+                """,
+                [json.dumps(metadata), user_id, asset_id, json.dumps(metadata)],
+            )
+        _insert_rows(cursor, user_id, asset_id, rows, page_size)
+
+    return len(rows)
+
+def delete_embeddings(user_id, asset_ids):
+    """
+    Deletes every vector of the given assets with one statement on the
+    (user_id, asset_id) index, bypassing the ORM's collector, which loads
+    each row first. Returns the number of rows deleted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM public.embeddings WHERE user_id = %s AND asset_id = ANY(%s)",
+            [user_id, list(asset_ids)],
+        )
+        return cursor.rowcount
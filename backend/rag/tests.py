@@ -1,3 +1,234 @@
-from django.test import TestCase
+import io
+import struct
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from . import metrics
+from .chunk import chunk_document, count_tokens
+from .diversity import mmr_select
+from .image_understanding import describe_images
+from .prompt import pack_context
+from .store import content_hash, diff_chunks
+from .vector_storage import BINARY_LOADERS
+
+
+def _stored(chunks, first_id=1):
+    # stored_chunks() rows: (id, content_hash, chunk_index)
+    return [(first_id + i, content_hash(chunk), i) for i, chunk in enumerate(chunks)]
+
+
+class DiffChunksTests(SimpleTestCase):
+    def test_unchanged_document(self):
+        chunks = ["a", "b", "c"]
+        self.assertEqual(diff_chunks(_stored(chunks), chunks), ([], {}, []))
+
+    def test_first_upload_adds_everything(self):
+        self.assertEqual(diff_chunks([], ["a", "b"]), ([0, 1], {}, []))
+
+    def test_insert_shifts_later_chunks(self):
+        added, moved, removed = diff_chunks(_stored(["a", "b", "c"]), ["a", "new", "b", "c"])
+        self.assertEqual(added, [1])
+        self.assertEqual(moved, {2: 2, 3: 3})
+        self.assertEqual(removed, [])
+
+    def test_vanished_chunks_are_removed(self):
+        added, moved, removed = diff_chunks(_stored(["a", "b", "c"]), ["a", "c"])
+        self.assertEqual((added, moved, removed), ([], {3: 1}, [2]))
+
+    def test_repeated_chunk_keeps_the_row_in_place(self):
+        # "x" is stored at 0 and 2; the copy still at 2 must not be moved to fill 1
+        added, moved, removed = diff_chunks(_stored(["x", "y", "x"]), ["x", "x", "x"])
+        self.assertEqual(added, [1])
+        self.assertEqual(moved, {})
+        self.assertEqual(removed, [2])
+
+    def test_rows_without_hash_never_match(self):
+        added, moved, removed = diff_chunks([(7, None, 0)], ["a"])
+        self.assertEqual((added, moved, removed), ([0], {}, [7]))
+
+
+class ChunkDocumentTests(SimpleTestCase):
+    def document(self, edited=None):
+        lines = [
+            f"Clause {i} requires the supplier to deliver batch {i * 7} within {i % 9 + 2} business days."
+            for i in range(300)
+        ]
+        if edited is not None:
+            lines[edited] = "This clause was rewritten entirely by the legal department last week."
+        return "\n".join(lines)
+
+    def test_chunks_respect_the_token_budget(self):
+        chunks = list(chunk_document([self.document()], max_tokens=120, overlap_tokens=20))
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(count_tokens(chunk) <= 120 for chunk in chunks))
+
+    def test_every_sentence_is_kept(self):
+        chunks = list(chunk_document([self.document()], max_tokens=120, overlap_tokens=20))
+        text = "\n".join(chunks)
+        for line in self.document().splitlines():
+            self.assertIn(line, text)
+
+    def test_an_edit_only_rechunks_its_neighbourhood(self):
+        before = list(chunk_document([self.document()], max_tokens=120, overlap_tokens=20))
+        after = list(chunk_document([self.document(edited=150)], max_tokens=120, overlap_tokens=20))
+        added, _, removed = diff_chunks(_stored(before), after)
+        self.assertLessEqual(len(added), 4)
+        self.assertLessEqual(len(removed), 4)
+
+
+class PackContextTests(SimpleTestCase):
+    first = "The supplier delivers every order within ten business days of receiving it."
+    second = "Invoices are payable within thirty days of the delivery date."
+    third = "Late payments accrue interest at two percent per month."
+
+    def chunk(self, content, asset_id=1, filename="contract.pdf"):
+        return {"content": content, "asset_id": asset_id, "metadata": {"filename": filename}}
+
+    def test_overlapping_neighbours_are_merged(self):
+        sections, _ = pack_context([
+            self.chunk(f"{self.first} {self.second}"),
+            self.chunk(f"{self.second} {self.third}"),
+        ], max_tokens=1000)
+        self.assertEqual([s["content"] for s in sections], [f"{self.first} {self.second} {self.third}"])
+
+    def test_preceding_chunk_is_merged_in_front(self):
+        sections, _ = pack_context([
+            self.chunk(f"{self.second} {self.third}"),
+            self.chunk(f"{self.first} {self.second}"),
+        ], max_tokens=1000)
+        self.assertEqual([s["content"] for s in sections], [f"{self.first} {self.second} {self.third}"])
+
+    def test_contained_chunk_is_dropped(self):
+        sections, _ = pack_context([
+            self.chunk(f"{self.first} {self.second}"),
+            self.chunk(self.second),
+        ], max_tokens=1000)
+        self.assertEqual(len(sections), 1)
+
+    def test_other_assets_are_not_merged(self):
+        sections, _ = pack_context([
+            self.chunk(f"{self.first} {self.second}", asset_id=1),
+            self.chunk(f"{self.second} {self.third}", asset_id=2, filename="other.pdf"),
+        ], max_tokens=1000)
+        self.assertEqual([s["filename"] for s in sections], ["contract.pdf", "other.pdf"])
+
+    def test_chunks_over_budget_are_skipped_for_smaller_ones(self):
+        long = " ".join([self.first] * 20)
+        sections, used = pack_context([
+            self.chunk(self.second, asset_id=1),
+            self.chunk(long, asset_id=2),
+            self.chunk(self.third, asset_id=3),
+        ], max_tokens=40)
+        self.assertEqual([s["asset_id"] for s in sections], [1, 3])
+        self.assertLessEqual(used, 40)
+
+
+class MmrSelectTests(SimpleTestCase):
+    def setUp(self):
+        # Two near-duplicates of page A, then page B, then a weak page C
+        self.vectors = np.array([
+            [1.0, 0.0, 0.0],
+            [0.99, 0.01, 0.0],
+            [0.6, 0.8, 0.0],
+            [0.2, 0.0, 0.98],
+        ], dtype=np.float32)
+        self.query = np.array([1.0, 0.2, 0.0], dtype=np.float32)
+
+    def test_lambda_one_is_the_plain_ranking(self):
+        relevance = self.vectors @ self.query / np.linalg.norm(self.vectors, axis=1)
+        self.assertEqual(mmr_select(self.query, self.vectors, 4, lambda_=1.0), list(np.argsort(-relevance)))
+
+    def test_near_duplicates_give_way_to_other_pages(self):
+        first, second = mmr_select(self.query, self.vectors, 2, lambda_=0.5)
+        self.assertIn(first, (0, 1))
+        self.assertEqual(second, 2)
+        # The plain top-2 is both copies of page A
+        self.assertEqual(sorted(mmr_select(self.query, self.vectors, 2, lambda_=1.0)), [0, 1])
+
+    def test_lists_and_arrays_pick_the_same(self):
+        self.assertEqual(
+            mmr_select(self.query.tolist(), self.vectors.tolist(), 3),
+            mmr_select(self.query, self.vectors, 3),
+        )
+
+    def test_relevance_scores_override_the_query(self):
+        picked = mmr_select(None, self.vectors, 1, relevance=[0.1, 0.2, 0.3, 0.9])
+        self.assertEqual(picked, [3])
+
+    def test_per_group_cap(self):
+        picked = mmr_select(self.query, self.vectors, 3, lambda_=1.0, groups=[1, 1, 1, 2], per_group=2)
+        self.assertEqual(sorted(picked), [0, 1, 3])
+
+    def test_cap_gives_way_when_one_group_is_left(self):
+        picked = mmr_select(self.query, self.vectors, 3, groups=[1, 1, 1, 1], per_group=1)
+        self.assertEqual(len(picked), 3)
+
+    def test_k_larger_than_the_pool(self):
+        self.assertEqual(sorted(mmr_select(self.query, self.vectors, 10)), [0, 1, 2, 3])
+        self.assertEqual(mmr_select(self.query, self.vectors[:0], 5), [])
+
+
+class BinaryVectorLoaderTests(SimpleTestCase):
+    def test_wire_format_is_decoded(self):
+        values = [1.0, -2.5, 0.125]
+        for name, dtype in (("vector", ">f4"), ("halfvec", ">f2")):
+            data = struct.pack(">hh", 3, 0) + np.array(values, dtype=dtype).tobytes()
+            self.assertEqual(BINARY_LOADERS[name](0).load(data).tolist(), values)
+
+
+@mock.patch("rag.image_understanding.describe_image", side_effect=lambda url: f"described {len(url)}")
+class DescribeImagesTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice")
+        self.bob = User.objects.create_user(username="bob")
+        file = io.BytesIO()
+        Image.new("RGB", (64, 48), "navy").save(file, "PNG")
+        self.image = file.getvalue()
+
+    def test_repeat_upload_is_served_from_the_cache(self, describe_image):
+        describe_images(self.alice.id, [self.image])
+        self.assertEqual(describe_images(self.alice.id, [self.image, self.image])[1], 2)
+        self.assertEqual(describe_image.call_count, 1)
+
+    def test_other_users_descriptions_are_not_reused(self, describe_image):
+        describe_images(self.alice.id, [self.image])
+        descriptions, hits = describe_images(self.bob.id, [self.image])
+        self.assertEqual(hits, 0)
+        self.assertEqual(describe_image.call_count, 2)
+        self.assertEqual(len(descriptions), 1)
+
+
+class HistogramTests(SimpleTestCase):
+    def setUp(self):
+        self.histogram = metrics.Histogram("test_seconds", "Test histogram.", labels=("stage",), buckets=(0.1, 1))
+        self.addCleanup(metrics._registry.remove, self.histogram)
+
+    def test_exposition_is_cumulative(self):
+        for value in (0.05, 0.5, 0.5, 3):
+            self.histogram.observe(value, stage="embed")
+        self.assertEqual(self.histogram.expose(), [
+            "# HELP test_seconds Test histogram.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{stage="embed",le="0.1"} 1',
+            'test_seconds_bucket{stage="embed",le="1"} 3',
+            'test_seconds_bucket{stage="embed",le="+Inf"} 4',
+            'test_seconds_sum{stage="embed"} 4.05',
+            'test_seconds_count{stage="embed"} 4',
+        ])
+
+    def test_bucket_bounds_are_inclusive(self):
+        self.histogram.observe(0.1, stage="store")
+        self.assertIn('test_seconds_bucket{stage="store",le="0.1"} 1', self.histogram.expose())
+
+    def test_label_values_are_escaped(self):
+        self.histogram.observe(1, stage='say "hi"\n')
+        self.assertIn('test_seconds_count{stage="say \\"hi\\"\\n"} 1', self.histogram.expose())
+
+    @override_settings(RAG_METRICS_ENABLED=False)
+    def test_disabled_metrics_record_nothing(self):
+        self.histogram.observe(1, stage="embed")
+        self.assertEqual(len(self.histogram.expose()), 2)
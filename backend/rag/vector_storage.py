@@ -0,0 +1,235 @@
+"""
+Storage format of embeddings.embedding and the SQL that searches it.
+
+Three settings shrink the table and its index, and can be combined:
+
+  RAG_VECTOR_TYPE=halfvec       2-byte floats instead of 4 (pgvector halfvec)
+  RAG_EMBEDDING_DIMENSIONS=512  shorter vectors from text-embedding-3-small's
+                                `dimensions` parameter
+  RAG_BINARY_RERANK=true        index 1 bit per dimension (binary_quantize)
+                                for a fast Hamming first pass, then re-rank
+                                the best RAG_BINARY_CANDIDATES on the stored
+                                vectors
+
+text-embedding-3 vectors shortened by the API equal the first N values of
+the full vector, re-normalised, so existing rows are converted in place with
+subvector() + l2_normalize() and nothing is re-embedded. Going back up in
+dimensions does need re-ingestion.
+
+After changing any of them, run `python manage.py convert_embeddings`.
+"""
+import weakref
+
+import numpy as np
+import psycopg
+from django.conf import settings
+from psycopg.adapt import Loader
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+
+TABLE = "embeddings"
+COLUMN = "embedding"
+FULL_DIMENSIONS = 1536
+
+# Same name as migration 0002, so either one finds the other's index
+VECTOR_INDEX_NAME = "embeddings_embedding_ann_idx"
+BINARY_INDEX_NAME = "embeddings_embedding_bq_idx"
+
+def as_list(vector):
+    # VectorField values are numpy arrays with pgvector < 0.4 and lists after
+    return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+# pgvector's binary wire format: int16 dimensions, int16 unused, then the values big-endian
+class _BinaryVectorLoader(Loader):
+    format = Format.BINARY
+    dtype = None
+
+    def load(self, data):
+        return np.frombuffer(data, dtype=self.dtype, offset=4)
+
+BINARY_LOADERS = {
+    name: type(f"{name}_loader", (_BinaryVectorLoader,), {"dtype": dtype})
+    for name, dtype in (("vector", ">f4"), ("halfvec", ">f2"))
+}
+_registered = weakref.WeakSet()
+
+def _register_loaders(conn, infos):
+    # Binary loaders only: Django's client-side cursors always read text and are unaffected
+    for name, info in zip(BINARY_LOADERS, infos):
+        if info is not None:  # halfvec needs pgvector 0.7
+            conn.adapters.register_loader(info.oid, BINARY_LOADERS[name])
+    _registered.add(conn)
+
+def fetch_with_vectors(conn, sql, params):
+    """
+    Rows of `sql` run on psycopg connection `conn` (Django's
+    connection.connection, inside the caller's transaction), with vector
+    and halfvec columns as NumPy arrays. The results come back in binary,
+    so a vector is read straight from its bytes instead of being printed
+    as text and parsed back float by float.
+    """
+    if conn not in _registered:
+        _register_loaders(conn, [TypeInfo.fetch(conn, name) for name in BINARY_LOADERS])
+    # Binary results need server-side binding; prepare=False keeps it usable behind PgBouncer
+    with psycopg.Cursor(conn) as cursor:
+        cursor.execute(sql, params, binary=True, prepare=False)
+        return cursor.fetchall()
+
+async def afetch_with_vectors(conn, sql, params):
+    """fetch_with_vectors on a psycopg AsyncConnection (rag.async_db)."""
+    if conn not in _registered:
+        _register_loaders(conn, [await TypeInfo.fetch(conn, name) for name in BINARY_LOADERS])
+    async with psycopg.AsyncCursor(conn) as cursor:
+        await cursor.execute(sql, params, binary=True, prepare=False)
+        return await cursor.fetchall()
+
+def column_type(vector_type=None, dimensions=None):
+    vector_type = vector_type or settings.RAG_VECTOR_TYPE
+    if vector_type not in ("vector", "halfvec"):
+        raise ValueError(f"Unknown RAG_VECTOR_TYPE {vector_type!r}, expected 'vector' or 'halfvec'")
+    dimensions = int(dimensions or settings.RAG_EMBEDDING_DIMENSIONS)
+    if not 0 < dimensions <= FULL_DIMENSIONS:
+        raise ValueError(f"RAG_EMBEDDING_DIMENSIONS must be between 1 and {FULL_DIMENSIONS}")
+    return f"{vector_type}({dimensions})"
+
+def nearest_sql(query_vector, where, limit, columns="id", table=TABLE):
+    """
+    SQL selecting `columns` and `distance` (L2) of the `limit` rows of
+    `table` matching `where` that are nearest to `query_vector`, nearest
+    first. `query_vector` is an SQL expression already cast to column_type().
+    """
+    exact = f"""
+        SELECT {columns}, {COLUMN} <-> {query_vector} AS distance
+        FROM {table}
+        WHERE {where}
+    """
+    if not settings.RAG_BINARY_RERANK:
+        return f"{exact} ORDER BY {COLUMN} <-> {query_vector} LIMIT {limit}"
+
+    bits = f"bit({int(settings.RAG_EMBEDDING_DIMENSIONS)})"
+    candidates = int(settings.RAG_BINARY_CANDIDATES)
+    return f"""
+        SELECT * FROM (
+            {exact}
+            ORDER BY binary_quantize({COLUMN})::{bits} <~> binary_quantize({query_vector})
+            LIMIT GREATEST({limit}, {candidates})
+        ) shortlist
+        ORDER BY distance
+        LIMIT {limit}
+    """
+
+def min_ef_search():
+    # HNSW returns at most ef_search rows, so the binary shortlist needs that many
+    return int(settings.RAG_BINARY_CANDIDATES) if settings.RAG_BINARY_RERANK else 0
+
+def current_column_type(cursor):
+    cursor.execute(
+        """
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s
+        """,
+        [TABLE, COLUMN],
+    )
+    return cursor.fetchone()[0]
+
+def _dimensions_of(type_name):
+    return int(type_name.split("(")[1].rstrip(")"))
+
+def ann_index(vector_type=None, dimensions=None):
+    """(name, definition) of the ANN index the settings call for."""
+    vector_type = vector_type or settings.RAG_VECTOR_TYPE
+    dimensions = int(dimensions or settings.RAG_EMBEDDING_DIMENSIONS)
+    if settings.RAG_BINARY_RERANK:
+        return BINARY_INDEX_NAME, (
+            f"USING hnsw ((binary_quantize({COLUMN})::bit({dimensions})) bit_hamming_ops) "
+            f"WITH (m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)})"
+        )
+    if settings.RAG_VECTOR_INDEX == "hnsw":
+        method = "hnsw"
+        options = f"m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)}"
+    elif settings.RAG_VECTOR_INDEX == "ivfflat":
+        method = "ivfflat"
+        options = f"lists = {int(settings.RAG_IVFFLAT_LISTS)}"
+    else:
+        raise ValueError(f"Unknown RAG_VECTOR_INDEX {settings.RAG_VECTOR_INDEX!r}, expected 'hnsw' or 'ivfflat'")
+    return VECTOR_INDEX_NAME, f"USING {method} ({COLUMN} {vector_type}_l2_ops) WITH ({options})"
+
+def table_partitions(cursor, table=TABLE):
+    """Names of `table`'s partitions (rag.partitioning), empty if it is a plain table."""
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+        """,
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def partition_index_name(partition, name):
+    # embeddings_embedding_ann_idx on partition embeddings_p3_of_16 -> embeddings_p3_of_16_embedding_ann_idx
+    return f"{partition}_{name.removeprefix(TABLE + '_')}"
+
+def create_index_statements(name, definition, partitions=(), table=TABLE, parent_name=None):
+    """
+    Statements creating index `name` on `table` without blocking writes.
+    CREATE INDEX CONCURRENTLY is not allowed on a partitioned table. There
+    the parent index is created ON ONLY the parent (invalid at first), then
+    each partition's index is built CONCURRENTLY and attached. The parent
+    index becomes valid once the last partition is attached. `parent_name`
+    overrides the parent index's name (rag.partitioning builds under a
+    temporary one).
+    """
+    if not partitions:
+        return [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"]
+    parent_name = parent_name or name
+    statements = [f"CREATE INDEX IF NOT EXISTS {parent_name} ON ONLY {table} {definition}"]
+    for partition in partitions:
+        child = partition_index_name(partition, name)
+        statements += [
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}",
+            f"ALTER INDEX {parent_name} ATTACH PARTITION {child}",
+        ]
+    return statements
+
+def drop_index_statement(name, partitions=()):
+    # Partitioned indexes cannot be dropped CONCURRENTLY; dropping one drops its partitions' indexes
+    return f"DROP INDEX {'' if partitions else 'CONCURRENTLY '}IF EXISTS {name}"
+
+def convert_statements(current_type, partitions=()):
+    """
+    Statements that bring the column and its ANN index from `current_type`
+    to the configured format. They must run outside a transaction
+    (CREATE INDEX CONCURRENTLY), and are no-ops when nothing changed.
+    `partitions` lists the table's partitions if it is partitioned.
+    """
+    target = column_type()
+    vector_type, dimensions = settings.RAG_VECTOR_TYPE, int(settings.RAG_EMBEDDING_DIMENSIONS)
+    current_dimensions = _dimensions_of(current_type)
+    if dimensions > current_dimensions:
+        raise ValueError(
+            f"Stored vectors have {current_dimensions} dimensions; {dimensions} needs the assets re-ingested"
+        )
+
+    statements = []
+    if current_type != target:
+        statements += [
+            drop_index_statement(VECTOR_INDEX_NAME, partitions),
+            drop_index_statement(BINARY_INDEX_NAME, partitions),
+        ]
+        value = f"{COLUMN}::vector"
+        if dimensions < current_dimensions:
+            value = f"l2_normalize(subvector({value}, 1, {dimensions}))"
+        # Rewrites the whole table under an exclusive lock
+        statements.append(f"ALTER TABLE {TABLE} ALTER COLUMN {COLUMN} TYPE {target} USING {value}::{target}")
+        if dimensions != current_dimensions:
+            # Cached answers are matched by question vector, which changes size too
+            statements.append("DELETE FROM answer_cache")
+    elif settings.RAG_BINARY_RERANK:
+        statements.append(drop_index_statement(VECTOR_INDEX_NAME, partitions))
+    else:
+        statements.append(drop_index_statement(BINARY_INDEX_NAME, partitions))
+
+    statements += create_index_statements(*ann_index(vector_type, dimensions), partitions)
+    return statements
@@ -1,3 +1,15 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 
-# Create your views here.
+from . import metrics as rag_metrics
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. Not behind JWT auth; set RAG_METRICS_TOKEN to
+    require `Authorization: Bearer <token>` from the scraper.
+    """
+    token = settings.RAG_METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+
+    return HttpResponse(rag_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")